@@ -1,6 +1,7 @@
 import sys
+import time
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterator
 
 import streamlit as st
 
@@ -12,51 +13,73 @@ SRC_DIR = BASE_DIR / "src"
 if str(SRC_DIR) not in sys.path:
     sys.path.append(str(SRC_DIR))
 
-from chains.sentiment_chain import build_sentiment_agent_chain
-from tools.stats_tools import compute_sentiment_stats
+from chains.registry import get_sentiment_chain, get_sentiment_stream
+from chains.batch_jobs import BatchJob, BatchJobManager
+from chains.batch_runner import DEFAULT_MAX_CONCURRENCY, LLM_CALLS_PER_COMMENT
+from chains.expansion import expand_result
+from models.semantic_cache import get_semantic_cache
+from tools.stats_tools import (
+    compute_sentiment_stats,
+    running_stats_summary,
+    update_running_stats,
+)
 
 
 # -------------------------------------------------------------------
 # Helpers
 # -------------------------------------------------------------------
 
-def get_chain(config: str = "A"):
-    # Devuelve (y cachea en session_state) la cadena de análisis para
-    # la configuración indicada ("A" o "B").
-    if "chains" not in st.session_state:
-        st.session_state["chains"] = {}
+def get_chain(config: str = "A", deferred: bool = False):
+    # Devuelve la cadena de análisis para la configuración indicada ("A" o "B").
+    # Se construye una sola vez por proceso (registro compartido), así que
+    # las distintas sesiones y reruns de Streamlit reutilizan el mismo cliente.
+    # deferred=True => solo clasificación (explicación/respuesta bajo demanda).
+    return get_sentiment_chain(config=config, deferred=deferred)
+
 
-    if config not in st.session_state["chains"]:
-        st.session_state["chains"][config] = build_sentiment_agent_chain(config=config)
+def stream_single_analysis(text: str, config: str = "A") -> Iterator[Dict[str, Any]]:
+    # Eventos de build_sentiment_stream: primero la clasificación, luego los
+    # tokens de la explicación y de la respuesta, y al final el resultado
+    # completo con los tiempos (incluido el tiempo hasta el primer token).
+    stream = get_sentiment_stream(config=config)
+    return stream({"user_text": text})
 
-    return st.session_state["chains"][config]
 
+# Cada cuánto se vuelve a pintar la página mientras hay un batch en curso
+BATCH_POLL_INTERVAL_S = 0.7
 
-def run_single_analysis(text: str, config: str = "A") -> Dict[str, Any]:
-    chain = get_chain(config)
-    out = chain.invoke({"user_text": text})
-    return out
 
+@st.cache_resource
+def get_job_manager() -> BatchJobManager:
+    # Un solo gestor de batches por proceso: los batches siguen corriendo
+    # entre reruns y el job se recupera por id desde st.session_state.
+    return BatchJobManager()
 
-def run_batch_analysis(
+
+def start_batch_analysis(
     texts: List[str],
     config: str = "A",
-) -> List[Dict[str, Any]]:
-    chain = get_chain(config)
-    results: List[Dict[str, Any]] = []
-    for t in texts:
-        out = chain.invoke({"user_text": t})
-        results.append(
-            {
-                "text": t,
-                "sentiment": out["sentiment"],
-                "score": out["score"],
-                "short_reason": out["short_reason"],
-                "explanation": out["explanation"],
-                "suggested_reply": out["suggested_reply"],
-            }
-        )
-    return results
+    max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+    deferred: bool = False,
+    use_semantic_cache: bool = False,
+) -> BatchJob:
+    # Lanza el análisis en segundo plano (varias llamadas al LLM en paralelo)
+    # y devuelve el job al momento; los resultados se leen con job.snapshot().
+    # Con use_semantic_cache, los comentarios casi idénticos a otros ya
+    # analizados reutilizan su resultado (caché semántica con Chroma).
+    chain = get_chain(config, deferred=deferred)
+    semantic_cache = get_semantic_cache(config) if use_semantic_cache else None
+    return get_job_manager().submit(
+        chain,
+        texts,
+        meta={
+            "config": config,
+            "deferred": deferred,
+            "use_semantic_cache": use_semantic_cache,
+        },
+        max_concurrency=max_concurrency,
+        semantic_cache=semantic_cache,
+    )
 
 
 def parse_batch_input(raw_text: str) -> List[str]:
@@ -116,14 +139,52 @@ config_choice = st.sidebar.radio(
 
 config = "A" if config_choice.startswith("A") else "B"
 
+classify_only = st.sidebar.checkbox(
+    "Batch: solo clasificación",
+    value=False,
+    help=(
+        "Solo calcula sentimiento, score y razón (1 llamada al LLM por comentario). "
+        "La explicación y la respuesta se generan después, solo para los comentarios "
+        "que quieras ver."
+    ),
+)
+
 st.sidebar.info(
     "Config A es más estable/determinista.\n\n"
     "Config B es más creativa y puede variar más las respuestas."
 )
 
+use_semantic_cache = st.sidebar.checkbox(
+    "Batch: reutilizar análisis de comentarios similares",
+    value=False,
+    help="Caché semántica (Chroma): comentarios casi idénticos a otros ya analizados no llaman al LLM.",
+)
+
 # Inicializar almacenamiento de resultados en sesión
 if "session_results" not in st.session_state:
     st.session_state["session_results"] = []  # lista de dicts
+if "session_stats" not in st.session_state:
+    # agregado incremental: se actualiza solo con los resultados nuevos
+    st.session_state["session_stats"] = None
+
+
+def add_session_results(new_results: List[Dict[str, Any]]) -> None:
+    st.session_state["session_results"].extend(new_results)
+    st.session_state["session_stats"] = update_running_stats(
+        st.session_state["session_stats"], new_results
+    )
+
+
+# Batch en segundo plano de esta sesión (si hay): cuando termina (o se
+# cancela), sus resultados se pasan una sola vez a la sesión
+batch_job = get_job_manager().get(st.session_state.get("batch_job_id"))
+batch_running = batch_job is not None and not batch_job.finished
+if batch_job is not None and batch_job.finished and not st.session_state.get("batch_job_collected"):
+    finished_config = batch_job.meta.get("config", config)
+    add_session_results(
+        [{**r, "config": finished_config} for r in batch_job.snapshot()["results"]]
+    )
+    st.session_state["batch_job_collected"] = True
 
 
 # -------------------------------------------------------------------
@@ -143,39 +204,65 @@ if mode == "Single comment":
         if not text.strip():
             st.warning("Por favor, ingresa un comentario primero.")
         else:
-            with st.spinner("Analizando sentimiento..."):
-                out = run_single_analysis(text.strip(), config=config)
-
-            # Guardar en resultados de sesión
-            st.session_state["session_results"].append(
-                {
-                    "text": text.strip(),
-                    "sentiment": out["sentiment"],
-                    "score": out["score"],
-                    "short_reason": out["short_reason"],
-                    "explanation": out["explanation"],
-                    "suggested_reply": out["suggested_reply"],
-                    "config": config,
-                }
-            )
-
-            # Mostrar resultados
+            # Mostrar resultados a medida que llegan
             st.markdown("### Resultado")
 
             col1, col2 = st.columns(2)
             with col1:
-                st.markdown(
-                    f"**Sentiment:** `{out['sentiment']}`  \n"
-                    f"**Score:** `{out['score']:.2f}`"
-                )
-                st.markdown("**Short reason:**")
-                st.write(out["short_reason"])
+                sentiment_box = st.empty()
+                reason_box = st.empty()
             with col2:
                 st.markdown("**Explanation:**")
-                st.write(out["explanation"])
+                explanation_box = st.empty()
 
             st.markdown("**Suggested reply:**")
-            st.success(out["suggested_reply"])
+            reply_box = st.empty()
+
+            streamed = {"explanation": "", "suggested_reply": ""}
+            out: Dict[str, Any] = {}
+            timings: Dict[str, Any] = {}
+
+            with st.spinner("Analizando sentimiento..."):
+                for event in stream_single_analysis(text.strip(), config=config):
+                    if event["event"] == "classification":
+                        sentiment_box.markdown(
+                            f"**Sentiment:** `{event['sentiment']}`  \n"
+                            f"**Score:** `{event['score']:.2f}`"
+                        )
+                        reason_box.markdown(f"**Short reason:**\n\n{event['short_reason']}")
+                    elif event["event"] == "token":
+                        streamed[event["field"]] += event["text"]
+                        if event["field"] == "explanation":
+                            explanation_box.write(streamed["explanation"])
+                        else:
+                            reply_box.success(streamed["suggested_reply"])
+                    elif event["event"] == "end":
+                        out = event["result"]
+                        timings = event["timings"]
+
+            explanation_box.write(out["explanation"])
+            reply_box.success(out["suggested_reply"])
+            if timings.get("ttft_s") is not None:
+                st.caption(
+                    f"Clasificación: {timings['classification_s']:.2f}s · "
+                    f"primer token: {timings['ttft_s']:.2f}s · "
+                    f"total: {timings['total_s']:.2f}s"
+                )
+
+            # Guardar en resultados de sesión
+            add_session_results(
+                [
+                    {
+                        "text": text.strip(),
+                        "sentiment": out["sentiment"],
+                        "score": out["score"],
+                        "short_reason": out["short_reason"],
+                        "explanation": out["explanation"],
+                        "suggested_reply": out["suggested_reply"],
+                        "config": config,
+                    }
+                ]
+            )
 
 
 # -------------------------------------------------------------------
@@ -205,49 +292,82 @@ El envío llegó con retraso y nadie ayudó. || Amazing quality! I will definite
         height=200,
     )
 
-    if st.button("Analizar batch", type="primary"):
+    if st.button("Analizar batch", type="primary", disabled=batch_running):
         texts = parse_batch_input(raw_batch)
         if not texts:
             st.warning("No se encontraron comentarios válidos. Revisa el formato.")
         else:
-            with st.spinner(f"Analizando {len(texts)} comentarios..."):
-                results = run_batch_analysis(texts, config=config)
-
-            # Acumular resultados en la sesión
-            for r in results:
-                r["config"] = config
-                st.session_state["session_results"].append(r)
-
-            # Stats solo del batch actual
-            stats = compute_sentiment_stats(results)
-
-            st.markdown("### Resumen del batch actual")
-
-            st.write(f"**Total comentarios:** {stats['total']}")
-            st.write("**Counts:**")
-            st.write(stats["counts"])
-
-            st.write("**Distribution:**")
-            dist_rows = [
-                {"sentiment": label, "fraction": frac}
-                for label, frac in stats["distribution"].items()
-            ]
-            if dist_rows:
-                st.dataframe(dist_rows, use_container_width=True)
-
-            st.markdown("### Resultados detallados (batch actual)")
-            st.dataframe(
-                [
-                    {
-                        "text": r["text"],
-                        "sentiment": r["sentiment"],
-                        "score": r["score"],
-                        "short_reason": r["short_reason"],
-                    }
-                    for r in results
-                ],
-                use_container_width=True,
+            batch_job = start_batch_analysis(
+                texts,
+                config=config,
+                deferred=classify_only,
+                use_semantic_cache=use_semantic_cache,
+            )
+            st.session_state["batch_job_id"] = batch_job.job_id
+            st.session_state["batch_job_collected"] = False
+            batch_running = True
+
+    if batch_job is not None:
+        snap = batch_job.snapshot()
+        results = snap["results"]
+        meta = snap["meta"]
+
+        st.progress(
+            snap["progress"],
+            text=f"{snap['done']} / {snap['total']} comentarios analizados",
+        )
+        if not batch_job.finished:
+            if st.button("Cancelar batch"):
+                batch_job.cancel()
+                st.info("Cancelando: se esperan solo los comentarios que ya estaban en curso.")
+        elif snap["status"] == "cancelled":
+            st.warning(f"Batch cancelado: {snap['done']} de {snap['total']} comentarios analizados.")
+        elif snap["status"] == "failed":
+            st.error(f"El batch falló: {snap['error']}")
+
+        # Stats solo del batch actual (lo que ya ha terminado)
+        stats = compute_sentiment_stats(results)
+
+        st.markdown("### Resumen del batch actual")
+
+        st.write(f"**Total comentarios:** {stats['total']}")
+        duplicates = sum(1 for r in results if r.get("duplicate"))
+        if duplicates:
+            calls_per_comment = 1 if meta.get("deferred") else LLM_CALLS_PER_COMMENT
+            st.caption(
+                f"Comentarios repetidos analizados una sola vez: {duplicates} "
+                f"({duplicates * calls_per_comment} llamadas al LLM ahorradas)"
             )
+        if meta.get("use_semantic_cache"):
+            cache_stats = get_semantic_cache(meta["config"]).stats()
+            st.caption(
+                f"Caché semántica: {cache_stats['hits']} hits / "
+                f"{cache_stats['misses']} misses (hit rate {cache_stats['hit_rate']:.2f})"
+            )
+        st.write("**Counts:**")
+        st.write(stats["counts"])
+
+        st.write("**Distribution:**")
+        dist_rows = [
+            {"sentiment": label, "fraction": frac}
+            for label, frac in stats["distribution"].items()
+        ]
+        if dist_rows:
+            st.dataframe(dist_rows, use_container_width=True)
+
+        st.markdown("### Resultados detallados (batch actual)")
+        st.dataframe(
+            [
+                {
+                    "text": r["text"],
+                    "sentiment": r["sentiment"],
+                    "score": r["score"],
+                    "short_reason": r["short_reason"],
+                }
+                for r in results
+            ],
+            use_container_width=True,
+        )
 
 
 # -------------------------------------------------------------------
@@ -262,8 +382,13 @@ session_results: List[Dict[str, Any]] = st.session_state["session_results"]
 if not session_results:
     st.info("Aún no se ha ejecutado ningún análisis en esta sesión.")
 else:
-    stats_session = compute_sentiment_stats(session_results)
+    stats_session = running_stats_summary(st.session_state["session_stats"])
     st.write(f"**Total comentarios en sesión:** {stats_session['total']}")
+    if stats_session["total"]:
+        st.caption(
+            f"Score medio: {stats_session['score_mean']:.2f} "
+            f"(varianza {stats_session['score_variance']:.3f})"
+        )
     st.write("**Counts:**")
     st.write(stats_session["counts"])
     st.write("**Distribution:**")
@@ -289,6 +414,31 @@ else:
         use_container_width=True,
     )
 
+    # Resultados en modo "solo clasificación": se expanden uno a uno bajo demanda
+    deferred_idx = [i for i, r in enumerate(session_results) if r.get("deferred")]
+    if deferred_idx:
+        st.markdown("**Generar explicación y respuesta (modo solo clasificación):**")
+        selected = st.selectbox(
+            "Comentario",
+            options=deferred_idx,
+            format_func=lambda i: session_results[i]["text"][:80],
+        )
+        if st.button("Generar"):
+            with st.spinner("Generando explicación y respuesta..."):
+                expand_result(session_results[selected])
+            st.markdown("**Explanation:**")
+            st.write(session_results[selected]["explanation"])
+            st.markdown("**Suggested reply:**")
+            st.success(session_results[selected]["suggested_reply"])
+
     if st.button("Limpiar resultados de sesión"):
         st.session_state["session_results"] = []
+        st.session_state["session_stats"] = None
         st.rerun()
+
+
+# Mientras haya un batch en curso, se vuelve a ejecutar el script para
+# pintar los resultados nuevos (el batch sigue en su hilo)
+if batch_running:
+    time.sleep(BATCH_POLL_INTERVAL_S)
+    st.rerun()
@@ -0,0 +1,105 @@
+# src/bench_backend_pool.py
+
+"""
+Benchmark del pool de servidores Ollama (models/backend_pool.py).
+
+Levanta varios models/fake_ollama_server.py, cada uno atendiendo como
+mucho --max-parallel generaciones a la vez (como un Ollama real con
+OLLAMA_NUM_PARALLEL), y analiza el mismo batch:
+  - con un solo host;
+  - con --hosts hosts detrás de un PooledChatOllama.
+Con hosts iguales el throughput debería crecer casi linealmente.
+
+Después repite el batch con un host que responde siempre 500 y otro
+apagado: todos los comentarios deberían salir bien y esos dos hosts
+quedar fuera de la rotación.
+
+Uso:
+    python src/bench_backend_pool.py --hosts 3 --comments 24
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+from contextlib import ExitStack
+from typing import Any, Dict, List, Sequence
+
+from chains.batch_runner import run_batch
+from chains.registry import get_sentiment_chain, register_llm
+from models.backend_pool import get_backend_pool
+from models.fake_ollama_server import FakeOllamaServer
+from models.llm_config import get_llm
+
+
+TEXTS = [
+    "El producto llegó rápido y en perfectas condiciones. Muy satisfecho.",
+    "The package was fine but the instructions were confusing.",
+    "El envío llegó con una semana de retraso y nadie respondió mis correos.",
+]
+
+
+def run(base_urls: Sequence[str], n_comments: int, max_concurrency: int) -> Dict[str, Any]:
+    register_llm("A", get_llm("A", use_cache=False, base_urls=base_urls))
+    texts = [f"{TEXTS[i % len(TEXTS)]} (#{i})" for i in range(n_comments)]
+
+    start = time.perf_counter()
+    results = run_batch(get_sentiment_chain("A"), texts, max_concurrency=max_concurrency)
+    elapsed = time.perf_counter() - start
+
+    return {
+        "elapsed_s": elapsed,
+        "comments_per_s": n_comments / elapsed,
+        "errors": sum(1 for r in results if r.get("error")),
+        "backends": get_backend_pool(base_urls).stats(),
+    }
+
+
+def print_backends(backends: List[Dict[str, Any]]) -> None:
+    for b in backends:
+        state = "up" if b["healthy"] else "DOWN"
+        print(f"    {b['base_url']:<28}{state:>6}  served={b['served']:<4} failures={b['failures']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--hosts", type=int, default=3)
+    parser.add_argument("--comments", type=int, default=24)
+    parser.add_argument("--max-parallel", type=int, default=1, help="generaciones a la vez por host")
+    parser.add_argument("--latency", type=float, default=0.05, help="segundos hasta el primer token")
+    args = parser.parse_args()
+
+    server_kwargs = {"prompt_latency_s": args.latency, "max_parallel": args.max_parallel}
+    concurrency = args.hosts * args.max_parallel * 2
+
+    with ExitStack() as stack:
+        servers = [
+            stack.enter_context(FakeOllamaServer(**server_kwargs)) for _ in range(args.hosts)
+        ]
+        urls = [s.base_url for s in servers]
+
+        single = run(urls[:1], args.comments, concurrency)
+        pooled = run(urls, args.comments, concurrency)
+
+        print(f"{args.comments} comments, {args.max_parallel} generation(s) at a time per host")
+        print(f"  1 host:   {single['comments_per_s']:.2f} comments/s ({single['elapsed_s']:.2f}s)")
+        print(
+            f"  {args.hosts} hosts:  {pooled['comments_per_s']:.2f} comments/s "
+            f"({pooled['elapsed_s']:.2f}s, {single['elapsed_s'] / pooled['elapsed_s']:.2f}x)"
+        )
+        print_backends(pooled["backends"])
+
+        # Failover: un host que siempre falla y otro apagado
+        broken = stack.enter_context(FakeOllamaServer(error_rate=1.0, **server_kwargs))
+        stopped = FakeOllamaServer(**server_kwargs)
+        stopped_url = stopped.base_url
+        stopped._httpd.server_close()
+
+        failover = run([broken.base_url, stopped_url, *urls], args.comments, concurrency)
+        print(f"\nFailover ({args.hosts} healthy hosts + one returning 500 + one down):")
+        print(f"  errors: {failover['errors']} / {args.comments}")
+        print_backends(failover["backends"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+# src/bench_chain_registry.py
+
+"""
+Micro-benchmark: coste por llamada de reconstruir la cadena vs usar el registro.
+
+Antes, cada invocación del grafo llamaba a build_sentiment_agent_chain(),
+que crea un ChatOllama nuevo (get_llm) y compone los runnables.
+Ahora los nodos usan get_sentiment_chain(), que la construye una sola vez.
+
+No hace llamadas al LLM: solo mide la construcción (no necesita Ollama).
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+
+from chains.registry import clear_chain_registry, get_sentiment_chain
+from chains.sentiment_chain import build_sentiment_agent_chain
+
+
+def time_per_call(fn, n: int) -> float:
+    start = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - start) / n
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", type=int, default=200, help="número de llamadas")
+    args = parser.parse_args()
+
+    clear_chain_registry()
+
+    rebuild = time_per_call(lambda: build_sentiment_agent_chain(config="A"), args.n)
+    registry = time_per_call(lambda: get_sentiment_chain(config="A"), args.n)
+
+    print(f"build_sentiment_agent_chain(): {rebuild * 1e6:10.1f} us per call")
+    print(f"get_sentiment_chain():         {registry * 1e6:10.1f} us per call")
+    print(f"Overhead removed per call:     {(rebuild - registry) * 1e6:10.1f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+# src/bench_checkpoint_growth.py
+
+"""
+Benchmark: crecimiento del checkpoint y de la latencia por turno en una
+sesión larga (mismo thread_id).
+
+Mide, por turno, los bytes que el checkpointer serializa y el tiempo de
+la invocación del grafo, y el crecimiento entre el primer y el último
+tramo:
+
+- Por defecto "results" guarda todo el historial, así que los bytes por
+  turno crecen linealmente con la sesión (se informa, no es un fallo).
+- Con --results-window N (build_agent_graph(results_window=N)) el estado
+  solo guarda los N más recientes: una vez lleno ese window los bytes por
+  turno dejan de crecer, y el script termina con código 1 si el último
+  tramo serializa más de --max-growth veces lo que el primer tramo
+  completo tras llenarse el window.
+
+Usa un LLM simulado sin latencia, así que no necesita Ollama.
+
+Uso:
+    python src/bench_checkpoint_growth.py --turns 500 --checkpointer memory
+    python src/bench_checkpoint_growth.py --turns 500 --results-window 50
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from chains.registry import register_llm
+from graph.graph_builder import build_agent_graph
+from models.fake_llm import SimulatedLLM
+
+
+class CountingSerde:
+    """Envuelve el serializer del checkpointer y cuenta los bytes escritos."""
+
+    def __init__(self, inner):
+        self.inner = inner
+        self.bytes_written = 0
+        self._lock = threading.Lock()
+
+    def dumps_typed(self, obj):
+        type_, data = self.inner.dumps_typed(obj)
+        with self._lock:
+            self.bytes_written += len(data)
+        return type_, data
+
+    def loads_typed(self, data):
+        return self.inner.loads_typed(data)
+
+    def __getattr__(self, name):
+        return getattr(self.inner, name)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--checkpointer", choices=["memory", "sqlite"], default="memory")
+    parser.add_argument("--turns", type=int, default=300)
+    parser.add_argument("--report-every", type=int, default=50)
+    parser.add_argument("--results-window", type=int, default=None, help="resultados recientes guardados en el estado")
+    parser.add_argument("--max-growth", type=float, default=1.2, help="bytes/turno último tramo / primer tramo con el window lleno")
+    args = parser.parse_args()
+
+    register_llm("A", SimulatedLLM(latency_s=0.0).as_runnable())
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = build_agent_graph(
+            checkpointer=args.checkpointer,
+            db_path=Path(tmp) / "bench_checkpoints.sqlite",
+            results_window=args.results_window,
+        )
+        serde = CountingSerde(app.checkpointer.serde)
+        app.checkpointer.serde = serde
+
+        config = {"configurable": {"thread_id": "bench-long-session"}}
+
+        print(f"checkpointer={args.checkpointer} turns={args.turns} results_window={args.results_window}")
+        print(f"{'turn':>6} {'bytes/turn':>12} {'ms/turn':>10}")
+
+        window_bytes = 0
+        window_time = 0.0
+        reported = []  # (turno, bytes/turno) de cada tramo
+        for turn in range(1, args.turns + 1):
+            before = serde.bytes_written
+            start = time.perf_counter()
+            app.invoke({"user_input": f"Comentario número {turn}: todo bien."}, config=config)
+            window_time += time.perf_counter() - start
+            window_bytes += serde.bytes_written - before
+
+            if turn % args.report_every == 0:
+                n = args.report_every
+                print(f"{turn:>6} {window_bytes / n:>12.0f} {window_time / n * 1000:>10.2f}")
+                reported.append((turn, window_bytes / n))
+                window_bytes = 0
+                window_time = 0.0
+
+    # tramos que empiezan con el window de resultados ya lleno
+    window = args.results_window or 0
+    full = [b for turn, b in reported if turn - args.report_every >= window]
+    if len(full) < 2:
+        print(f"\nNot enough turns to measure growth (need > {window} + 2 x {args.report_every}).")
+        return
+    growth = full[-1] / full[0]
+    if not window:
+        print(f"\nbytes/turn growth (full history, grows with the session): {growth:.2f}x")
+        return
+    print(f"\nbytes/turn growth after the first {window} turns: {growth:.2f}x (max {args.max_growth:.2f}x)")
+    if growth > args.max_growth:
+        print("REGRESSION: the checkpoint keeps growing with the session", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+# src/bench_checkpointer_memory.py
+
+"""
+Benchmark de memoria: miles de sesiones (thread_id) simuladas contra el grafo.
+
+Compara el RSS del proceso con MemorySaver (todo en RAM) y con el
+checkpointer SQLite con retención (graph/checkpointer.py). Con SQLite el
+RSS debería quedarse plano aunque crezca el número de sesiones.
+
+Usa un LLM simulado sin latencia, así que no necesita Ollama.
+
+Uso:
+    python src/bench_checkpointer_memory.py --checkpointer sqlite --sessions 5000
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import resource
+import tempfile
+import time
+from pathlib import Path
+
+from chains.registry import register_llm
+from graph.graph_builder import build_agent_graph
+from models.fake_llm import SimulatedLLM
+
+
+def current_rss_mb() -> float:
+    """RSS actual (Linux: /proc/self/statm); si no, el máximo de getrusage."""
+    statm = Path("/proc/self/statm")
+    if statm.exists():
+        pages = int(statm.read_text().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--checkpointer", choices=["memory", "sqlite"], default="sqlite")
+    parser.add_argument("--sessions", type=int, default=2000)
+    parser.add_argument("--turns", type=int, default=3, help="invocaciones por sesión")
+    parser.add_argument("--keep-last", type=int, default=2)
+    parser.add_argument("--report-every", type=int, default=250)
+    args = parser.parse_args()
+
+    register_llm("A", SimulatedLLM(latency_s=0.0).as_runnable())
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = build_agent_graph(
+            checkpointer=args.checkpointer,
+            db_path=Path(tmp) / "bench_checkpoints.sqlite",
+            keep_last=args.keep_last,
+        )
+
+        start = time.perf_counter()
+        print(f"checkpointer={args.checkpointer} sessions={args.sessions} turns={args.turns}")
+        print(f"{'sessions':>10} {'rss_mb':>10} {'elapsed_s':>10}")
+        print(f"{0:>10} {current_rss_mb():>10.1f} {0.0:>10.1f}")
+
+        for i in range(1, args.sessions + 1):
+            config = {"configurable": {"thread_id": f"bench-session-{i}"}}
+            for turn in range(args.turns):
+                app.invoke({"user_input": f"Comentario {turn} de la sesión {i}."}, config=config)
+
+            if i % args.report_every == 0:
+                elapsed = time.perf_counter() - start
+                print(f"{i:>10} {current_rss_mb():>10.1f} {elapsed:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
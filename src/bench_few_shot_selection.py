@@ -0,0 +1,164 @@
+# src/bench_few_shot_selection.py
+
+"""
+Comparación: prompt de sentimiento con ejemplos fijos vs ejemplos elegidos
+por texto (chains/example_selector.py) sobre el dataset de evaluación.
+
+- Tokens: se renderiza el prompt de cada comentario con cada variante y
+  se estiman (estimate_tokens, ~4 caracteres por token) su tamaño total y
+  los tokens que Ollama tiene que evaluar de verdad: los que siguen al
+  prefijo común con el prompt anterior, que es lo que reutiliza de su
+  caché KV (el equivalente offline de prompt_eval_count). No necesita
+  Ollama.
+- Accuracy (sin --offline): se clasifica cada comentario con cada variante
+  (solo clasificación, sin caché de respuestas) y se compara con las
+  etiquetas reales, junto con el prompt_eval_count medio que devuelve
+  Ollama (tokens evaluados, sin el prefijo reutilizado).
+
+El script termina con código 1 si alguna k no reduce los tokens totales
+del prompt estático o (sin --offline) pierde más de --max-accuracy-drop
+de accuracy respecto a él.
+
+Uso:
+    python src/bench_few_shot_selection.py --offline
+    python src/bench_few_shot_selection.py --k 1 2 3
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import statistics
+import sys
+from pathlib import Path
+from typing import Any, Dict, List
+
+from chains.example_selector import DEFAULT_FEW_SHOT_K, get_example_selector
+from chains.packed_classifier import estimate_tokens
+from chains.sentiment_chain import (
+    _parse_sentiment_str,
+    sentiment_fewshot_prompt_tmpl,
+    sentiment_prompt_tmpl,
+)
+from models.llm_config import get_llm
+from tools.stats_tools import compute_classification_metrics
+
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+DATA_PATH = BASE_DIR / "data" / "examples_raw.json"
+
+
+def render_prompts(texts: List[str], ks: List[int]) -> Dict[str, List[Any]]:
+    selector = get_example_selector()
+    prompts = {"static": [sentiment_prompt_tmpl.invoke({"user_text": t}) for t in texts]}
+    for k in ks:
+        prompts[f"k={k}"] = [
+            sentiment_fewshot_prompt_tmpl.invoke({"user_text": t, "examples": selector.render(t, k=k)})
+            for t in texts
+        ]
+    return prompts
+
+
+def _common_prefix_len(a: str, b: str) -> int:
+    n = min(len(a), len(b))
+    i = 0
+    while i < n and a[i] == b[i]:
+        i += 1
+    return i
+
+
+def evaluated_tokens(rendered: List[str]) -> List[int]:
+    """
+    Tokens que quedan por evaluar en cada prompt si el anterior (en bucle,
+    como en régimen estable) dejó su prefijo en la caché de Ollama.
+    """
+    out = []
+    for i, prompt in enumerate(rendered):
+        previous = rendered[i - 1]
+        out.append(estimate_tokens(prompt[_common_prefix_len(previous, prompt):]))
+    return out
+
+
+def classify(llm: Any, prompts: List[Any]) -> Dict[str, Any]:
+    preds: List[str] = []
+    eval_counts: List[int] = []
+    for prompt in prompts:
+        msg = llm.invoke(prompt)
+        try:
+            preds.append(_parse_sentiment_str(msg.content)["sentiment"])
+        except ValueError:
+            preds.append("")
+        count = (msg.response_metadata or {}).get("prompt_eval_count")
+        if count:
+            eval_counts.append(int(count))
+    return {"preds": preds, "prompt_eval_count": eval_counts}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--k", type=int, nargs="+", default=sorted({1, 2, DEFAULT_FEW_SHOT_K}), help="ejemplos elegidos por prompt"
+    )
+    parser.add_argument("--max-accuracy-drop", type=float, default=0.0)
+    parser.add_argument("--config", default="A", choices=["A", "B"])
+    parser.add_argument("--offline", action="store_true", help="solo tokens, sin llamar a Ollama")
+    args = parser.parse_args()
+
+    examples = json.loads(DATA_PATH.read_text(encoding="utf-8"))
+    texts = [ex["text"] for ex in examples]
+    labels = [ex["label"] for ex in examples]
+
+    prompts = render_prompts(texts, ks=args.k)
+
+    print(f"{len(texts)} eval comments, estimated tokens per comment")
+    print(f"\n{'prompt':<10}{'total':>10}{'evaluated':>12}{'vs static':>11}")
+    totals: Dict[str, float] = {}
+    for name, rendered in prompts.items():
+        strings = [p.to_string() for p in rendered]
+        totals[name] = statistics.mean(estimate_tokens(p) for p in strings)
+        evaluated = statistics.mean(evaluated_tokens(strings))
+        print(f"{name:<10}{totals[name]:>10.1f}{evaluated:>12.1f}{totals[name] / totals['static']:>10.2f}x")
+
+    problems = [
+        f"{name}: {totals[name]:.0f} tokens >= static {totals['static']:.0f}"
+        for name in totals
+        if name != "static" and totals[name] >= totals["static"]
+    ]
+
+    if not args.offline:
+        problems += compare_accuracy(prompts, labels, args.config, args.max_accuracy_drop)
+
+    if problems:
+        print("\nFEW-SHOT SELECTION IS NOT A WIN:", file=sys.stderr)
+        for p in problems:
+            print(f"  - {p}", file=sys.stderr)
+        sys.exit(1)
+
+
+def compare_accuracy(
+    prompts: Dict[str, List[Any]], labels: List[str], config: str, max_drop: float
+) -> List[str]:
+
+    llm = get_llm(config, use_cache=False)
+
+    print(f"\n{'prompt':<10}{'accuracy':>10}{'macro F1':>10}{'prompt_eval_count':>20}")
+    accuracy: Dict[str, float] = {}
+    for name, rendered in prompts.items():
+        out = classify(llm, rendered)
+        metrics = compute_classification_metrics(out["preds"], labels)
+        accuracy[name] = metrics["accuracy"]
+        evals = out["prompt_eval_count"]
+        eval_str = f"{statistics.mean(evals):.1f}" if evals else "n/a"
+        print(
+            f"{name:<10}{metrics['accuracy']:>10.2f}{metrics['macro']['f1']:>10.2f}{eval_str:>20}"
+        )
+
+    return [
+        f"{name}: accuracy {accuracy[name]:.2f} < static {accuracy['static']:.2f} - {max_drop:.2f}"
+        for name in accuracy
+        if name != "static" and accuracy[name] < accuracy["static"] - max_drop
+    ]
+
+
+if __name__ == "__main__":
+    main()
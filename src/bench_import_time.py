@@ -0,0 +1,213 @@
+# src/bench_import_time.py
+
+"""
+Benchmark del arranque en frío: cuánto cuesta importar el CLI y la app.
+
+Para cada objetivo lanza --repeats procesos nuevos con
+`python -X importtime` y se queda con el mejor:
+
+- cli: `import run_chat_cli`.
+- app: los imports del proyecto que hace app_streamlit.py (se leen del
+  propio fichero; streamlit no se cuenta, no es nuestro).
+
+Mide el tiempo de import (suma de los imports de primer nivel, sin los
+del arranque del intérprete) y el tiempo total del proceso, y lista los
+paquetes que más tiempo se llevan (tiempo propio de sus módulos).
+
+Además comprueba que el arranque sigue siendo perezoso:
+- ninguno de LAZY_PACKAGES (sklearn, chromadb, langchain_community,
+  numpy...) se importa: solo hacen falta al llamar al LLM, usar la
+  cascada o la caché semántica, o evaluar;
+- no se ha construido ningún template de prompt (get_chat_prompt).
+
+Baseline: --save-baseline guarda los tiempos en
+benchmarks/import_time.json; sin esa opción el script termina con
+código 1 si algún objetivo tarda más de --tolerance sobre el baseline
+o si se rompe alguna de las comprobaciones anteriores.
+
+Uso:
+    python src/bench_import_time.py --save-baseline
+    python src/bench_import_time.py
+    python src/bench_import_time.py --targets cli --top 20
+"""
+
+from __future__ import annotations
+
+import argparse
+import ast
+import json
+import os
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+
+BASE_DIR = Path(__file__).resolve().parents[1]  # carpeta raíz del proyecto
+SRC_DIR = BASE_DIR / "src"
+APP_PATH = BASE_DIR / "app_streamlit.py"
+DEFAULT_BASELINE_PATH = BASE_DIR / "benchmarks" / "import_time.json"
+DEFAULT_TOLERANCE = 0.3
+
+PROJECT_PACKAGES = ("chains", "graph", "models", "tools")
+LAZY_PACKAGES = ("sklearn", "joblib", "chromadb", "langchain_community", "numpy")
+
+# Se ejecuta en el proceso medido después de los imports del objetivo
+_PROBE = """
+import json, sys
+_m = sys.modules.get("chains.sentiment_chain")
+_get = getattr(_m, "get_chat_prompt", None)
+_built = _get.cache_info().currsize if _get else sum(k.endswith("_tmpl") for k in (vars(_m) if _m else {}))
+print(json.dumps({"prompts_built": _built}))
+"""
+
+
+def app_imports() -> List[str]:
+    """Sentencias `from chains/graph/models/tools... import ...` de app_streamlit.py."""
+    tree = ast.parse(APP_PATH.read_text(encoding="utf-8"))
+    statements = []
+    for node in tree.body:
+        if isinstance(node, ast.ImportFrom) and (node.module or "").split(".")[0] in PROJECT_PACKAGES:
+            statements.append(ast.unparse(node))
+    return statements
+
+
+def targets() -> Dict[str, str]:
+    return {
+        "cli": "import run_chat_cli",
+        "app": "\n".join(app_imports()),
+    }
+
+
+def parse_importtime(stderr: str) -> List[Tuple[str, int, int, int]]:
+    """Líneas de -X importtime -> [(módulo, profundidad, self_us, cumulative_us)]."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3 or not parts[0].strip().isdigit():
+            continue  # cabecera
+        name = parts[2].rstrip()
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((name.strip(), depth, int(parts[0]), int(parts[1])))
+    return rows
+
+
+def run_once(code: str) -> Dict[str, Any]:
+    env = {**os.environ, "PYTHONPATH": str(SRC_DIR)}
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=SRC_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    wall_s = time.perf_counter() - start
+    if proc.returncode != 0:
+        raise RuntimeError(f"import failed:\n{proc.stderr[-2000:]}")
+    rows = parse_importtime(proc.stderr)
+    out = proc.stdout.strip().splitlines()
+    probe = json.loads(out[-1]) if out else {}
+    return {"rows": rows, "wall_s": wall_s, **probe}
+
+
+def measure(code: str, repeats: int, startup_modules: set) -> Dict[str, Any]:
+    best = None
+    for _ in range(repeats):
+        run = run_once(code + "\n" + _PROBE)
+        rows = [r for r in run["rows"] if r[0] not in startup_modules]
+        run["import_ms"] = sum(cum for _, depth, _, cum in rows if depth == 0) / 1000.0
+        run["rows"] = rows
+        if best is None or run["import_ms"] < best["import_ms"]:
+            best = run
+
+    assert best is not None
+    by_package: Dict[str, int] = defaultdict(int)
+    for name, _, self_us, _ in best["rows"]:
+        by_package[name.split(".")[0]] += self_us
+    modules = {name for name, *_ in best["rows"]}
+    return {
+        "import_ms": round(best["import_ms"], 1),
+        "wall_ms": round(best["wall_s"] * 1000.0, 1),
+        "modules": len(modules),
+        "prompts_built": best["prompts_built"],
+        "lazy_violations": sorted(p for p in LAZY_PACKAGES if p in modules),
+        "top_packages": sorted(by_package.items(), key=lambda kv: -kv[1]),
+    }
+
+
+def check(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    problems: List[str] = []
+    for name, r in results.items():
+        if r["lazy_violations"]:
+            problems.append(f"{name}: imports {', '.join(r['lazy_violations'])} at startup")
+        if r["prompts_built"]:
+            problems.append(f"{name}: {r['prompts_built']} prompt template(s) built at import time")
+        base = baseline.get(name)
+        if base and r["import_ms"] > base["import_ms"] * (1 + tolerance):
+            problems.append(f"{name}: import {r['import_ms']:.0f}ms > baseline {base['import_ms']:.0f}ms")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--targets", nargs="+", choices=list(targets()), default=list(targets()))
+    parser.add_argument("--repeats", type=int, default=5, help="procesos por objetivo (se usa el mejor)")
+    parser.add_argument("--top", type=int, default=8, help="paquetes más lentos a mostrar")
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="guarda estos tiempos como baseline")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    args = parser.parse_args()
+
+    # lo que importa el intérprete al arrancar (site, encodings...) no cuenta
+    startup_modules = {name for name, *_ in run_once("pass")["rows"]}
+
+    code_by_target = targets()
+    for name in args.targets:
+        run_once(code_by_target[name])  # compila los .pyc si hace falta
+    results = {name: measure(code_by_target[name], args.repeats, startup_modules) for name in args.targets}
+
+    baseline: Dict[str, Any] = {}
+    if not args.save_baseline and args.baseline.exists():
+        baseline = json.loads(args.baseline.read_text(encoding="utf-8")).get("targets", {})
+
+    print(f"{'target':<8}{'import ms':>11}{'process ms':>12}{'modules':>9}{'vs base':>9}")
+    for name, r in results.items():
+        line = f"{name:<8}{r['import_ms']:>11.1f}{r['wall_ms']:>12.1f}{r['modules']:>9}"
+        base = baseline.get(name)
+        if base and base["import_ms"]:
+            line += f"{r['import_ms'] / base['import_ms']:>8.2f}x"
+        print(line)
+    for name, r in results.items():
+        top = ", ".join(f"{pkg} {us / 1000:.0f}ms" for pkg, us in r["top_packages"][: args.top])
+        print(f"\n{name} - slowest packages (self time): {top}")
+
+    if args.save_baseline:
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        doc = {
+            "python": sys.version.split()[0],
+            "targets": {
+                name: {"import_ms": r["import_ms"], "wall_ms": r["wall_ms"], "modules": r["modules"]}
+                for name, r in results.items()
+            },
+        }
+        args.baseline.write_text(json.dumps(doc, indent=2) + "\n", encoding="utf-8")
+        print(f"\nBaseline saved to {args.baseline}")
+
+    problems = check(results, baseline, args.tolerance)
+    if problems:
+        print(f"\nREGRESSION (tolerance {args.tolerance:.0%}):", file=sys.stderr)
+        for p in problems:
+            print(f"  - {p}", file=sys.stderr)
+        sys.exit(1)
+    if not args.save_baseline:
+        print("\nStartup is lazy" + (" and within the baseline." if baseline else "; no baseline to compare."))
+
+
+if __name__ == "__main__":
+    main()
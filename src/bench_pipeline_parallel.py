@@ -0,0 +1,59 @@
+# src/bench_pipeline_parallel.py
+
+"""
+Benchmark: pipeline secuencial vs pipeline con explicación y respuesta en paralelo.
+
+Usa un LLM simulado (models/fake_llm.py) con latencia fija por llamada,
+así que no necesita Ollama. Con latencia L por llamada se espera:
+  - secuencial: ~3L por comentario
+  - paralelo:   ~2L por comentario
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+
+from chains.sentiment_chain import build_sentiment_agent_chain
+from models.fake_llm import SimulatedLLM
+
+
+TEXTS = [
+    "El producto llegó rápido y en perfectas condiciones. Muy satisfecho.",
+    "The package was fine but the instructions were confusing.",
+    "El envío llegó con una semana de retraso y nadie respondió mis correos.",
+]
+
+
+def time_chain(parallel: bool, latency_s: float, repeats: int) -> float:
+    fake = SimulatedLLM(latency_s=latency_s)
+    chain = build_sentiment_agent_chain(
+        config="A", parallel=parallel, llm=fake.as_runnable()
+    )
+
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for t in TEXTS:
+            chain.invoke({"user_text": t})
+    elapsed = time.perf_counter() - start
+
+    return elapsed / (repeats * len(TEXTS))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--latency", type=float, default=0.2, help="segundos por llamada al LLM")
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    seq = time_chain(parallel=False, latency_s=args.latency, repeats=args.repeats)
+    par = time_chain(parallel=True, latency_s=args.latency, repeats=args.repeats)
+
+    print(f"Simulated LLM latency: {args.latency:.3f}s per call")
+    print(f"Sequential pipeline:   {seq:.3f}s per comment")
+    print(f"Parallel pipeline:     {par:.3f}s per comment")
+    print(f"Speedup:               {seq / par:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+# src/bench_prompt_prefix_cache.py
+
+"""
+Benchmark: reutilización del prefijo del prompt en Ollama (caché KV).
+
+Necesita Ollama en marcha (no usa el LLM simulado): lee de la respuesta
+de cada llamada `prompt_eval_count` (tokens del prompt que Ollama ha
+tenido que evaluar) y `prompt_eval_duration` (ns).
+
+Compara dos formas de mandar el prompt de sentimiento para los mismos
+comentarios, llamada a llamada y sin caché de respuestas:
+  - single_message: instrucciones + few-shot + USER_TEXT en un solo
+    mensaje humano (como estaba antes).
+  - system_prefix:  instrucciones + few-shot como mensaje de sistema fijo
+    y USER_TEXT en un mensaje humano corto (chains/sentiment_chain.py).
+
+Si el prefijo se reutiliza, en system_prefix el nº de tokens evaluados
+por comentario baja a más o menos los del mensaje humano.
+La primera llamada de cada variante (prefijo en frío) no cuenta en la media.
+"""
+
+from __future__ import annotations
+
+import argparse
+import statistics
+import time
+from typing import Any, Dict, List
+
+from langchain_core.prompts import ChatPromptTemplate
+
+from chains.sentiment_chain import load_prompt, sentiment_prompt_tmpl
+from models.llm_config import DEFAULT_KEEP_ALIVE, get_llm
+
+
+TEXTS = [
+    "El producto llegó rápido y en perfectas condiciones. Muy satisfecho.",
+    "The package was fine but the instructions were confusing.",
+    "El envío llegó con una semana de retraso y nadie respondió mis correos.",
+    "Great value for the price, I would buy it again.",
+    "No funciona como esperaba, pero el soporte me ayudó bastante.",
+    "Delivery was on time. Nothing else to add.",
+]
+
+
+def single_message_prompt() -> ChatPromptTemplate:
+    return ChatPromptTemplate.from_template(
+        load_prompt("sentiment_system.txt") + "\n" + load_prompt("sentiment_prompt.txt")
+    )
+
+
+def run_layout(llm: Any, prompt: ChatPromptTemplate, texts: List[str]) -> Dict[str, Any]:
+    chain = prompt | llm
+    counts: List[int] = []
+    durations_ms: List[float] = []
+    wall_s: List[float] = []
+
+    for text in texts:
+        start = time.perf_counter()
+        msg = chain.invoke({"user_text": text})
+        wall_s.append(time.perf_counter() - start)
+
+        meta = msg.response_metadata or {}
+        counts.append(int(meta.get("prompt_eval_count") or 0))
+        durations_ms.append(float(meta.get("prompt_eval_duration") or 0) / 1e6)
+
+    warm = slice(1, None) if len(texts) > 1 else slice(None)
+    return {
+        "cold_prompt_tokens": counts[0],
+        "prompt_tokens": statistics.mean(counts[warm]),
+        "prompt_eval_ms": statistics.mean(durations_ms[warm]),
+        "wall_s": statistics.mean(wall_s[warm]),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--config", default="A", choices=["A", "B"])
+    parser.add_argument("--repeats", type=int, default=2, help="veces que se recorre TEXTS")
+    parser.add_argument(
+        "--keep-alive",
+        default=DEFAULT_KEEP_ALIVE,
+        help='keep_alive de Ollama ("30m", "-1"...)',
+    )
+    args = parser.parse_args()
+
+    keep_alive: Any = args.keep_alive
+    if keep_alive.lstrip("-").isdigit():
+        keep_alive = int(keep_alive)
+
+    llm = get_llm(args.config, use_cache=False, keep_alive=keep_alive)
+    texts = TEXTS * args.repeats
+
+    layouts = {
+        "single_message": single_message_prompt(),
+        "system_prefix": sentiment_prompt_tmpl,
+    }
+
+    print(f"Config {args.config}, {len(texts)} comments per layout, keep_alive={keep_alive}")
+    print(f"{'layout':<16}{'cold tokens':>13}{'tokens/comment':>16}{'prompt eval ms':>16}{'wall s':>9}")
+
+    results = {}
+    for name, prompt in layouts.items():
+        r = run_layout(llm, prompt, texts)
+        results[name] = r
+        print(
+            f"{name:<16}{r['cold_prompt_tokens']:>13}{r['prompt_tokens']:>16.1f}"
+            f"{r['prompt_eval_ms']:>16.1f}{r['wall_s']:>9.2f}"
+        )
+
+    base = results["single_message"]["prompt_eval_ms"]
+    new = results["system_prefix"]["prompt_eval_ms"]
+    if new > 0:
+        print(f"\nPrompt evaluation time per comment: {base / new:.2f}x lower with the system prefix")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+# src/bench_streaming_ttft.py
+
+"""
+Benchmark: tiempo hasta el primer token (TTFT) con streaming vs invoke.
+
+Usa un LLM simulado que emite la respuesta palabra a palabra
+(models/fake_llm.py con token_latency_s > 0), así que no necesita Ollama.
+Con invoke el usuario no ve nada hasta que terminan la clasificación, la
+explicación y la respuesta; con build_sentiment_stream ve la clasificación
+tras la primera llamada y el primer token de la explicación poco después.
+"""
+
+from __future__ import annotations
+
+import argparse
+import statistics
+import time
+
+from chains.sentiment_chain import build_sentiment_agent_chain, build_sentiment_stream
+from models.fake_llm import SimulatedLLM
+
+
+TEXTS = [
+    "El producto llegó rápido y en perfectas condiciones. Muy satisfecho.",
+    "The package was fine but the instructions were confusing.",
+    "El envío llegó con una semana de retraso y nadie respondió mis correos.",
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--latency", type=float, default=0.2, help="segundos hasta el primer token")
+    parser.add_argument("--token-latency", type=float, default=0.02, help="segundos entre tokens")
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    fake = SimulatedLLM(latency_s=args.latency, token_latency_s=args.token_latency)
+    chain = build_sentiment_agent_chain(config="A", llm=fake.as_runnable())
+    stream = build_sentiment_stream(config="A", llm=fake.as_runnable())
+
+    invoke_times = []
+    classification_times = []
+    ttfts = []
+    stream_totals = []
+
+    for _ in range(args.repeats):
+        for t in TEXTS:
+            start = time.perf_counter()
+            chain.invoke({"user_text": t})
+            invoke_times.append(time.perf_counter() - start)
+
+            for event in stream({"user_text": t}):
+                if event["event"] == "end":
+                    timings = event["timings"]
+                    classification_times.append(timings["classification_s"])
+                    ttfts.append(timings["ttft_s"])
+                    stream_totals.append(timings["total_s"])
+
+    invoke_s = statistics.median(invoke_times)
+    classification_s = statistics.median(classification_times)
+    ttft_s = statistics.median(ttfts)
+
+    print(f"Simulated LLM: {args.latency:.3f}s to first token, {args.token_latency:.3f}s per token")
+    print(f"invoke (first visible output):  {invoke_s:.3f}s per comment")
+    print(f"stream classification:          {classification_s:.3f}s ({invoke_s / classification_s:.2f}x sooner)")
+    print(f"stream first token (TTFT):      {ttft_s:.3f}s ({invoke_s / ttft_s:.2f}x sooner)")
+    print(f"stream total:                   {statistics.median(stream_totals):.3f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,370 @@
+# src/bench_suite.py
+
+"""
+Suite de benchmarks de extremo a extremo contra un Ollama falso.
+
+Levanta models/fake_ollama_server.py en un puerto libre y registra como
+LLM compartido de la config A un ChatOllama real apuntando a él (sin
+caché de respuestas), así que se mide todo el camino: cliente HTTP,
+streaming NDJSON, cadenas, grafo y parseo. No necesita Ollama.
+
+Escenarios (una "op" es lo que se cronometra cada vez):
+- parse_sentiment / parse_packed: parseo de la salida del LLM (op = PARSE_BATCH
+  parseos, para que el coste de cronometrar no domine).
+- chain_single: get_sentiment_chain("A").invoke (op = 1 comentario).
+- chain_batch: run_batch sobre --batch-size comentarios (op = 1 batch).
+- graph_single / graph_batch: el grafo compilado, rutas single y batch.
+- stream_batch: batch_runner.stream_batch (lo que usa run_stream_batch.py).
+- viral: --batch-size hilos piden a la vez el mismo comentario a la cadena
+  (op = la ráfaga); con single-flight se resuelven con una sola ejecución.
+- eval: run_eval_configs.run_eval_for_config("A") sobre el dataset, con los
+  logs en un directorio temporal (op = 1 eval completo).
+
+Para cada uno: ops/s, latencia p50/p95/p99 por op (ms) y llamadas al LLM
+por comentario (peticiones que recibe el servidor falso).
+
+Baseline: --save-baseline guarda los números en benchmarks/baseline.json.
+Sin esa opción se compara contra él y el script termina con código 1
+si algún escenario pierde más de --tolerance de ops/s, sube su p95 más
+de --tolerance o hace más llamadas al LLM por comentario.
+
+Uso:
+    python src/bench_suite.py --save-baseline
+    python src/bench_suite.py
+    python src/bench_suite.py --scenarios chain_single graph_batch
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import io
+import json
+import sys
+import tempfile
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from chains.batch_runner import run_batch, stream_batch
+from chains.packed_classifier import _parse_packed_str
+from chains.registry import get_sentiment_chain, register_llm
+from chains.sentiment_chain import _parse_sentiment_str
+from graph.graph_builder import build_agent_graph
+from models.fake_llm import CANNED_SENTIMENT_JSON, _canned_packed_json
+from models.fake_ollama_server import FakeOllamaServer
+from models.llm_config import get_llm
+
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+DATA_PATH = BASE_DIR / "data" / "examples_raw.json"
+DEFAULT_BASELINE_PATH = BASE_DIR / "benchmarks" / "baseline.json"
+DEFAULT_TOLERANCE = 0.25
+PARSE_BATCH = 200
+
+SCENARIOS = (
+    "parse_sentiment",
+    "parse_packed",
+    "chain_single",
+    "chain_batch",
+    "graph_single",
+    "graph_batch",
+    "stream_batch",
+    "viral",
+    "eval",
+)
+
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    """Percentil q (0-100) con interpolación lineal; la lista ya viene ordenada."""
+    if not sorted_values:
+        return 0.0
+    pos = (len(sorted_values) - 1) * q / 100.0
+    lo = int(pos)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (pos - lo)
+
+
+class Bench:
+    """Estado compartido por los escenarios: servidor, textos y tamaños."""
+
+    def __init__(self, server: FakeOllamaServer, repeats: int, batch_size: int):
+        self.server = server
+        self.repeats = repeats
+        self.batch_size = batch_size
+        examples = json.loads(DATA_PATH.read_text(encoding="utf-8"))
+        self.base_texts = [ex["text"] for ex in examples]
+        self._counter = 0
+
+    def texts(self, n: int) -> List[str]:
+        """
+        n textos distintos (el dataset con un sufijo único), para que ni la
+        deduplicación de run_batch ni ninguna caché se salten llamadas.
+        """
+        out = []
+        for _ in range(n):
+            base = self.base_texts[self._counter % len(self.base_texts)]
+            out.append(f"{base} (#{self._counter})")
+            self._counter += 1
+        return out
+
+    def measure(
+        self,
+        op: Callable[[], Any],
+        n_ops: int,
+        comments_per_op: int,
+    ) -> Dict[str, Any]:
+        """Ejecuta op() n_ops veces y resume latencias y llamadas al LLM."""
+        latencies: List[float] = []
+        calls_before = self.server.stats()["calls"]
+        start = time.perf_counter()
+        for _ in range(n_ops):
+            t0 = time.perf_counter()
+            op()
+            latencies.append(time.perf_counter() - t0)
+        elapsed = time.perf_counter() - start
+        calls = self.server.stats()["calls"] - calls_before
+
+        latencies.sort()
+        comments = n_ops * comments_per_op
+        return {
+            "ops": n_ops,
+            "ops_per_s": n_ops / elapsed if elapsed else 0.0,
+            "p50_ms": _percentile(latencies, 50) * 1000,
+            "p95_ms": _percentile(latencies, 95) * 1000,
+            "p99_ms": _percentile(latencies, 99) * 1000,
+            "llm_calls_per_comment": calls / comments if comments else 0.0,
+        }
+
+
+# ---------- escenarios ----------
+
+def bench_parse_sentiment(b: Bench) -> Dict[str, Any]:
+    raw = f"Sure, here is the JSON:\n```json\n{CANNED_SENTIMENT_JSON}\n```"
+
+    def _op() -> None:
+        for _ in range(PARSE_BATCH):
+            _parse_sentiment_str(raw)
+
+    return b.measure(_op, n_ops=30 * b.repeats, comments_per_op=PARSE_BATCH)
+
+
+def bench_parse_packed(b: Bench) -> Dict[str, Any]:
+    prompt = "COMMENTS:\n" + "\n".join(f"[{i}] texto {i}" for i in range(8))
+    raw = _canned_packed_json(prompt)
+
+    def _op() -> None:
+        for _ in range(PARSE_BATCH // 8):
+            _parse_packed_str(raw, 8)
+
+    return b.measure(_op, n_ops=30 * b.repeats, comments_per_op=PARSE_BATCH)
+
+
+def bench_chain_single(b: Bench) -> Dict[str, Any]:
+    chain = get_sentiment_chain("A")
+    texts = iter(b.texts(10 * b.repeats))
+    return b.measure(
+        lambda: chain.invoke({"user_text": next(texts)}), n_ops=10 * b.repeats, comments_per_op=1
+    )
+
+
+def bench_chain_batch(b: Bench) -> Dict[str, Any]:
+    chain = get_sentiment_chain("A")
+    return b.measure(
+        lambda: run_batch(chain, b.texts(b.batch_size)),
+        n_ops=b.repeats,
+        comments_per_op=b.batch_size,
+    )
+
+
+def bench_graph_single(b: Bench) -> Dict[str, Any]:
+    app = build_agent_graph()
+    texts = iter(b.texts(10 * b.repeats))
+
+    def _op() -> None:
+        config = {"configurable": {"thread_id": f"bench-{uuid.uuid4().hex}"}}
+        app.invoke({"user_input": next(texts)}, config=config)
+
+    return b.measure(_op, n_ops=10 * b.repeats, comments_per_op=1)
+
+
+def bench_graph_batch(b: Bench) -> Dict[str, Any]:
+    app = build_agent_graph()
+
+    def _op() -> None:
+        config = {"configurable": {"thread_id": f"bench-{uuid.uuid4().hex}"}}
+        app.invoke({"user_input": "batch: " + " || ".join(b.texts(b.batch_size))}, config=config)
+
+    return b.measure(_op, n_ops=b.repeats, comments_per_op=b.batch_size)
+
+
+def bench_stream_batch(b: Bench) -> Dict[str, Any]:
+    chain = get_sentiment_chain("A")
+
+    def _op() -> None:
+        records = ({"text": t} for t in b.texts(b.batch_size))
+        for _ in stream_batch(chain, records):
+            pass
+
+    return b.measure(_op, n_ops=b.repeats, comments_per_op=b.batch_size)
+
+
+def bench_viral(b: Bench) -> Dict[str, Any]:
+    chain = get_sentiment_chain("A")
+
+    with ThreadPoolExecutor(max_workers=b.batch_size) as pool:
+
+        def _op() -> None:
+            text = b.texts(1)[0]
+            list(pool.map(lambda _: chain.invoke({"user_text": text}), range(b.batch_size)))
+
+        return b.measure(_op, n_ops=b.repeats, comments_per_op=b.batch_size)
+
+
+def bench_eval(b: Bench) -> Dict[str, Any]:
+    import run_eval_configs
+
+    with tempfile.TemporaryDirectory() as tmp:
+        run_eval_configs.LOGS_DIR = Path(tmp)
+        run_eval_configs.CHECKPOINTS_DIR = Path(tmp) / "checkpoints"
+
+        def _op() -> None:
+            with contextlib.redirect_stdout(io.StringIO()):
+                run_eval_configs.run_eval_for_config("A")
+
+        return b.measure(_op, n_ops=b.repeats, comments_per_op=len(b.base_texts))
+
+
+BENCHMARKS: Dict[str, Callable[[Bench], Dict[str, Any]]] = {
+    "parse_sentiment": bench_parse_sentiment,
+    "parse_packed": bench_parse_packed,
+    "chain_single": bench_chain_single,
+    "chain_batch": bench_chain_batch,
+    "graph_single": bench_graph_single,
+    "graph_batch": bench_graph_batch,
+    "stream_batch": bench_stream_batch,
+    "viral": bench_viral,
+    "eval": bench_eval,
+}
+
+
+# ---------- baseline ----------
+
+def compare_to_baseline(
+    results: Dict[str, Dict[str, Any]],
+    baseline: Dict[str, Dict[str, Any]],
+    tolerance: float,
+) -> List[str]:
+    """Lista de regresiones (vacía si todo está dentro de la tolerancia)."""
+    regressions: List[str] = []
+    for name, cur in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        if cur["ops_per_s"] < base["ops_per_s"] * (1 - tolerance):
+            regressions.append(
+                f"{name}: ops/s {cur['ops_per_s']:.1f} < baseline {base['ops_per_s']:.1f}"
+            )
+        if cur["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+            regressions.append(
+                f"{name}: p95 {cur['p95_ms']:.3f}ms > baseline {base['p95_ms']:.3f}ms"
+            )
+        if cur["llm_calls_per_comment"] > base["llm_calls_per_comment"] + 1e-9:
+            regressions.append(
+                f"{name}: LLM calls/comment {cur['llm_calls_per_comment']:.2f} "
+                f"> baseline {base['llm_calls_per_comment']:.2f}"
+            )
+    return regressions
+
+
+def print_table(results: Dict[str, Dict[str, Any]], baseline: Optional[Dict[str, Any]]) -> None:
+    header = f"{'scenario':<16}{'ops':>6}{'ops/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'calls/cmt':>11}"
+    if baseline:
+        header += f"{'vs base':>9}"
+    print(header)
+    for name, r in results.items():
+        line = (
+            f"{name:<16}{r['ops']:>6}{r['ops_per_s']:>10.1f}{r['p50_ms']:>10.3f}"
+            f"{r['p95_ms']:>10.3f}{r['p99_ms']:>10.3f}{r['llm_calls_per_comment']:>11.2f}"
+        )
+        base = (baseline or {}).get(name)
+        if base and base["ops_per_s"]:
+            line += f"{r['ops_per_s'] / base['ops_per_s']:>8.2f}x"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--repeats", type=int, default=3, help="escala el número de ops por escenario")
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--prompt-latency", type=float, default=0.02, help="segundos hasta el primer token")
+    parser.add_argument("--token-latency", type=float, default=0.001, help="segundos entre tokens")
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="guarda estos números como baseline")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    args = parser.parse_args()
+
+    settings = {
+        "repeats": args.repeats,
+        "batch_size": args.batch_size,
+        "prompt_latency_s": args.prompt_latency,
+        "token_latency_s": args.token_latency,
+        "jitter_s": args.jitter,
+    }
+
+    baseline_doc = None
+    if not args.save_baseline and args.baseline.exists():
+        baseline_doc = json.loads(args.baseline.read_text(encoding="utf-8"))
+        if baseline_doc.get("settings") != settings:
+            print(
+                f"Baseline {args.baseline} was recorded with different settings "
+                f"({baseline_doc.get('settings')}); re-run with those or --save-baseline.",
+                file=sys.stderr,
+            )
+            sys.exit(2)
+
+    results: Dict[str, Dict[str, Any]] = {}
+    with FakeOllamaServer(
+        prompt_latency_s=args.prompt_latency,
+        token_latency_s=args.token_latency,
+        jitter_s=args.jitter,
+    ) as server:
+        register_llm("A", get_llm("A", use_cache=False, base_url=server.base_url))
+        bench = Bench(server, repeats=args.repeats, batch_size=args.batch_size)
+
+        # calentamiento: conexión, prompts y grafo
+        get_sentiment_chain("A").invoke({"user_text": bench.texts(1)[0]})
+
+        print(f"Fake Ollama at {server.base_url}: {settings}\n")
+        for name in args.scenarios:
+            results[name] = BENCHMARKS[name](bench)
+
+    baseline = (baseline_doc or {}).get("scenarios")
+    print_table(results, baseline)
+
+    if args.save_baseline:
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        doc = {"settings": settings, "scenarios": results}
+        args.baseline.write_text(json.dumps(doc, indent=2) + "\n", encoding="utf-8")
+        print(f"\nBaseline saved to {args.baseline}")
+        return
+
+    if baseline is None:
+        print(f"\nNo baseline at {args.baseline}; run with --save-baseline to create one.")
+        return
+
+    regressions = compare_to_baseline(results, baseline, args.tolerance)
+    if regressions:
+        print(f"\nREGRESSION (tolerance {args.tolerance:.0%}):", file=sys.stderr)
+        for r in regressions:
+            print(f"  - {r}", file=sys.stderr)
+        sys.exit(1)
+    print(f"\nNo regressions vs baseline (tolerance {args.tolerance:.0%}).")
+
+
+if __name__ == "__main__":
+    main()
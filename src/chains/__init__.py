@@ -7,8 +7,47 @@ Por ahora solo exponemos la cadena de análisis de sentimiento.
 Más adelante podremos añadir memoria y router.
 """
 
-from .sentiment_chain import build_sentiment_agent_chain
+import importlib
+
+# nombre -> submódulo; se importa al pedir el nombre (PEP 562), así
+# `import chains.batch_runner` no arrastra las cadenas ni el LLM.
+_EXPORTS = {
+    "build_sentiment_agent_chain": "sentiment_chain",
+    "build_sentiment_stream": "sentiment_chain",
+    "DEFAULT_MAX_CONCURRENCY": "batch_runner",
+    "run_batch": "batch_runner",
+    "stream_batch": "batch_runner",
+    "build_packed_classifier": "packed_classifier",
+    "expand_result": "expansion",
+    "expand_results": "expansion",
+    "clear_chain_registry": "registry",
+    "get_packed_classifier": "registry",
+    "get_sentiment_chain": "registry",
+    "get_sentiment_stream": "registry",
+    "get_shared_llm": "registry",
+    "register_llm": "registry",
+}
 
 __all__ = [
     "build_sentiment_agent_chain",
+    "build_sentiment_stream",
+    "get_sentiment_chain",
+    "get_sentiment_stream",
+    "get_packed_classifier",
+    "get_shared_llm",
+    "register_llm",
+    "build_packed_classifier",
+    "expand_result",
+    "expand_results",
+    "clear_chain_registry",
+    "run_batch",
+    "stream_batch",
+    "DEFAULT_MAX_CONCURRENCY",
 ]
+
+
+def __getattr__(name):
+    if name in _EXPORTS:
+        module = importlib.import_module(f"{__name__}.{_EXPORTS[name]}")
+        return getattr(module, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,160 @@
+# src/chains/batch_jobs.py
+
+"""
+Batches en segundo plano (para la UI de Streamlit).
+
+run_batch bloquea hasta que termina el último comentario. Aquí cada batch
+se lanza en un hilo de BatchJobManager y va guardando los resultados a
+medida que llegan (on_result), así que la UI puede pintar el progreso
+leyendo job.snapshot() en cada rerun, sin perder el trabajo si el script
+se vuelve a ejecutar.
+
+Cancelar es cooperativo: al terminar el siguiente comentario, on_result
+lanza BatchJobCancelled; batch_as_completed cancela entonces los que
+aún no habían empezado y solo se esperan los que ya estaban en vuelo
+(como mucho max_concurrency).
+"""
+
+from __future__ import annotations
+
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence
+
+from langchain_core.runnables import Runnable
+
+from chains.batch_runner import run_batch
+
+
+# Batches que se ejecutan a la vez (cada uno con su propio max_concurrency)
+DEFAULT_MAX_JOBS = 2
+
+# Batches terminados que se guardan para que la UI los pueda leer
+MAX_FINISHED_JOBS = 20
+
+
+class BatchJobCancelled(Exception):
+    """Se lanza desde on_result para cortar un batch cancelado."""
+
+
+class BatchJob:
+    """
+    Estado de un batch en segundo plano.
+
+    status: "pending" -> "running" -> "done" | "cancelled" | "failed".
+    Los resultados se guardan en su posición (mismo orden que `texts`);
+    snapshot() devuelve una copia consistente para pintarla.
+    """
+
+    def __init__(self, texts: Sequence[str], meta: Optional[Dict[str, Any]] = None):
+        self.job_id = uuid.uuid4().hex
+        self.texts = list(texts)
+        self.meta = dict(meta or {})
+
+        self.status = "pending"
+        self.error: Optional[str] = None
+        self.n_done = 0
+
+        self._results: List[Optional[Dict[str, Any]]] = [None] * len(self.texts)
+        self._cancel = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def total(self) -> int:
+        return len(self.texts)
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("done", "cancelled", "failed")
+
+    def cancel(self) -> None:
+        self._cancel.set()
+
+    def _on_result(self, idx: int, result: Dict[str, Any]) -> None:
+        with self._lock:
+            if self._results[idx] is None:
+                self.n_done += 1
+            self._results[idx] = result
+        if self._cancel.is_set():
+            raise BatchJobCancelled()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Copia del estado actual: status, progreso y los resultados ya
+        terminados (en el orden de `texts`).
+        """
+        with self._lock:
+            return {
+                "job_id": self.job_id,
+                "status": self.status,
+                "error": self.error,
+                "total": self.total,
+                "done": self.n_done,
+                "progress": self.n_done / self.total if self.total else 1.0,
+                "results": [r for r in self._results if r is not None],
+                "meta": dict(self.meta),
+            }
+
+
+class BatchJobManager:
+    """
+    Ejecuta BatchJobs en un pool de hilos propio y los guarda por id.
+    Pensado para compartirse entre reruns y sesiones
+    (st.cache_resource en app_streamlit.py).
+    """
+
+    def __init__(self, max_jobs: int = DEFAULT_MAX_JOBS):
+        self._pool = ThreadPoolExecutor(max_workers=max_jobs, thread_name_prefix="batch-job")
+        self._jobs: Dict[str, BatchJob] = {}
+        self._lock = threading.Lock()
+
+    def submit(
+        self,
+        chain: Runnable,
+        texts: Sequence[str],
+        meta: Optional[Dict[str, Any]] = None,
+        **run_batch_kwargs: Any,
+    ) -> BatchJob:
+        """
+        Lanza run_batch(chain, texts, **run_batch_kwargs) en segundo plano
+        y devuelve el job al momento.
+        """
+        job = BatchJob(texts, meta=meta)
+
+        with self._lock:
+            self._prune()
+            self._jobs[job.job_id] = job
+
+        self._pool.submit(self._run, job, chain, run_batch_kwargs)
+        return job
+
+    def _run(self, job: BatchJob, chain: Runnable, run_batch_kwargs: Dict[str, Any]) -> None:
+        job.status = "running"
+        try:
+            if job._cancel.is_set():
+                raise BatchJobCancelled()
+            run_batch(chain, job.texts, on_result=job._on_result, **run_batch_kwargs)
+            job.status = "done"
+        except BatchJobCancelled:
+            job.status = "cancelled"
+        except Exception as exc:
+            job.error = f"{type(exc).__name__}: {exc}"
+            job.status = "failed"
+
+    def get(self, job_id: Optional[str]) -> Optional[BatchJob]:
+        if not job_id:
+            return None
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> None:
+        job = self.get(job_id)
+        if job is not None:
+            job.cancel()
+
+    def _prune(self) -> None:
+        # Olvida los batches terminados más antiguos (los dicts guardan orden de inserción)
+        finished = [jid for jid, job in self._jobs.items() if job.finished]
+        for jid in finished[: max(0, len(finished) - MAX_FINISHED_JOBS + 1)]:
+            del self._jobs[jid]
@@ -0,0 +1,245 @@
+# src/chains/batch_runner.py
+
+from __future__ import annotations
+
+import unicodedata
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+from langchain_core.runnables import Runnable
+
+
+# Máximo de comentarios "en vuelo" a la vez contra el LLM.
+# Ollama encola las peticiones que no puede atender, así que un valor
+# moderado ya da casi todo el beneficio sin saturar el servidor.
+DEFAULT_MAX_CONCURRENCY = 4
+
+RESULT_KEYS = (
+    "sentiment",
+    "score",
+    "short_reason",
+    "explanation",
+    "suggested_reply",
+)
+
+
+# Llamadas al LLM por comentario: clasificación + explicación + respuesta
+LLM_CALLS_PER_COMMENT = 3
+
+
+def normalize_text(text: str) -> str:
+    """
+    Clave de deduplicación: Unicode NFKC, minúsculas (casefold) y
+    espacios colapsados. "Muy  BUENO " y "muy bueno" dan la misma clave.
+    """
+    return " ".join(unicodedata.normalize("NFKC", text).casefold().split())
+
+
+def _error_result(text: str, exc: BaseException) -> Dict[str, Any]:
+    """
+    Resultado "vacío" para un texto cuyo análisis falló.
+    sentiment="" hace que compute_sentiment_stats lo ignore.
+    """
+    return {
+        "text": text,
+        "sentiment": "",
+        "score": 0.0,
+        "short_reason": "",
+        "explanation": "",
+        "suggested_reply": "",
+        "error": f"{type(exc).__name__}: {exc}",
+    }
+
+
+def run_batch(
+    chain: Runnable,
+    texts: Sequence[str],
+    max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+    on_result: Optional[Callable[[int, Dict[str, Any]], None]] = None,
+    classifier: Optional[Callable[[Sequence[str]], List[Any]]] = None,
+    semantic_cache: Optional[Any] = None,
+    dedupe: bool = True,
+    timings: bool = False,
+) -> List[Dict[str, Any]]:
+    """
+    Analiza varios textos con la cadena de sentimiento de forma concurrente.
+
+    - Como mucho `max_concurrency` textos se procesan a la vez.
+    - La lista devuelta respeta el orden de `texts`.
+    - Si un texto falla, su posición lleva un resultado con clave "error"
+      en lugar de abortar todo el batch.
+    - `on_result(index, result)` se llama a medida que termina cada texto
+      (útil para mostrar progreso).
+    - `classifier` (opcional, p. ej. el de packed_classifier.py o la cascada
+      de models/preclassifier.py) clasifica todos los textos de golpe; la
+      cadena solo genera explicación y respuesta. Si para un texto devuelve
+      None, la cadena lo clasifica como siempre.
+    - `semantic_cache` (opcional, models/semantic_cache.py) se consulta de
+      una vez para todo el batch antes de nada; los textos casi idénticos a
+      uno ya analizado reutilizan su resultado, y los nuevos resultados se
+      insertan en bloque al final.
+    - Con `dedupe` (por defecto) los textos repetidos (ver normalize_text)
+      se analizan una sola vez; el resultado se copia a cada posición y
+      las copias llevan "duplicate": True.
+    - Con `timings` cada resultado calculado por la cadena lleva "timings"
+      (segundos por etapa y tokens de Ollama, ver tools/metrics.py).
+    """
+
+    if not texts:
+        return []
+
+    if dedupe:
+        groups: Dict[str, List[int]] = {}
+        for i, t in enumerate(texts):
+            groups.setdefault(normalize_text(t), []).append(i)
+
+        if len(groups) < len(texts):
+            positions = list(groups.values())
+            fanned: List[Optional[Dict[str, Any]]] = [None] * len(texts)
+
+            def _fan_out(pos: int, result: Dict[str, Any]) -> None:
+                first, *rest = positions[pos]
+                fanned[first] = result
+                if on_result is not None:
+                    on_result(first, result)
+                for i in rest:
+                    copy = {**result, "text": texts[i], "duplicate": True}
+                    fanned[i] = copy
+                    if on_result is not None:
+                        on_result(i, copy)
+
+            run_batch(
+                chain,
+                [texts[p[0]] for p in positions],
+                max_concurrency=max_concurrency,
+                on_result=_fan_out,
+                classifier=classifier,
+                semantic_cache=semantic_cache,
+                dedupe=False,
+                timings=timings,
+            )
+            return fanned  # type: ignore[return-value]
+
+    results: List[Optional[Dict[str, Any]]] = [None] * len(texts)
+
+    def _emit(idx: int, result: Dict[str, Any]) -> None:
+        results[idx] = result
+        if on_result is not None:
+            on_result(idx, result)
+
+    indices = list(range(len(texts)))
+    inputs: List[Dict[str, Any]] = [{"user_text": t} for t in texts]
+    if timings:
+        for inp in inputs:
+            inp["timings"] = True
+
+    if semantic_cache is not None:
+        cached = semantic_cache.lookup_many(list(texts))
+        pending = []
+        for idx, hit in zip(indices, cached):
+            if hit is not None:
+                _emit(idx, {"text": texts[idx], **hit})
+            else:
+                pending.append(idx)
+        indices = pending
+
+    if classifier is not None and indices:
+        classified = classifier([texts[i] for i in indices])
+        pending = []
+        for idx, info in zip(indices, classified):
+            if isinstance(info, BaseException):
+                _emit(idx, _error_result(texts[idx], info))
+                continue
+            if info is not None:
+                inputs[idx].update(info)
+            pending.append(idx)
+        indices = pending
+
+    if not indices:
+        return results  # type: ignore[return-value]
+
+    computed = list(indices)
+
+    for pos, out in chain.batch_as_completed(
+        [inputs[i] for i in indices],
+        config={"max_concurrency": max(1, int(max_concurrency))},
+        return_exceptions=True,
+    ):
+        idx = indices[pos]
+        if isinstance(out, BaseException):
+            result = _error_result(texts[idx], out)
+        else:
+            result = {"text": texts[idx]}
+            result.update({k: out[k] for k in RESULT_KEYS})
+            if out.get("deferred"):
+                result["deferred"] = True
+            if out.get("timings"):
+                result["timings"] = out["timings"]
+        _emit(idx, result)
+
+    if semantic_cache is not None:
+        semantic_cache.add_many(
+            [texts[i] for i in computed],
+            [results[i] for i in computed],  # type: ignore[misc]
+        )
+
+    return results  # type: ignore[return-value]
+
+
+def stream_batch(
+    chain: Runnable,
+    records: Iterable[Dict[str, Any]],
+    max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+    text_key: str = "text",
+) -> Iterator[Tuple[Dict[str, Any], Dict[str, Any]]]:
+    """
+    Versión en streaming de run_batch para entradas arbitrariamente grandes.
+
+    Consume `records` (cualquier iterable, p. ej. un generador que lee un
+    fichero línea a línea) manteniendo como mucho `max_concurrency` textos
+    en vuelo, y va devolviendo (record, result) en cuanto termina cada uno
+    (orden de llegada, no de entrada). La memoria usada no depende del
+    tamaño de la entrada.
+    """
+
+    max_concurrency = max(1, int(max_concurrency))
+    it = iter(records)
+
+    with ThreadPoolExecutor(max_workers=max_concurrency) as pool:
+        in_flight: Dict[Future, Dict[str, Any]] = {}
+
+        def _submit_next() -> bool:
+            for record in it:
+                text = str(record.get(text_key, ""))
+                in_flight[pool.submit(chain.invoke, {"user_text": text})] = record
+                return True
+            return False
+
+        for _ in range(max_concurrency):
+            if not _submit_next():
+                break
+
+        while in_flight:
+            done, _ = wait(list(in_flight), return_when=FIRST_COMPLETED)
+            for fut in done:
+                record = in_flight.pop(fut)
+                text = str(record.get(text_key, ""))
+                try:
+                    out = fut.result()
+                    result = {"text": text}
+                    result.update({k: out[k] for k in RESULT_KEYS})
+                except Exception as exc:
+                    result = _error_result(text, exc)
+
+                _submit_next()
+                yield record, result
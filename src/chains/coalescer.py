@@ -0,0 +1,187 @@
+# src/chains/coalescer.py
+
+"""
+Agrupador de peticiones sueltas en micro-batches (para el servicio HTTP).
+
+Cada petición de un solo comentario que llega al servicio espera aquí
+como mucho `max_wait_ms`: las que llegan en esa ventana se analizan
+juntas con `process_batch` (run_batch, con el clasificador empaquetado si
+se configura), que ya sabe repartir la concurrencia, deduplicar textos
+repetidos y clasificar varios comentarios por prompt.
+
+La cola está acotada (`max_queue`): si se llena, submit lanza QueueFull
+y el servicio responde 429 en vez de acumular latencia sin límite.
+Al parar (stop) se terminan los batches en curso y las peticiones que
+quedaban en cola fallan con CoalescerClosed en vez de quedarse colgadas.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+
+DEFAULT_MAX_BATCH_SIZE = 8
+DEFAULT_MAX_WAIT_MS = 5.0
+DEFAULT_MAX_QUEUE = 256
+DEFAULT_MAX_CONCURRENT_BATCHES = 2
+
+
+class QueueFull(Exception):
+    """La cola del coalescer está llena: la petición se rechaza (429)."""
+
+
+class CoalescerClosed(Exception):
+    """El coalescer se ha parado: la petición no se llegó a procesar."""
+
+
+class MicroBatcher:
+    """
+    submit(text) -> resultado de ese texto, procesado en un micro-batch.
+
+    `process_batch(texts)` es síncrono (se ejecuta en un hilo) y devuelve
+    un resultado por texto, en el mismo orden. Como mucho
+    `max_concurrent_batches` batches se procesan a la vez; mientras tanto
+    la cola sigue aceptando peticiones hasta `max_queue`.
+    """
+
+    def __init__(
+        self,
+        process_batch: Callable[[Sequence[str]], List[Dict[str, Any]]],
+        max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+        max_wait_ms: float = DEFAULT_MAX_WAIT_MS,
+        max_queue: int = DEFAULT_MAX_QUEUE,
+        max_concurrent_batches: int = DEFAULT_MAX_CONCURRENT_BATCHES,
+    ):
+        self.process_batch = process_batch
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait_s = max(0.0, max_wait_ms) / 1000.0
+        self.max_queue = max(1, int(max_queue))
+        self.max_concurrent_batches = max(1, int(max_concurrent_batches))
+
+        self.batches = 0
+        self.items = 0
+        self.rejected = 0
+
+        self._queue: Optional["asyncio.Queue[Tuple[str, asyncio.Future]]"] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._running: set = set()
+        # lo que el dispatcher ya ha sacado de la cola para el batch en curso
+        self._collecting: List[Tuple[str, asyncio.Future]] = []
+        self._closed = False
+
+    # ---------- ciclo de vida (dentro del event loop) ----------
+
+    def start(self) -> None:
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._slots = asyncio.Semaphore(self.max_concurrent_batches)
+        self._dispatcher = asyncio.create_task(self._dispatch_loop())
+
+    async def stop(self) -> None:
+        """
+        Deja de aceptar peticiones, termina los batches en curso y falla
+        (CoalescerClosed) las que seguían esperando en la cola.
+        """
+        self._closed = True
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            try:
+                await self._dispatcher
+            except asyncio.CancelledError:
+                pass
+        pending = self._collecting
+        self._collecting = []
+        if self._queue is not None:
+            while not self._queue.empty():
+                pending.append(self._queue.get_nowait())
+        for _, fut in pending:
+            if not fut.done():
+                fut.set_exception(CoalescerClosed("service is shutting down"))
+        if self._running:
+            await asyncio.gather(*self._running, return_exceptions=True)
+
+    # ---------- API ----------
+
+    async def submit(self, text: str) -> Dict[str, Any]:
+        if self._queue is None:
+            raise RuntimeError("MicroBatcher.start() no se ha llamado")
+        if self._closed:
+            raise CoalescerClosed("service is shutting down")
+        future: asyncio.Future = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((text, future))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            raise QueueFull(f"queue full ({self.max_queue} pending)") from None
+        return await future
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "max_queue": self.max_queue,
+            "batches": self.batches,
+            "items": self.items,
+            "mean_batch_size": self.items / self.batches if self.batches else 0.0,
+            "rejected": self.rejected,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait_s * 1000.0,
+        }
+
+    # ---------- dispatcher ----------
+
+    async def _collect(self) -> List[Tuple[str, asyncio.Future]]:
+        """Primer elemento (esperando lo que haga falta) + lo que llegue en la ventana."""
+        assert self._queue is not None
+        batch = self._collecting = []
+        batch.append(await self._queue.get())
+        deadline = time.monotonic() + self.max_wait_s
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        # lo que ya esté en cola entra sin esperar más
+        while len(batch) < self.max_batch_size and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        self._collecting = []
+        return batch
+
+    async def _dispatch_loop(self) -> None:
+        assert self._slots is not None
+        while True:
+            await self._slots.acquire()
+            try:
+                batch = await self._collect()
+            except BaseException:
+                self._slots.release()
+                raise
+            task = asyncio.create_task(self._run(batch))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _run(self, batch: List[Tuple[str, asyncio.Future]]) -> None:
+        assert self._slots is not None
+        # las peticiones cuyo cliente ya se fue no se procesan
+        batch = [(text, fut) for text, fut in batch if not fut.done()]
+        try:
+            if not batch:
+                return
+            self.batches += 1
+            self.items += len(batch)
+            try:
+                results = await asyncio.to_thread(self.process_batch, [text for text, _ in batch])
+            except Exception as exc:
+                for _, fut in batch:
+                    if not fut.done():
+                        fut.set_exception(exc)
+                return
+            for (_, fut), result in zip(batch, results):
+                if not fut.done():
+                    fut.set_result(result)
+        finally:
+            self._slots.release()
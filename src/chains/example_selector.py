@@ -0,0 +1,177 @@
+# src/chains/example_selector.py
+
+"""
+Selección dinámica de ejemplos few-shot para el prompt de sentimiento.
+
+El prompt estático (prompts/sentiment_system.txt) manda siempre los mismos
+ejemplos, sea cual sea el idioma o el tipo de comentario. Aquí se guarda
+un pool de ejemplos (prompts/sentiment_examples.json) y, para cada texto,
+se eligen los k más parecidos:
+
+- similitud léxica barata: coseno entre bolsas de trigramas de caracteres
+  (funciona igual en español e inglés, sin modelos ni embeddings);
+- + LANGUAGE_BONUS si el ejemplo está en el mismo idioma que el texto
+  (detect_language, por palabras frecuentes);
+- primero el mejor ejemplo de cada etiqueta (para que el modelo vea las
+  tres clases si k >= 3) y después el resto por puntuación.
+
+La selección es determinista (empates por orden en el pool), así que un
+mismo texto produce siempre el mismo prompt: las respuestas de la config A
+siguen siendo reproducibles y cacheables.
+
+El prompt sentiment_fewshot lleva como mensaje de sistema las
+instrucciones del estático sin sus ejemplos fijos (prefijo que Ollama
+sigue reutilizando de su caché) y en el mensaje humano solo los k
+ejemplos elegidos, con el JSON en una línea: incluso con k = 3 (uno por
+etiqueta, como el estático) el prompt es más corto que el estático.
+bench_few_shot_selection.py compara tokens y accuracy con él.
+"""
+
+from __future__ import annotations
+
+import json
+import math
+import re
+import threading
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+
+BASE_DIR = Path(__file__).resolve().parents[2]  # carpeta raíz del proyecto
+DEFAULT_EXAMPLES_PATH = BASE_DIR / "prompts" / "sentiment_examples.json"
+DEFAULT_FEW_SHOT_K = 3
+LANGUAGE_BONUS = 0.3
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+_SPANISH_HINTS = {
+    "el", "la", "los", "las", "de", "que", "y", "en", "un", "una", "es", "no",
+    "muy", "pero", "con", "por", "para", "se", "me", "lo", "del", "al", "fue",
+    "producto", "llegó", "todo", "nada", "más",
+}
+_ENGLISH_HINTS = {
+    "the", "and", "is", "it", "to", "of", "was", "a", "in", "i", "my", "but",
+    "not", "for", "with", "this", "that", "very", "again", "will", "product",
+}
+
+
+def detect_language(text: str) -> str:
+    """'es' o 'en' según las palabras frecuentes (y acentos/ñ) del texto."""
+    words = _WORD_RE.findall(text.lower())
+    es = sum(1 for w in words if w in _SPANISH_HINTS)
+    en = sum(1 for w in words if w in _ENGLISH_HINTS)
+    if re.search(r"[áéíóúñ¿¡]", text.lower()):
+        es += 1
+    return "es" if es > en else "en"
+
+
+def _trigrams(text: str) -> Counter:
+    normalized = " " + " ".join(_WORD_RE.findall(text.lower())) + " "
+    return Counter(normalized[i : i + 3] for i in range(len(normalized) - 2))
+
+
+def _cosine(a: Counter, b: Counter, norm_a: float, norm_b: float) -> float:
+    if not norm_a or not norm_b:
+        return 0.0
+    if len(a) > len(b):
+        a, b = b, a
+    dot = sum(count * b[gram] for gram, count in a.items() if gram in b)
+    return dot / (norm_a * norm_b)
+
+
+def _norm(grams: Counter) -> float:
+    return math.sqrt(sum(c * c for c in grams.values()))
+
+
+def format_example(example: Dict[str, Any], number: int) -> str:
+    """Mismo formato que los ejemplos del prompt estático, con el JSON en una línea."""
+    output = json.dumps(
+        {
+            "sentiment": example["sentiment"],
+            "score": example["score"],
+            "short_reason": example["short_reason"],
+        },
+        ensure_ascii=False,
+    )
+    return f'[EXAMPLE {number}]\nUSER_TEXT:\n"""\n{example["text"]}\n"""\nOUTPUT:\n{output}'
+
+
+class ExampleSelector:
+    """
+    Pool de ejemplos con sus trigramas precalculados.
+
+    select(text, k) devuelve los k ejemplos elegidos (dicts del pool);
+    render(text, k) los devuelve ya formateados para el prompt.
+    """
+
+    def __init__(
+        self,
+        examples: Sequence[Dict[str, Any]],
+        k: int = DEFAULT_FEW_SHOT_K,
+        language_bonus: float = LANGUAGE_BONUS,
+    ):
+        self.examples = [
+            {**ex, "language": ex.get("language") or detect_language(ex["text"])}
+            for ex in examples
+        ]
+        self.k = k
+        self.language_bonus = language_bonus
+
+        self._grams = [_trigrams(ex["text"]) for ex in self.examples]
+        self._norms = [_norm(g) for g in self._grams]
+
+    @classmethod
+    def from_file(cls, path: Path | str = DEFAULT_EXAMPLES_PATH, **kwargs: Any) -> "ExampleSelector":
+        examples = json.loads(Path(path).read_text(encoding="utf-8"))
+        return cls(examples, **kwargs)
+
+    def scores(self, text: str) -> List[float]:
+        grams = _trigrams(text)
+        norm = _norm(grams)
+        language = detect_language(text)
+        return [
+            _cosine(grams, ex_grams, norm, ex_norm)
+            + (self.language_bonus if ex["language"] == language else 0.0)
+            for ex, ex_grams, ex_norm in zip(self.examples, self._grams, self._norms)
+        ]
+
+    def select(self, text: str, k: Optional[int] = None) -> List[Dict[str, Any]]:
+        k = self.k if k is None else k
+        scores = self.scores(text)
+        # orden estable: a igual puntuación gana el que va antes en el pool
+        ranked = sorted(range(len(self.examples)), key=lambda i: -scores[i])
+
+        chosen: List[int] = []
+        seen_labels = set()
+        for i in ranked:
+            label = self.examples[i]["sentiment"]
+            if label not in seen_labels and len(chosen) < k:
+                chosen.append(i)
+                seen_labels.add(label)
+        for i in ranked:
+            if len(chosen) >= k:
+                break
+            if i not in chosen:
+                chosen.append(i)
+
+        chosen.sort(key=lambda i: -scores[i])
+        return [self.examples[i] for i in chosen]
+
+    def render(self, text: str, k: Optional[int] = None) -> str:
+        return "\n\n".join(
+            format_example(ex, n) for n, ex in enumerate(self.select(text, k), start=1)
+        )
+
+
+_default_selector: Optional[ExampleSelector] = None
+_default_selector_lock = threading.Lock()
+
+
+def get_example_selector() -> ExampleSelector:
+    """Selector con el pool por defecto, cargado una sola vez."""
+    global _default_selector
+    with _default_selector_lock:
+        if _default_selector is None:
+            _default_selector = ExampleSelector.from_file()
+        return _default_selector
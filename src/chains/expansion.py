@@ -0,0 +1,77 @@
+# src/chains/expansion.py
+
+"""
+Expansión bajo demanda de resultados "deferred".
+
+En modo solo-clasificación (build_sentiment_agent_chain(deferred=True))
+los resultados llevan "explanation"/"suggested_reply" a None y la marca
+"deferred": True. Esa marca es el "handle": con expand_result se generan
+los campos que faltan la primera vez que alguien los necesita (p. ej.
+para mostrarlos) y se guardan en el propio dict.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Dict, List, Optional, Sequence
+
+from langchain_core.runnables import RunnableLambda
+
+from chains.batch_runner import DEFAULT_MAX_CONCURRENCY
+from chains.registry import get_sentiment_chain
+from chains.sentiment_chain import GENERATED_FIELDS
+
+
+def _missing_fields(result: Dict[str, Any], fields: Sequence[str]) -> List[str]:
+    if result.get("error") or not result.get("sentiment"):
+        return []
+    return [f for f in fields if result.get(f) is None]
+
+
+def expand_result(
+    result: Dict[str, Any],
+    config: Optional[str] = None,
+    fields: Sequence[str] = GENERATED_FIELDS,
+) -> Dict[str, Any]:
+    """
+    Genera (si faltan) los campos `fields` de `result` y lo devuelve.
+
+    Modifica el dict en el sitio, así que la segunda llamada no hace nada.
+    config=None usa result["config"] si existe, o "A".
+    """
+    missing = _missing_fields(result, fields)
+    if not missing:
+        return result
+
+    chain = get_sentiment_chain(config=config or result.get("config") or "A")
+    out = chain.invoke(
+        {
+            "user_text": result.get("text") or result.get("user_text", ""),
+            "sentiment": result["sentiment"],
+            "score": result.get("score", 0.0),
+            "short_reason": result.get("short_reason", ""),
+            "fields": missing,
+        }
+    )
+
+    for f in missing:
+        result[f] = out[f]
+    if all(result.get(f) is not None for f in GENERATED_FIELDS):
+        result.pop("deferred", None)
+
+    return result
+
+
+def expand_results(
+    results: Sequence[Dict[str, Any]],
+    config: Optional[str] = None,
+    fields: Sequence[str] = GENERATED_FIELDS,
+    max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+) -> Sequence[Dict[str, Any]]:
+    """Igual que expand_result, para varios resultados en paralelo."""
+    todo = [r for r in results if _missing_fields(r, fields)]
+    if todo:
+        RunnableLambda(lambda r: expand_result(r, config=config, fields=fields)).batch(
+            todo,
+            config={"max_concurrency": max(1, int(max_concurrency))},
+        )
+    return results
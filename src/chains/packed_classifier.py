@@ -0,0 +1,232 @@
+# src/chains/packed_classifier.py
+
+"""
+Clasificación "empaquetada": varios comentarios en un solo prompt.
+
+El prompt de sentimiento lleva un bloque few-shot largo que el modelo
+tiene que evaluar en cada llamada. Aquí metemos N comentarios en una
+misma llamada (prompts/sentiment_packed_*.txt) y el modelo devuelve
+un array JSON con {id, sentiment, score, short_reason} por comentario.
+
+- Los paquetes se arman por tamaño (pack_size) y por tokens estimados
+  (max_pack_tokens), agrupando textos de longitud parecida.
+- Si el modelo devuelve un array malformado o incompleto, el paquete
+  (o la parte que falta) se parte en dos y se reintenta; un paquete de
+  un solo texto usa el prompt normal de sentimiento.
+"""
+
+from __future__ import annotations
+
+import json
+from typing import Any, Callable, Dict, List, Optional, Sequence, Union
+
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.runnables import Runnable, RunnableLambda
+
+from chains.sentiment_chain import (
+    CLASSIFICATION_FIELD,
+    STREAM_FIELD_KEY,
+    _parse_sentiment_str,
+    get_chat_prompt,
+)
+from models.llm_config import get_llm
+from tools.metrics import get_metrics
+
+
+DEFAULT_PACK_SIZE = 8
+DEFAULT_MAX_PACK_TOKENS = 1500
+DEFAULT_MAX_CONCURRENCY = 2
+
+VALID_SENTIMENTS = {"positive", "neutral", "negative"}
+
+# Resultado por texto: dict con sentiment/score/short_reason, o la
+# excepción si ni siquiera el prompt individual funcionó.
+ClassificationResult = Union[Dict[str, Any], Exception]
+
+
+def __getattr__(name: str) -> Any:
+    # packed_prompt_tmpl se construye bajo demanda (ver get_chat_prompt)
+    if name == "packed_prompt_tmpl":
+        return get_chat_prompt("sentiment_packed")
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+# ---------- Empaquetado ----------
+
+def estimate_tokens(text: str) -> int:
+    """Estimación barata: ~4 caracteres por token."""
+    return max(1, len(text) // 4)
+
+
+def pack_texts(
+    texts: Sequence[str],
+    pack_size: int = DEFAULT_PACK_SIZE,
+    max_pack_tokens: int = DEFAULT_MAX_PACK_TOKENS,
+) -> List[List[int]]:
+    """
+    Agrupa los índices de `texts` en paquetes de como mucho `pack_size`
+    textos y `max_pack_tokens` tokens estimados.
+
+    Ordena por longitud antes de agrupar, así los textos largos no
+    dejan paquetes casi vacíos. Un texto que por sí solo supera el
+    límite de tokens va en su propio paquete.
+    """
+    order = sorted(range(len(texts)), key=lambda i: estimate_tokens(texts[i]))
+
+    packs: List[List[int]] = []
+    current: List[int] = []
+    current_tokens = 0
+
+    for i in order:
+        tokens = estimate_tokens(texts[i])
+        if current and (
+            len(current) >= pack_size or current_tokens + tokens > max_pack_tokens
+        ):
+            packs.append(current)
+            current = []
+            current_tokens = 0
+        current.append(i)
+        current_tokens += tokens
+
+    if current:
+        packs.append(current)
+
+    return packs
+
+
+# ---------- Parser del array JSON ----------
+
+def _format_comments(texts: Sequence[str]) -> str:
+    return "\n".join(f'[{i}] """{t}"""' for i, t in enumerate(texts, start=1))
+
+
+def _parse_packed_str(text: str, n_items: int) -> Dict[int, Dict[str, Any]]:
+    """
+    Extrae el array JSON de la salida del modelo.
+
+    Devuelve {posición (0-based): {sentiment, score, short_reason}} solo
+    para las entradas válidas. Lanza ValueError si no hay array.
+    """
+    raw_str = str(text)
+
+    start = raw_str.find("[")
+    end = raw_str.rfind("]")
+    if start == -1 or end == -1:
+        raise ValueError(f"No JSON array found in model output: {raw_str}")
+
+    json_str = raw_str[start : end + 1]
+    try:
+        data = json.loads(json_str)
+    except json.JSONDecodeError:
+        data = json.loads(json_str.replace("\n", " "))
+
+    if not isinstance(data, list):
+        raise ValueError(f"Model output is not a JSON array: {raw_str}")
+
+    parsed: Dict[int, Dict[str, Any]] = {}
+    for item in data:
+        if not isinstance(item, dict):
+            continue
+        try:
+            pos = int(item.get("id")) - 1
+        except (TypeError, ValueError):
+            continue
+        if not 0 <= pos < n_items or pos in parsed:
+            continue
+
+        sentiment = str(item.get("sentiment", "")).strip().lower()
+        if sentiment not in VALID_SENTIMENTS:
+            continue
+
+        try:
+            score = float(item.get("score", 0.0))
+        except Exception:
+            score = 0.0
+
+        parsed[pos] = {
+            "sentiment": sentiment,
+            "score": score,
+            "short_reason": item.get("short_reason", ""),
+        }
+
+    return parsed
+
+
+# ---------- Builder del clasificador ----------
+
+def build_packed_classifier(
+    config: str = "A",
+    llm: Optional[Runnable] = None,
+    pack_size: int = DEFAULT_PACK_SIZE,
+    max_pack_tokens: int = DEFAULT_MAX_PACK_TOKENS,
+    max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+) -> Callable[[Sequence[str]], List[ClassificationResult]]:
+    """
+    Devuelve una función `classify(texts)` que clasifica todos los textos
+    con prompts empaquetados y devuelve, en el mismo orden, un dict
+    {sentiment, score, short_reason} o la excepción de ese texto.
+
+    Se usa desde run_batch(..., classifier=...) como alternativa a la
+    clasificación individual de la cadena.
+    """
+
+    if llm is None:
+        llm = get_llm(config)
+    str_parser = StrOutputParser()
+
+    packed_llm_chain = (get_chat_prompt("sentiment_packed") | llm | str_parser).with_config(
+        metadata={STREAM_FIELD_KEY: "packed_classification"}
+    )
+    single_llm_chain = (get_chat_prompt("sentiment") | llm | str_parser).with_config(
+        metadata={STREAM_FIELD_KEY: CLASSIFICATION_FIELD}
+    )
+
+    def _classify_single(text: str) -> ClassificationResult:
+        try:
+            return _parse_sentiment_str(single_llm_chain.invoke({"user_text": text}))
+        except Exception as exc:
+            return exc
+
+    def _classify_pack(texts: List[str]) -> List[ClassificationResult]:
+        if len(texts) == 1:
+            return [_classify_single(texts[0])]
+
+        try:
+            raw_output = packed_llm_chain.invoke(
+                {"n_comments": len(texts), "comments": _format_comments(texts)}
+            )
+            parsed = _parse_packed_str(raw_output, len(texts))
+        except Exception:
+            parsed = {}
+
+        missing = [i for i in range(len(texts)) if i not in parsed]
+        if not missing:
+            return [parsed[i] for i in range(len(texts))]
+
+        # Array malformado o incompleto: bisecamos lo que falta
+        get_metrics().inc("packed_retries_total")
+        if len(missing) == len(texts):
+            mid = len(texts) // 2
+            return _classify_pack(texts[:mid]) + _classify_pack(texts[mid:])
+
+        retried = _classify_pack([texts[i] for i in missing])
+        for i, result in zip(missing, retried):
+            parsed[i] = result  # type: ignore[assignment]
+        return [parsed[i] for i in range(len(texts))]
+
+    pack_runnable = RunnableLambda(_classify_pack)
+
+    def classify(texts: Sequence[str]) -> List[ClassificationResult]:
+        packs = pack_texts(texts, pack_size=pack_size, max_pack_tokens=max_pack_tokens)
+        outputs = pack_runnable.batch(
+            [[texts[i] for i in pack] for pack in packs],
+            config={"max_concurrency": max(1, int(max_concurrency))},
+        )
+
+        results: List[Optional[ClassificationResult]] = [None] * len(texts)
+        for pack, pack_results in zip(packs, outputs):
+            for i, result in zip(pack, pack_results):
+                results[i] = result
+        return results  # type: ignore[return-value]
+
+    return classify
@@ -0,0 +1,151 @@
+# src/chains/registry.py
+
+"""
+Registro de cadenas compartido por todo el proceso.
+
+build_sentiment_agent_chain crea un ChatOllama nuevo y compone los
+runnables cada vez que se llama. Aquí construimos cada LLM y cada cadena
+una sola vez y los reutilizamos desde el grafo, el CLI, Streamlit y los
+scripts de evaluación. Todas las cadenas de una misma config comparten
+el mismo cliente del LLM.
+"""
+
+from __future__ import annotations
+
+import threading
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
+from langchain_core.runnables import RunnableLambda
+
+from chains.packed_classifier import build_packed_classifier
+from chains.sentiment_chain import build_sentiment_agent_chain, build_sentiment_stream
+from chains.single_flight import get_single_flight
+from models.llm_config import get_llm
+from models.preclassifier import get_preclassifier
+
+
+_llms: Dict[str, Any] = {}
+_chains: Dict[Tuple[str, bool, bool, bool, Optional[int]], RunnableLambda] = {}
+_packed_classifiers: Dict[Tuple[str, int], Callable] = {}
+_streams: Dict[Tuple[str, bool, bool, Optional[int]], Callable[[Dict[str, Any]], Iterator[Dict[str, Any]]]] = {}
+_lock = threading.RLock()
+
+
+def get_shared_llm(config: str = "A"):
+    """Devuelve el LLM de `config`, creado una sola vez por proceso."""
+    with _lock:
+        llm = _llms.get(config)
+        if llm is None:
+            llm = get_llm(config)
+            _llms[config] = llm
+        return llm
+
+
+def register_llm(config: str, llm: Any) -> None:
+    """
+    Sustituye el LLM compartido de `config` (p. ej. por uno simulado en
+    benchmarks) y olvida las cadenas ya construidas con el anterior.
+    """
+    with _lock:
+        _llms[config] = llm
+        _chains.clear()
+        _packed_classifiers.clear()
+        _streams.clear()
+
+
+def get_sentiment_chain(
+    config: str = "A",
+    parallel: bool = True,
+    deferred: bool = False,
+    cascade: bool = False,
+    few_shot_k: Optional[int] = None,
+) -> RunnableLambda:
+    """
+    Devuelve la cadena de análisis para `config`, construyéndola solo la
+    primera vez. Es thread-safe: dos hilos que la pidan a la vez obtienen
+    la misma instancia.
+
+    cascade=True pone delante el pre-clasificador local. Si todavía no hay
+    modelo entrenado se devuelve la cadena sin cascada y no se guarda con
+    cascade=True: en cuanto run_train_preclassifier exporte el modelo, la
+    siguiente llamada ya la construye con él.
+    few_shot_k elige los ejemplos few-shot por texto (chains/example_selector.py).
+    Las peticiones idénticas simultáneas se resuelven una sola vez
+    (single-flight, ver chains/single_flight.py).
+    """
+    key = (config, parallel, deferred, cascade, few_shot_k)
+
+    chain = _chains.get(key)
+    if chain is not None:
+        return chain
+
+    preclassifier = get_preclassifier() if cascade else None
+    if cascade and preclassifier is None:
+        return get_sentiment_chain(config, parallel, deferred, cascade=False, few_shot_k=few_shot_k)
+
+    with _lock:
+        chain = _chains.get(key)
+        if chain is None:
+            chain = build_sentiment_agent_chain(
+                config=config,
+                parallel=parallel,
+                llm=get_shared_llm(config),
+                deferred=deferred,
+                preclassifier=preclassifier,
+                few_shot_k=few_shot_k,
+                single_flight=get_single_flight(),
+            )
+            _chains[key] = chain
+        return chain
+
+
+def get_sentiment_stream(
+    config: str = "A",
+    parallel: bool = True,
+    cascade: bool = False,
+    few_shot_k: Optional[int] = None,
+) -> Callable[[Dict[str, Any]], Iterator[Dict[str, Any]]]:
+    """Igual que get_sentiment_chain, para la versión en streaming."""
+    key = (config, parallel, cascade, few_shot_k)
+
+    preclassifier = get_preclassifier() if cascade else None
+    if cascade and preclassifier is None:
+        return get_sentiment_stream(config, parallel, cascade=False, few_shot_k=few_shot_k)
+
+    with _lock:
+        stream = _streams.get(key)
+        if stream is None:
+            stream = build_sentiment_stream(
+                config=config,
+                parallel=parallel,
+                llm=get_shared_llm(config),
+                preclassifier=preclassifier,
+                few_shot_k=few_shot_k,
+            )
+            _streams[key] = stream
+        return stream
+
+
+def get_packed_classifier(config: str = "A", pack_size: int = 8) -> Callable:
+    """Igual que get_sentiment_chain, para el clasificador empaquetado."""
+    key = (config, pack_size)
+
+    with _lock:
+        classifier = _packed_classifiers.get(key)
+        if classifier is None:
+            classifier = build_packed_classifier(
+                config=config,
+                llm=get_shared_llm(config),
+                pack_size=pack_size,
+            )
+            _packed_classifiers[key] = classifier
+        return classifier
+
+
+def clear_chain_registry() -> None:
+    """Olvida los LLMs y cadenas construidos (p. ej. tras cambiar de modelo)."""
+    with _lock:
+        _llms.clear()
+        _chains.clear()
+        _packed_classifiers.clear()
+        _streams.clear()
@@ -1,14 +1,23 @@
 from __future__ import annotations
 
 import json
+import queue
+import threading
+import time
+from functools import lru_cache
 from pathlib import Path
-from typing import Any, Dict
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
 
 from langchain_core.output_parsers import StrOutputParser
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.runnables import RunnableLambda
+from langchain_core.runnables import Runnable, RunnableLambda, RunnableParallel
 
+if TYPE_CHECKING:
+    from langchain_core.prompts import ChatPromptTemplate
+
+from chains.batch_runner import normalize_text
+from chains.example_selector import get_example_selector
 from models.llm_config import get_llm
+from tools.metrics import collect_timings, stage_timer
 
 
 # ---------- Carga de templates desde /prompts ----------
@@ -22,15 +31,75 @@ def load_prompt(name: str) -> str:
     return path.read_text(encoding="utf-8")
 
 
-sentiment_prompt_tmpl = ChatPromptTemplate.from_template(
-    load_prompt("sentiment_prompt.txt")
-)
-explanation_prompt_tmpl = ChatPromptTemplate.from_template(
-    load_prompt("explanation_prompt.txt")
-)
-reply_prompt_tmpl = ChatPromptTemplate.from_template(
-    load_prompt("reply_prompt.txt")
-)
+# Comienzo del bloque de ejemplos fijos en prompts/sentiment_system.txt
+STATIC_EXAMPLES_MARKER = "Here are some examples:"
+
+# Prompts cuyo mensaje de sistema es el de otro sin sus ejemplos fijos:
+# el few-shot dinámico lleva solo los ejemplos elegidos (en el mensaje
+# humano) y comparte las instrucciones sin copiarlas a otro fichero.
+_SYSTEM_WITHOUT_EXAMPLES = {"sentiment_fewshot": "sentiment"}
+
+
+def load_system_prompt(name: str) -> str:
+    """prompts/<name>_system.txt (ver _SYSTEM_WITHOUT_EXAMPLES)."""
+    base = _SYSTEM_WITHOUT_EXAMPLES.get(name)
+    if base is None:
+        return load_prompt(f"{name}_system.txt")
+    system = load_prompt(f"{base}_system.txt")
+    cut = system.find(STATIC_EXAMPLES_MARKER)
+    if cut == -1:
+        raise ValueError(f"{base}_system.txt has no '{STATIC_EXAMPLES_MARKER}' block to strip")
+    return system[:cut].rstrip() + "\n"
+
+
+def load_chat_prompt(name: str) -> ChatPromptTemplate:
+    """
+    Prompt en dos mensajes:
+    - system: prompts/<name>_system.txt, instrucciones y ejemplos few-shot.
+      No lleva variables, así que es idéntico en todas las llamadas y
+      Ollama puede reutilizar ese prefijo ya evaluado (caché KV) en vez
+      de procesarlo de nuevo para cada comentario.
+    - human: prompts/<name>_prompt.txt, solo la parte que cambia
+      (USER_TEXT, SENTIMENT... y, en sentiment_fewshot, los ejemplos
+      elegidos para el texto).
+    """
+    from langchain_core.prompts import ChatPromptTemplate
+
+    return ChatPromptTemplate.from_messages(
+        [
+            ("system", load_system_prompt(name)),
+            ("human", load_prompt(f"{name}_prompt.txt")),
+        ]
+    )
+
+
+@lru_cache(maxsize=None)
+def get_chat_prompt(name: str) -> ChatPromptTemplate:
+    """
+    load_chat_prompt(name) una sola vez por proceso. Los templates se
+    construyen la primera vez que se arma una cadena, no al importar el
+    módulo: el CLI, la app y los scripts que no llaman al LLM no leen
+    los ficheros de prompts.
+    """
+    return load_chat_prompt(name)
+
+
+# Nombres antiguos de los templates -> prompt. Se resuelven bajo demanda
+# con __getattr__ (from chains.sentiment_chain import sentiment_prompt_tmpl
+# sigue funcionando).
+_PROMPT_ATTRS = {
+    "sentiment_prompt_tmpl": "sentiment",
+    # Variante con ejemplos few-shot elegidos por texto (chains/example_selector.py)
+    "sentiment_fewshot_prompt_tmpl": "sentiment_fewshot",
+    "explanation_prompt_tmpl": "explanation",
+    "reply_prompt_tmpl": "reply",
+}
+
+
+def __getattr__(name: str) -> Any:
+    if name in _PROMPT_ATTRS:
+        return get_chat_prompt(_PROMPT_ATTRS[name])
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 # ---------- Parser del JSON de sentimiento ----------
@@ -76,56 +145,167 @@ def _parse_sentiment_str(text: str) -> Dict[str, Any]:
     }
 
 
+# ---------- Piezas comunes (cadena normal y streaming) ----------
+
+GENERATED_FIELDS = ("explanation", "suggested_reply")
+
+# Clave de metadata con el campo que genera cada llamada al LLM
+# ("classification" para el JSON de sentimiento). Al hacer streaming del
+# grafo (graph/streaming.py) sirve para saber a qué campo pertenece cada token,
+# y las métricas del LLM (tools/metrics.py) la usan como etapa.
+STREAM_FIELD_KEY = "stream_field"
+CLASSIFICATION_FIELD = "classification"
+
+
+def _build_llm_chains(llm: Runnable, few_shot_k: Optional[int] = None) -> Dict[str, Runnable]:
+    # prompt -> llm -> string, compuestos una sola vez por cadena
+    str_parser = StrOutputParser()
+
+    sentiment_prompt: Runnable = get_chat_prompt("sentiment")
+    if few_shot_k:
+        selector = get_example_selector()
+
+        def _with_examples(inputs: Dict[str, Any]) -> Dict[str, Any]:
+            return {**inputs, "examples": selector.render(inputs["user_text"], k=few_shot_k)}
+
+        sentiment_prompt = RunnableLambda(_with_examples) | get_chat_prompt("sentiment_fewshot")
+
+    return {
+        "sentiment": (sentiment_prompt | llm | str_parser).with_config(
+            metadata={STREAM_FIELD_KEY: CLASSIFICATION_FIELD}
+        ),
+        "explanation": (get_chat_prompt("explanation") | llm | str_parser).with_config(
+            metadata={STREAM_FIELD_KEY: "explanation"}
+        ),
+        "suggested_reply": (get_chat_prompt("reply") | llm | str_parser).with_config(
+            metadata={STREAM_FIELD_KEY: "suggested_reply"}
+        ),
+    }
+
+
+def _classify(
+    inputs: Dict[str, Any],
+    sentiment_llm_chain: Runnable,
+    preclassifier: Optional[Any] = None,
+) -> Dict[str, Any]:
+    """Paso 1): entrada + sentiment, score y short_reason."""
+    if "sentiment" in inputs:
+        # ya clasificada (p. ej. en un prompt empaquetado, ver packed_classifier.py)
+        return {
+            "short_reason": "",
+            "score": 0.0,
+            **inputs,
+        }
+
+    user_text = inputs["user_text"]
+
+    if preclassifier is not None:
+        local = preclassifier.predict([user_text])[0]
+        if local is not None:
+            return {
+                **inputs,
+                **local,
+            }
+
+    raw_output = sentiment_llm_chain.invoke({"user_text": user_text})
+
+    with stage_timer("parse:sentiment"):
+        sentiment_info = _parse_sentiment_str(raw_output)
+    return {
+        **inputs,
+        **sentiment_info,
+    }
+
+
+def _generation_inputs(field: str, classified: Dict[str, Any]) -> Dict[str, Any]:
+    """Variables del prompt de `field` (explicación o respuesta)."""
+    if field == "explanation":
+        return {
+            "user_text": classified["user_text"],
+            "sentiment": classified["sentiment"],
+            "short_reason": classified["short_reason"],
+        }
+    return {
+        "user_text": classified["user_text"],
+        "sentiment": classified["sentiment"],
+    }
+
+
+def _requested_fields(inputs: Dict[str, Any], default: Sequence[str]) -> List[str]:
+    requested = set(inputs.get("fields", default))
+    return [f for f in GENERATED_FIELDS if f in requested]
+
+
 # ---------- Builder de la "cadena" de análisis ----------
 
-def build_sentiment_agent_chain(config: str = "A") -> RunnableLambda:
+
+def build_sentiment_agent_chain(
+    config: str = "A",
+    parallel: bool = True,
+    llm: Optional[Runnable] = None,
+    use_cache: Optional[bool] = None,
+    deferred: bool = False,
+    preclassifier: Optional[Any] = None,
+    few_shot_k: Optional[int] = None,
+    single_flight: Optional[Any] = None,
+) -> RunnableLambda:
     """
     Devuelve un Runnable que:
       1) Usa el prompt de sentimiento (JSON) y lo parsea
       2) Genera una explicación
       3) Genera una respuesta sugerida
 
+    Los pasos 2) y 3) solo dependen de la clasificación, así que con
+    parallel=True (por defecto) se lanzan a la vez una vez termina 1):
+    la latencia pasa de ~3 llamadas al LLM a ~2.
+    Con parallel=False se ejecutan en orden, como antes.
+
+    `llm` permite inyectar otro modelo (p. ej. uno simulado en benchmarks);
+    si no se pasa, se usa get_llm(config, use_cache=use_cache).
+    Por defecto la config A cachea respuestas en disco y la B no
+    (ver models/llm_config.py).
+
+    Con deferred=True solo se clasifica (1 llamada al LLM): "explanation"
+    y "suggested_reply" salen como None y el resultado lleva
+    "deferred": True. Se generan después con chains/expansion.py.
+
+    `preclassifier` (models/preclassifier.py) es la cascada: si está lo
+    bastante seguro responde él y el paso 1) no llama al LLM.
+
+    Con few_shot_k el prompt de sentimiento lleva solo los few_shot_k
+    ejemplos más parecidos al texto (chains/example_selector.py) en vez de
+    los ejemplos fijos.
+
     Se llama igual que antes: chain({"user_text": "..."})
+    También acepta {"user_text", "sentiment", "score", "short_reason"} para
+    generar solo explicación y respuesta, y una clave opcional "fields"
+    con el subconjunto de GENERATED_FIELDS a generar.
+    Con "timings": True en la entrada el resultado lleva además "timings":
+    segundos por etapa y tokens/duraciones de Ollama de ese análisis
+    (ver tools/metrics.py). Las métricas agregadas se registran siempre.
+
+    `single_flight` (chains/single_flight.py): las llamadas concurrentes con
+    la misma entrada (mismo texto normalizado) se resuelven con una sola
+    ejecución de la cadena; el registro de cadenas lo activa.
     """
 
-    llm = get_llm(config)
-    str_parser = StrOutputParser()
+    if llm is None:
+        llm = get_llm(config, use_cache=use_cache)
+    llm_chains = _build_llm_chains(llm, few_shot_k=few_shot_k)
 
     # 1) Runnable para clasificación de sentimiento -> dict con sentiment, score, short_reason
     def _run_sentiment(inputs: Dict[str, Any]) -> Dict[str, Any]:
-        user_text = inputs["user_text"]
-        # prompt -> llm -> string
-        raw_output = (
-            sentiment_prompt_tmpl
-            | llm
-            | str_parser
-        ).invoke({"user_text": user_text})
-
-        sentiment_info = _parse_sentiment_str(raw_output)
-        return {
-            **inputs,
-            **sentiment_info,
-        }
+        with stage_timer("chain:sentiment"):
+            return _classify(inputs, llm_chains["sentiment"], preclassifier)
 
     sentiment_runnable = RunnableLambda(_run_sentiment)
 
     # 2) Runnable para explicación
     def _run_explanation(inputs: Dict[str, Any]) -> Dict[str, Any]:
-        user_text = inputs["user_text"]
-        sentiment = inputs["sentiment"]
-        short_reason = inputs["short_reason"]
-
-        explanation = (
-            explanation_prompt_tmpl
-            | llm
-            | str_parser
-        ).invoke(
-            {
-                "user_text": user_text,
-                "sentiment": sentiment,
-                "short_reason": short_reason,
-            }
-        )
+        with stage_timer("chain:explanation"):
+            explanation = llm_chains["explanation"].invoke(
+                _generation_inputs("explanation", inputs)
+            )
 
         return {
             **inputs,
@@ -136,19 +316,10 @@ def build_sentiment_agent_chain(config: str = "A") -> RunnableLambda:
 
     # 3) Runnable para respuesta sugerida
     def _run_reply(inputs: Dict[str, Any]) -> Dict[str, Any]:
-        user_text = inputs["user_text"]
-        sentiment = inputs["sentiment"]
-
-        reply = (
-            reply_prompt_tmpl
-            | llm
-            | str_parser
-        ).invoke(
-            {
-                "user_text": user_text,
-                "sentiment": sentiment,
-            }
-        )
+        with stage_timer("chain:reply"):
+            reply = llm_chains["suggested_reply"].invoke(
+                _generation_inputs("suggested_reply", inputs)
+            )
 
         return {
             **inputs,
@@ -157,18 +328,191 @@ def build_sentiment_agent_chain(config: str = "A") -> RunnableLambda:
 
     reply_runnable = RunnableLambda(_run_reply)
 
-    # 4) Pipeline completo: aplica los tres pasos en orden
-    def _full_pipeline(inputs: Dict[str, Any]) -> Dict[str, Any]:
-        out1 = sentiment_runnable.invoke(inputs)
-        out2 = explanation_runnable.invoke(out1)
-        out3 = reply_runnable.invoke(out2)
+    # 2) + 3) en paralelo: ambas ramas reciben la salida de la clasificación
+    generation_runnable = RunnableParallel(
+        explanation=explanation_runnable,
+        reply=reply_runnable,
+    )
+
+    # 4) Pipeline completo: clasificación y luego explicación + respuesta.
+    # Si la entrada ya trae "sentiment" (p. ej. clasificada en un prompt
+    # empaquetado, ver packed_classifier.py) se salta el paso 1).
+    default_fields: Sequence[str] = () if deferred else GENERATED_FIELDS
+
+    def _analyze(inputs: Dict[str, Any]) -> Dict[str, Any]:
+        fields = _requested_fields(inputs, default_fields)
+
+        if "sentiment" in inputs:
+            out1 = _classify(inputs, llm_chains["sentiment"])
+        else:
+            out1 = sentiment_runnable.invoke(inputs)
+
+        out3 = {**out1, "explanation": None, "suggested_reply": None}
+        if parallel and len(fields) == 2:
+            branches = generation_runnable.invoke(out1)
+            out3["explanation"] = branches["explanation"]["explanation"]
+            out3["suggested_reply"] = branches["reply"]["suggested_reply"]
+        else:
+            if "explanation" in fields:
+                out3["explanation"] = explanation_runnable.invoke(out1)["explanation"]
+            if "suggested_reply" in fields:
+                out3["suggested_reply"] = reply_runnable.invoke(out1)["suggested_reply"]
+
         # devolvemos sólo las claves importantes
-        return {
+        result = {
             "sentiment": out3["sentiment"],
             "score": out3["score"],
             "short_reason": out3["short_reason"],
             "explanation": out3["explanation"],
             "suggested_reply": out3["suggested_reply"],
         }
+        if len(fields) < len(GENERATED_FIELDS):
+            result["deferred"] = True
+        return result
+
+    def _run(inputs: Dict[str, Any]) -> Dict[str, Any]:
+        if not inputs.get("timings"):
+            return _analyze(inputs)
+
+        start = time.perf_counter()
+        with collect_timings() as timings:
+            result = _analyze(inputs)
+        result["timings"] = {**timings.as_dict(), "total_s": round(time.perf_counter() - start, 6)}
+        return result
+
+    # Identifica esta cadena dentro de un SingleFlight compartido
+    chain_key = (config, parallel, deferred, few_shot_k, preclassifier is not None, id(llm))
+
+    def _full_pipeline(inputs: Dict[str, Any]) -> Dict[str, Any]:
+        user_text = inputs.get("user_text")
+        if single_flight is None or not isinstance(user_text, str):
+            return _run(inputs)
+
+        rest = {k: v for k, v in inputs.items() if k != "user_text"}
+        key = (
+            chain_key,
+            normalize_text(user_text),
+            json.dumps(rest, sort_keys=True, default=str) if rest else "",
+        )
+        return single_flight.do(key, lambda: _run(inputs))
 
     return RunnableLambda(_full_pipeline)
+
+
+# ---------- Streaming ----------
+
+def _stream_fields(
+    llm_chains: Dict[str, Runnable],
+    classified: Dict[str, Any],
+    fields: Sequence[str],
+    parallel: bool,
+) -> Iterator[Tuple[str, str]]:
+    """
+    Genera (campo, trozo de texto) a medida que el LLM los produce.
+    Con parallel=True y dos campos, ambos se generan a la vez (un hilo
+    por campo) y los trozos llegan intercalados.
+    """
+    if not parallel or len(fields) < 2:
+        for field in fields:
+            for chunk in llm_chains[field].stream(_generation_inputs(field, classified)):
+                yield field, chunk
+        return
+
+    chunks: "queue.Queue[Tuple[str, Any]]" = queue.Queue()
+    done = object()
+
+    def _produce(field: str) -> None:
+        try:
+            for chunk in llm_chains[field].stream(_generation_inputs(field, classified)):
+                chunks.put((field, chunk))
+        except Exception as exc:
+            chunks.put((field, exc))
+        finally:
+            chunks.put((field, done))
+
+    for field in fields:
+        threading.Thread(target=_produce, args=(field,), daemon=True).start()
+
+    pending = len(fields)
+    while pending:
+        field, chunk = chunks.get()
+        if chunk is done:
+            pending -= 1
+        elif isinstance(chunk, Exception):
+            raise chunk
+        else:
+            yield field, chunk
+
+
+def build_sentiment_stream(
+    config: str = "A",
+    parallel: bool = True,
+    llm: Optional[Runnable] = None,
+    use_cache: Optional[bool] = None,
+    preclassifier: Optional[Any] = None,
+    few_shot_k: Optional[int] = None,
+) -> Callable[[Dict[str, Any]], Iterator[Dict[str, Any]]]:
+    """
+    Versión en streaming de build_sentiment_agent_chain.
+
+    Devuelve una función stream(inputs) (mismas entradas que la cadena)
+    que va generando eventos (dicts):
+      - {"event": "classification", "sentiment", "score", "short_reason", "elapsed_s"}
+        en cuanto termina la clasificación;
+      - {"event": "token", "field", "text"} por cada trozo de la explicación
+        o de la respuesta ("field" es "explanation" o "suggested_reply"),
+        intercalados si parallel=True;
+      - {"event": "end", "result", "timings"} al final, con el mismo
+        resultado que devolvería la cadena y los tiempos en segundos:
+        classification_s, ttft_s (primer token generado), ttft_by_field
+        y total_s.
+    """
+
+    if llm is None:
+        llm = get_llm(config, use_cache=use_cache)
+    llm_chains = _build_llm_chains(llm, few_shot_k=few_shot_k)
+
+    def stream(inputs: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        start = time.perf_counter()
+        fields = _requested_fields(inputs, GENERATED_FIELDS)
+
+        classified = _classify(inputs, llm_chains["sentiment"], preclassifier)
+        classification_s = time.perf_counter() - start
+        yield {
+            "event": "classification",
+            "sentiment": classified["sentiment"],
+            "score": classified["score"],
+            "short_reason": classified["short_reason"],
+            "elapsed_s": classification_s,
+        }
+
+        texts: Dict[str, str] = {f: "" for f in fields}
+        ttft_by_field: Dict[str, float] = {}
+        for field, chunk in _stream_fields(llm_chains, classified, fields, parallel):
+            if field not in ttft_by_field:
+                ttft_by_field[field] = time.perf_counter() - start
+            texts[field] += chunk
+            yield {"event": "token", "field": field, "text": chunk}
+
+        result = {
+            "sentiment": classified["sentiment"],
+            "score": classified["score"],
+            "short_reason": classified["short_reason"],
+            "explanation": texts.get("explanation"),
+            "suggested_reply": texts.get("suggested_reply"),
+        }
+        if len(fields) < len(GENERATED_FIELDS):
+            result["deferred"] = True
+
+        yield {
+            "event": "end",
+            "result": result,
+            "timings": {
+                "classification_s": classification_s,
+                "ttft_s": min(ttft_by_field.values()) if ttft_by_field else None,
+                "ttft_by_field": ttft_by_field,
+                "total_s": time.perf_counter() - start,
+            },
+        }
+
+    return stream
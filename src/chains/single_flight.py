@@ -0,0 +1,101 @@
+# src/chains/single_flight.py
+
+"""
+Single-flight: una sola ejecución para peticiones idénticas en vuelo.
+
+Cuando llegan a la vez muchas peticiones con el mismo comentario (un
+comentario viral copiado por decenas de usuarios), cada una lanzaría sus
+tres llamadas al LLM: la caché de respuestas solo ayuda cuando la primera
+ya ha terminado. Con SingleFlight.do(key, fn) la primera petición de cada
+clave ejecuta fn ("leader") y las que llegan mientras tanto con la misma
+clave ("followers") esperan y reciben su resultado (una copia) o su
+excepción. Al terminar la clave se olvida: esto no es una caché.
+
+La cadena de análisis usa como clave (config, variante de la cadena,
+texto normalizado con normalize_text, resto de la entrada); ver
+build_sentiment_agent_chain(single_flight=...) y chains/registry.py.
+"""
+
+from __future__ import annotations
+
+import threading
+from typing import Any, Callable, Dict, Hashable, Optional
+
+from tools.metrics import get_metrics
+
+
+class _Call:
+    __slots__ = ("done", "result", "error", "followers")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.followers = 0
+
+
+class SingleFlight:
+    """Agrupa ejecuciones concurrentes por clave (thread-safe)."""
+
+    def __init__(self, name: str = "default"):
+        self.name = name
+        self.leaders = 0
+        self.collapsed = 0  # followers: ejecuciones ahorradas
+        self.errors = 0
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.leaders += 1
+            else:
+                call.followers += 1
+                self.collapsed += 1
+
+        metrics = get_metrics()
+        if not leader:
+            metrics.inc("single_flight_collapsed_total", group=self.name)
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return dict(call.result) if isinstance(call.result, dict) else call.result
+
+        metrics.inc("single_flight_leaders_total", group=self.name)
+        try:
+            result = fn()
+            # los followers copian call.result: que el leader no se lo cambie
+            call.result = dict(result) if isinstance(result, dict) else result
+        except BaseException as exc:
+            call.error = exc
+            with self._lock:
+                self.errors += 1
+            metrics.inc("single_flight_errors_total", group=self.name)
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.leaders + self.collapsed
+            return {
+                "in_flight": len(self._calls),
+                "leaders": self.leaders,
+                "collapsed": self.collapsed,
+                "errors": self.errors,
+                "collapse_rate": self.collapsed / total if total else 0.0,
+            }
+
+
+_single_flight = SingleFlight("sentiment_chain")
+
+
+def get_single_flight() -> SingleFlight:
+    """Grupo compartido por las cadenas del registro (chains/registry.py)."""
+    return _single_flight
@@ -1,7 +1,20 @@
 """
 Graph module - LangGraph state machine definition
+
+Los submódulos se importan bajo demanda: `import graph.graph_builder` no
+carga también nodes, streaming y las cadenas. `from graph import X`
+sigue funcionando (busca X en los submódulos, en este orden).
 """
 
-from .state import *
-from .nodes import *
-from .graph_builder import *
+import importlib
+
+_SUBMODULES = ("state", "nodes", "graph_builder", "streaming")
+
+
+def __getattr__(name):
+    if not name.startswith("_"):
+        for sub in _SUBMODULES:
+            module = importlib.import_module(f"{__name__}.{sub}")
+            if hasattr(module, name):
+                return getattr(module, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,159 @@
+# src/graph/checkpointer.py
+
+"""
+Checkpointers para el grafo.
+
+- "memory": MemorySaver (el de siempre). Todo vive en RAM: cada
+  thread_id y cada checkpoint histórico se quedan en memoria para
+  siempre y se pierden al reiniciar.
+- "sqlite": SQLite en disco con política de retención. Solo se guardan
+  los últimos `keep_last` checkpoints de cada thread. Nada se queda
+  en RAM entre invocaciones: el estado de un thread se lee del disco
+  cuando se vuelve a invocar, así que los threads inactivos no ocupan
+  memoria y sobreviven a un reinicio. Opcional (`max_idle_s`, desactivado
+  por defecto): BORRAR del disco los threads que lleven ese tiempo sin
+  escribir, para que el fichero no crezca con sesiones abandonadas. Es
+  borrado de datos: esas sesiones no se pueden recuperar.
+"""
+
+from __future__ import annotations
+
+import sqlite3
+import time
+from pathlib import Path
+from typing import Any, Optional
+
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.checkpoint.sqlite import SqliteSaver
+
+
+BASE_DIR = Path(__file__).resolve().parents[2]  # carpeta raíz del proyecto
+DEFAULT_CHECKPOINT_DB = BASE_DIR / ".cache" / "graph_checkpoints.sqlite"
+DEFAULT_KEEP_LAST = 5
+DEFAULT_MAX_IDLE_S: Optional[float] = None  # None = no se borra ningún thread
+DEFAULT_CLEANUP_EVERY = 500
+
+
+class RetentionSqliteSaver(SqliteSaver):
+    """
+    SqliteSaver que, tras cada checkpoint nuevo, borra los de ese thread
+    (y sus writes pendientes) que queden fuera de los últimos `keep_last`.
+
+    Además apunta en thread_activity cuándo escribió cada thread por
+    última vez. Con `max_idle_s` (None por defecto) borra del disco,
+    definitivamente, los threads que llevan más de max_idle_s segundos
+    sin escribir: al crearse y cada `cleanup_every` checkpoints (o a mano
+    con delete_idle_threads).
+    """
+
+    def __init__(
+        self,
+        conn: sqlite3.Connection,
+        keep_last: int = DEFAULT_KEEP_LAST,
+        max_idle_s: Optional[float] = DEFAULT_MAX_IDLE_S,
+        cleanup_every: int = DEFAULT_CLEANUP_EVERY,
+    ):
+        super().__init__(conn)
+        self.keep_last = max(1, int(keep_last))
+        self.max_idle_s = max_idle_s
+        self.cleanup_every = max(1, int(cleanup_every))
+        self._puts_since_cleanup = 0
+        if self.max_idle_s:
+            self.delete_idle_threads()
+
+    def setup(self) -> None:
+        if self.is_setup:
+            return
+        super().setup()
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS thread_activity (
+                thread_id TEXT PRIMARY KEY,
+                last_write REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_thread_activity_last_write
+                ON thread_activity (last_write);
+            """
+        )
+        # threads de antes de existir la tabla: su inactividad cuenta desde ahora
+        self.conn.execute(
+            "INSERT OR IGNORE INTO thread_activity (thread_id, last_write) "
+            "SELECT DISTINCT thread_id, ? FROM checkpoints",
+            (time.time(),),
+        )
+        self.conn.commit()
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        next_config = super().put(config, checkpoint, metadata, new_versions)
+        self._prune(
+            next_config["configurable"]["thread_id"],
+            next_config["configurable"].get("checkpoint_ns", ""),
+        )
+        if self.max_idle_s:
+            self._puts_since_cleanup += 1
+            if self._puts_since_cleanup >= self.cleanup_every:
+                self.delete_idle_threads()
+        return next_config
+
+    def delete_idle_threads(self, max_idle_s: Optional[float] = None) -> int:
+        """
+        Borra (sin vuelta atrás) los checkpoints y writes de los threads sin
+        escribir en max_idle_s segundos. Devuelve cuántos threads ha borrado.
+        """
+        max_idle_s = max_idle_s if max_idle_s is not None else self.max_idle_s
+        self._puts_since_cleanup = 0
+        if not max_idle_s:
+            return 0
+        cutoff = (time.time() - max_idle_s,)
+        idle = "SELECT thread_id FROM thread_activity WHERE last_write < ?"
+        with self.cursor() as cur:
+            cur.execute(f"DELETE FROM writes WHERE thread_id IN ({idle})", cutoff)
+            cur.execute(f"DELETE FROM checkpoints WHERE thread_id IN ({idle})", cutoff)
+            cur.execute("DELETE FROM thread_activity WHERE last_write < ?", cutoff)
+            return cur.rowcount
+
+    def delete_thread(self, thread_id: str) -> None:
+        super().delete_thread(thread_id)
+        with self.cursor() as cur:
+            cur.execute("DELETE FROM thread_activity WHERE thread_id = ?", (str(thread_id),))
+
+    def _prune(self, thread_id: str, checkpoint_ns: str) -> None:
+        keep = (
+            "SELECT checkpoint_id FROM checkpoints "
+            "WHERE thread_id = ? AND checkpoint_ns = ? "
+            "ORDER BY checkpoint_id DESC LIMIT ?"
+        )
+        params = (thread_id, checkpoint_ns, thread_id, checkpoint_ns, self.keep_last)
+        with self.cursor() as cur:
+            cur.execute(
+                "DELETE FROM writes WHERE thread_id = ? AND checkpoint_ns = ? "
+                f"AND checkpoint_id NOT IN ({keep})",
+                params,
+            )
+            cur.execute(
+                "DELETE FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? "
+                f"AND checkpoint_id NOT IN ({keep})",
+                params,
+            )
+            cur.execute(
+                "INSERT INTO thread_activity (thread_id, last_write) VALUES (?, ?) "
+                "ON CONFLICT(thread_id) DO UPDATE SET last_write = excluded.last_write",
+                (thread_id, time.time()),
+            )
+
+
+def build_checkpointer(
+    kind: str = "memory",
+    db_path: Path | str = DEFAULT_CHECKPOINT_DB,
+    keep_last: int = DEFAULT_KEEP_LAST,
+    max_idle_s: Optional[float] = DEFAULT_MAX_IDLE_S,
+) -> Any:
+    """Devuelve el checkpointer pedido: "memory" o "sqlite"."""
+    if kind == "memory":
+        return MemorySaver()
+    if kind == "sqlite":
+        db_path = Path(db_path)
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(db_path), check_same_thread=False)
+        return RetentionSqliteSaver(conn, keep_last=keep_last, max_idle_s=max_idle_s)
+    raise ValueError(f"Unknown checkpointer: {kind}")
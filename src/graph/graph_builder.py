@@ -2,17 +2,24 @@
 
 from __future__ import annotations
 
-from typing import Literal
+from pathlib import Path
+from typing import Callable, Literal, Optional
 
 from langgraph.graph import END, StateGraph
-from langgraph.checkpoint.memory import MemorySaver
 
-from graph.state import AgentState
+from graph.checkpointer import (
+    DEFAULT_CHECKPOINT_DB,
+    DEFAULT_KEEP_LAST,
+    DEFAULT_MAX_IDLE_S,
+    build_checkpointer,
+)
+from graph.state import AgentState, agent_state_schema
+from tools.metrics import instrument_node
 from graph.nodes import (
     router_node,
     single_analysis_node,
     batch_analysis_node,
-    stats_node,
+    make_stats_node,
     final_output_node,
 )
 
@@ -24,23 +31,56 @@ def _route_selector(state: AgentState) -> Literal["single", "batch"]:
     return route  # type: ignore
 
 
-def build_agent_graph():
+def _without_state_hints(fn: Callable) -> Callable:
+    """
+    fn sin anotaciones de tipo. LangGraph también saca canales de la
+    anotación AgentState de nodos y routers; con results_window su
+    "results" sin límite chocaría con el del schema recortado.
+    """
+    return lambda state: fn(state)
+
+
+def build_agent_graph(
+    checkpointer: str = "memory",
+    db_path: Path | str = DEFAULT_CHECKPOINT_DB,
+    keep_last: int = DEFAULT_KEEP_LAST,
+    max_idle_s: Optional[float] = DEFAULT_MAX_IDLE_S,
+    results_window: Optional[int] = None,
+):
     """
     Construye y compila el LangGraph del agente:
 
     Start -> router -> (single_analysis | batch_analysis) -> stats -> final -> END
 
-    Usa MemorySaver como checkpointer, lo que da memoria por thread_id.
+    Cada nodo se mide como la etapa node:<nombre> (tools/metrics.py).
+
+    El checkpointer da memoria por thread_id:
+    - "memory" (por defecto): MemorySaver, todo en RAM.
+    - "sqlite": en disco (db_path), guardando solo los últimos `keep_last`
+      checkpoints por thread. Con `max_idle_s` (opcional) además borra del
+      disco, sin vuelta atrás, los threads sin escribir en ese tiempo
+      (ver graph/checkpointer.py).
+
+    Por defecto state["results"] guarda todo el historial de cada thread.
+    Con results_window=N solo los N más recientes (agent_state_schema):
+    el checkpoint deja de crecer con la sesión, pero los resultados
+    anteriores ya no están en el estado (las stats siguen siendo de toda
+    la sesión).
     """
 
-    workflow = StateGraph(AgentState)
+    workflow = StateGraph(agent_state_schema(results_window))
+
+    def _add_node(name: str, fn: Callable) -> None:
+        if results_window:
+            fn = _without_state_hints(fn)
+        workflow.add_node(name, instrument_node(name, fn))
 
     # Nodos
-    workflow.add_node("router", router_node)
-    workflow.add_node("single_analysis", single_analysis_node)
-    workflow.add_node("batch_analysis", batch_analysis_node)
-    workflow.add_node("stats", stats_node)
-    workflow.add_node("final", final_output_node)
+    _add_node("router", router_node)
+    _add_node("single_analysis", single_analysis_node)
+    _add_node("batch_analysis", batch_analysis_node)
+    _add_node("stats", make_stats_node(full_history=not results_window))
+    _add_node("final", final_output_node)
 
     # Entry point
     workflow.set_entry_point("router")
@@ -48,7 +88,7 @@ def build_agent_graph():
     # Routing condicional desde 'router'
     workflow.add_conditional_edges(
         "router",
-        _route_selector,
+        _without_state_hints(_route_selector) if results_window else _route_selector,
         {
             "single": "single_analysis",
             "batch": "batch_analysis",
@@ -62,8 +102,8 @@ def build_agent_graph():
     workflow.add_edge("final", END)
 
     # Memoria (LangGraph checkpoint)
-    checkpointer = MemorySaver()
+    saver = build_checkpointer(checkpointer, db_path=db_path, keep_last=keep_last, max_idle_s=max_idle_s)
 
-    app = workflow.compile(checkpointer=checkpointer)
+    app = workflow.compile(checkpointer=saver)
 
     return app
@@ -2,11 +2,20 @@
 
 from __future__ import annotations
 
-from typing import Any, Dict, List
+from functools import partial
+from typing import Any, Callable, Dict, List
 
 from graph.state import AgentState
-from chains.sentiment_chain import build_sentiment_agent_chain
-from tools.stats_tools import compute_sentiment_stats
+from chains.registry import get_packed_classifier, get_sentiment_chain
+from chains.batch_runner import (
+    DEFAULT_MAX_CONCURRENCY,
+    LLM_CALLS_PER_COMMENT,
+    run_batch,
+)
+from chains.expansion import expand_result
+from models.preclassifier import get_preclassifier
+from models.semantic_cache import get_semantic_cache
+from tools.stats_tools import running_stats_summary, update_running_stats
 
 
 # ---------- Router node ----------
@@ -24,7 +33,7 @@ def router_node(state: AgentState) -> AgentState:
 
     # Si ya se decidió antes (por memoria), no tocamos
     if "route" in state:
-        return state
+        return {}
 
     user_input = state.get("user_input", "") or ""
     texts: List[str] = state.get("texts") or []
@@ -45,10 +54,9 @@ def router_node(state: AgentState) -> AgentState:
         route = "single"
 
     new_state: AgentState = {
-        **state,
         "route": route,  # type: ignore
     }
-    if texts:
+    if texts and texts != state.get("texts"):
         new_state["texts"] = texts
 
     return new_state
@@ -59,15 +67,30 @@ def router_node(state: AgentState) -> AgentState:
 def single_analysis_node(state: AgentState) -> AgentState:
     """
     Usa la cadena de análisis de sentimiento para un solo texto.
-    Acumula el resultado en state["results"] (memoria a largo plazo).
+    Acumula el resultado en state["results"] (memoria a largo plazo):
+    devuelve solo el resultado nuevo, el reducer lo añade al historial
+    (o a los más recientes, con results_window en build_agent_graph).
+    Con state["deferred"] solo clasifica; final_output_node genera
+    después la explicación y la respuesta que va a mostrar.
     """
 
     user_text = state.get("user_input", "")
     if not user_text:
         raise ValueError("single_analysis_node: state['user_input'] está vacío.")
 
-    chain = build_sentiment_agent_chain(config="A")
-    out = chain.invoke({"user_text": user_text})
+    semantic_cache = get_semantic_cache("A") if state.get("semantic_cache") else None
+    out = semantic_cache.lookup(user_text) if semantic_cache is not None else None
+
+    if out is None:
+        chain = get_sentiment_chain(
+            config="A",
+            deferred=bool(state.get("deferred")),
+            cascade=bool(state.get("cascade")),
+            few_shot_k=state.get("few_shot_k") or None,
+        )
+        out = chain.invoke({"user_text": user_text, "timings": bool(state.get("timings"))})
+        if semantic_cache is not None:
+            semantic_cache.add(user_text, out)
 
     current_result: Dict[str, Any] = {
         "text": user_text,
@@ -77,13 +100,14 @@ def single_analysis_node(state: AgentState) -> AgentState:
         "explanation": out["explanation"],
         "suggested_reply": out["suggested_reply"],
     }
-
-    prev_results = state.get("results") or []
-    new_results = prev_results + [current_result]
+    if out.get("deferred"):
+        current_result["deferred"] = True
+    if out.get("timings"):
+        current_result["timings"] = out["timings"]
 
     new_state: AgentState = {
-        **state,
-        "results": new_results,
+        "results": [current_result],
+        "results_total": 1,
         "sentiment": out["sentiment"],
         "score": out["score"],
         "explanation": out["explanation"],
@@ -99,8 +123,14 @@ def batch_analysis_node(state: AgentState) -> AgentState:
     Analiza múltiples textos (batch).
 
     Toma la lista state["texts"].
-    Para cada texto, usa la misma cadena de análisis individual.
-    Agrega todos los resultados a state["results"] (acumulando sobre lo anterior).
+    Para cada texto, usa la misma cadena de análisis individual, procesando
+    hasta state["max_concurrency"] textos en paralelo (run_batch).
+    Con state["pack_size"] > 1 la clasificación se hace en prompts
+    empaquetados (varios textos por llamada).
+    Agrega todos los resultados a state["results"] (acumulando sobre lo
+    anterior, o sobre los más recientes con results_window en
+    build_agent_graph), en el mismo orden que state["texts"]. Los textos repetidos se analizan
+    una sola vez; state["batch_info"] resume cuántas llamadas se ahorraron.
     """
 
     texts: List[str] = state.get("texts") or []
@@ -115,54 +145,123 @@ def batch_analysis_node(state: AgentState) -> AgentState:
     if not texts:
         raise ValueError("batch_analysis_node: no hay textos para analizar.")
 
-    chain = build_sentiment_agent_chain(config="A")
-
-    new_results: List[Dict[str, Any]] = state.get("results") or []
-
-    for t in texts:
-        out = chain.invoke({"user_text": t})
-        new_results.append(
-            {
-                "text": t,
-                "sentiment": out["sentiment"],
-                "score": out["score"],
-                "short_reason": out["short_reason"],
-                "explanation": out["explanation"],
-                "suggested_reply": out["suggested_reply"],
-            }
-        )
+    chain = get_sentiment_chain(
+        config="A",
+        deferred=bool(state.get("deferred")),
+        few_shot_k=state.get("few_shot_k") or None,
+    )
+
+    max_concurrency = state.get("max_concurrency") or DEFAULT_MAX_CONCURRENCY
+
+    pack_size = state.get("pack_size") or 0
+    classifier = None
+    if pack_size > 1:
+        classifier = get_packed_classifier(config="A", pack_size=pack_size)
+
+    # Cascada: el pre-clasificador resuelve todo el batch de una vez y
+    # lo dudoso pasa al clasificador empaquetado o a la cadena
+    preclassifier = get_preclassifier() if state.get("cascade") else None
+    if preclassifier is not None:
+        classifier = preclassifier.batch_classifier(fallback=classifier)
+
+    semantic_cache = get_semantic_cache("A") if state.get("semantic_cache") else None
+
+    batch_results = run_batch(
+        chain,
+        texts,
+        max_concurrency=max_concurrency,
+        classifier=classifier,
+        semantic_cache=semantic_cache,
+        timings=bool(state.get("timings")),
+    )
+
+    duplicates = sum(1 for r in batch_results if r.get("duplicate"))
+    calls_per_comment = 1 if state.get("deferred") else LLM_CALLS_PER_COMMENT
 
     new_state: AgentState = {
-        **state,
-        "texts": texts,
-        "results": new_results,
+        "results": batch_results,
+        "results_total": len(batch_results),
+        "batch_info": {
+            "texts": len(texts),
+            "unique": len(texts) - duplicates,
+            "duplicates": duplicates,
+            "llm_calls_saved": duplicates * calls_per_comment,
+        },
     }
+    if texts != state.get("texts"):
+        new_state["texts"] = texts
     return new_state
 
 
 # ---------- Stats node (tool) ----------
 
-def stats_node(state: AgentState) -> AgentState:
+def stats_node(state: AgentState, full_history: bool = True) -> AgentState:
     """
     Node tipo 'tool': usa funciones de Python (stats_tools) para
     calcular estadísticas agregadas de los resultados guardados.
+
+    Las estadísticas se mantienen de forma incremental: solo se suman al
+    agregado (state["running_stats"]) los resultados añadidos desde el
+    último turno (los últimos de state["results"]), en vez de recorrer
+    todo el historial cada vez.
+
+    full_history=False cuando "results" solo guarda los más recientes
+    (make_stats_node): entonces nunca se recalcula desde "results".
     """
 
     results = state.get("results") or []
-    stats = compute_sentiment_stats(results)
+    total = state.get("results_total", len(results))
+    new = total - state.get("stats_seen", 0)
+    running = state.get("running_stats")
+    failed = state.get("failed_total", 0)
+    total_fix = 0
+
+    if not 0 <= new <= len(results):
+        # Contadores que no cuadran (historial reiniciado, o un checkpoint
+        # de antes de results_total).
+        if full_history:
+            # "results" es todo el historial: se recalcula desde cero con
+            # él y se corrige results_total
+            new = len(results)
+            running = None
+            failed = 0
+            total_fix = len(results) - total
+            total = len(results)
+        else:
+            # "results" está recortado: recalcular desde ahí dejaría el
+            # agregado con solo los recientes. Se conserva el agregado y
+            # se sigue contando a partir de este punto.
+            new = 0
+
+    new_results = results[len(results) - new:]
+    running = update_running_stats(running, new_results)
 
     new_state: AgentState = {
-        **state,
-        "stats": stats,
+        "running_stats": running,
+        "stats_seen": total,
+        "stats": running_stats_summary(running),
+        "failed_total": failed + sum(1 for r in new_results if r.get("error")),
     }
+    if total_fix:
+        new_state["results_total"] = total_fix
     return new_state
 
 
+def make_stats_node(full_history: bool = True) -> Callable[[AgentState], AgentState]:
+    """stats_node para un grafo con (o sin) todo el historial en "results"."""
+    return stats_node if full_history else partial(stats_node, full_history=False)
+
+
 # ---------- Final output node ----------
 
 def final_output_node(state: AgentState) -> AgentState:
     """
     Construye un mensaje final legible para el usuario, dependiendo de la ruta.
+
+    Si el resultado mostrado está "deferred", aquí se generan su explicación
+    y su respuesta (solo las del resultado que se muestra). Se guardan en
+    las claves "explanation"/"suggested_reply" del estado; la entrada de
+    "results" se queda como solo-clasificación.
     """
 
     route = state.get("route", "single")
@@ -173,6 +272,8 @@ def final_output_node(state: AgentState) -> AgentState:
         if not results:
             raise ValueError("final_output_node: no hay resultados en modo single.")
         last = results[-1]
+        if last.get("deferred"):
+            last = expand_result(dict(last))
         sentiment = last.get("sentiment")
         score = last.get("score")
         explanation = last.get("explanation")
@@ -198,6 +299,15 @@ def final_output_node(state: AgentState) -> AgentState:
         msg = []
         msg.append("📊 Batch sentiment analysis summary")
         msg.append(f"- Total texts analyzed (this session): {total}")
+        failed = state.get("failed_total", 0)
+        if failed:
+            msg.append(f"- Failed texts (this session): {failed}")
+        batch_info = state.get("batch_info") or {}
+        if batch_info.get("duplicates"):
+            msg.append(
+                f"- Duplicates collapsed (this batch): {batch_info['duplicates']} "
+                f"({batch_info['llm_calls_saved']} LLM calls saved)"
+            )
         msg.append("")
         msg.append("Counts:")
         for label, cnt in counts.items():
@@ -216,7 +326,10 @@ def final_output_node(state: AgentState) -> AgentState:
         final_output = "\n".join(msg)
 
     new_state: AgentState = {
-        **state,
         "final_output": final_output,
     }
+    if route == "single":
+        # por si se acaban de generar (resultado deferred)
+        new_state["explanation"] = explanation or ""
+        new_state["suggested_reply"] = reply or ""
     return new_state
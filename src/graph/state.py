@@ -2,7 +2,8 @@
 
 from __future__ import annotations
 
-from typing import Any, Dict, List, Literal, Optional, TypedDict
+import operator
+from typing import Annotated, Any, Callable, Dict, List, Literal, Optional, TypedDict, get_type_hints
 
 
 RouteType = Literal["single", "batch"]
@@ -13,6 +14,17 @@ class AgentState(TypedDict, total=False):
     Estado compartido entre los nodos del grafo.
 
     total=False => todas las claves son opcionales, así no revienta si falta alguna.
+
+    Los nodos devuelven solo las claves que cambian (no {**state, ...}).
+    "results" lleva un reducer de concatenación: cada nodo devuelve solo
+    los resultados nuevos y LangGraph los añade a los anteriores, así que
+    el historial no se reescribe en cada superstep.
+
+    Por defecto "results" guarda todo el historial de la sesión. Con
+    agent_state_schema(results_window=N) solo guarda los N más recientes
+    y el checkpoint deja de crecer con la sesión; lo que abarca toda la
+    sesión sigue en los agregados (running_stats, results_total,
+    failed_total).
     """
 
     # Input bruto del usuario
@@ -21,9 +33,35 @@ class AgentState(TypedDict, total=False):
     # Ruta decidida por el router
     route: RouteType
 
-    # Textos para análisis batch (lista de comentarios)
+    # Textos para análisis batch (lista de comentarios) de la invocación actual.
+    # Sin reducer a propósito: si se acumularan, batch_analysis_node volvería
+    # a analizar los batches anteriores.
     texts: List[str]
 
+    # Máximo de textos analizados en paralelo en modo batch
+    max_concurrency: int
+
+    # Si > 1, en modo batch se clasifican hasta pack_size textos por prompt
+    pack_size: int
+
+    # Solo clasificación: explicación y respuesta se generan bajo demanda
+    # (solo las que final_output_node muestra, ver chains/expansion.py)
+    deferred: bool
+
+    # Cascada: el pre-clasificador local responde si está seguro
+    # y solo se llama al LLM para los textos dudosos
+    cascade: bool
+
+    # Si > 0, el prompt de sentimiento lleva solo los few_shot_k ejemplos
+    # más parecidos a cada texto (chains/example_selector.py)
+    few_shot_k: int
+
+    # Reutilizar análisis de textos casi idénticos (caché semántica con Chroma)
+    semantic_cache: bool
+
+    # Añadir a cada resultado "timings" (segundos por etapa, tokens de Ollama)
+    timings: bool
+
     # Resultados individuales de análisis
     # Cada dict puede contener:
     #   - "text"
@@ -32,11 +70,31 @@ class AgentState(TypedDict, total=False):
     #   - "short_reason"
     #   - "explanation"
     #   - "suggested_reply"
-    results: List[Dict[str, Any]]
+    #   - "error" (solo si el análisis de ese texto falló)
+    #   - "deferred" (explicación/respuesta aún sin generar)
+    #   - "duplicate" (copia del resultado de un texto repetido en el batch)
+    #   - "timings" (solo con state["timings"], ver tools/metrics.py)
+    # Append-only: los nodos devuelven {"results": [nuevos],
+    # "results_total": len(nuevos)}. results_total cuenta todos los de la
+    # sesión, aunque "results" esté limitado (agent_state_schema).
+    results: Annotated[List[Dict[str, Any]], operator.add]
+    results_total: Annotated[int, operator.add]
+
+    # Resumen del último batch: texts, unique, duplicates, llm_calls_saved
+    batch_info: Dict[str, Any]
 
     # Estadísticas agregadas (counts, distribution, etc.)
     stats: Dict[str, Any]
 
+    # Agregado incremental de stats_tools.update_running_stats y cuántos
+    # resultados de la sesión (results_total) lleva ya contados: stats_node
+    # solo procesa los nuevos en cada turno
+    running_stats: Dict[str, Any]
+    stats_seen: int
+
+    # Resultados con "error" en toda la sesión
+    failed_total: int
+
     # Para el caso single, guardamos estas claves directamente
     sentiment: str
     score: float
@@ -45,3 +103,29 @@ class AgentState(TypedDict, total=False):
 
     # Mensaje final en texto legible para mostrar al usuario
     final_output: str
+
+
+def recent_results(window: int) -> Callable[[Optional[List[Any]], Optional[List[Any]]], List[Any]]:
+    """
+    Reducer de "results" que añade los nuevos y se queda con los últimos
+    `window` (nunca menos que los que trae el turno actual).
+    """
+
+    def _append_recent(left: Optional[List[Any]], right: Optional[List[Any]]) -> List[Any]:
+        right = right or []
+        merged = (left or []) + right
+        return merged[-max(window, len(right)):]
+
+    return _append_recent
+
+
+def agent_state_schema(results_window: Optional[int] = None) -> type:
+    """
+    AgentState tal cual, o con "results" limitado a los `results_window`
+    más recientes (opcional: el historial anterior se pierde del estado).
+    """
+    if not results_window:
+        return AgentState
+    hints = get_type_hints(AgentState, include_extras=True)
+    hints["results"] = Annotated[List[Dict[str, Any]], recent_results(int(results_window))]
+    return TypedDict("AgentState", hints, total=False)  # type: ignore[operator]
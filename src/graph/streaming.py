@@ -0,0 +1,139 @@
+# src/graph/streaming.py
+
+"""
+Streaming del grafo del agente (CLI, Streamlit).
+
+app.invoke solo devuelve el estado cuando el último nodo termina. Aquí se
+recorre el grafo con stream_mode=["messages", "values"] (o con
+astream_events en la versión async) y se convierten los tokens del LLM en
+eventos, igual que chains.sentiment_chain.build_sentiment_stream:
+
+  - {"event": "classification", "sentiment", "score", "short_reason", "elapsed_s"}
+  - {"event": "token", "field", "text"}   ("explanation" | "suggested_reply")
+  - {"event": "end", "state", "timings"}  (estado final + ttft_s / total_s)
+
+Cada llamada al LLM lleva en su metadata el campo que genera
+(STREAM_FIELD_KEY). Solo se emiten tokens de los nodos de un único
+comentario (STREAMED_NODES): en modo batch los tokens de muchos
+comentarios llegarían mezclados.
+
+El evento "classification" sale en cuanto llega el primer token de la
+explicación o de la respuesta (la clasificación ya ha terminado); si el
+texto lo resolvió la cascada o la caché semántica no hay tokens de
+clasificación y no se emite.
+"""
+
+from __future__ import annotations
+
+import time
+from typing import Any, AsyncIterator, Dict, Iterator, Optional
+
+from chains.sentiment_chain import (
+    CLASSIFICATION_FIELD,
+    STREAM_FIELD_KEY,
+    _parse_sentiment_str,
+)
+
+
+STREAMED_NODES = ("single_analysis", "final")
+
+
+class _EventBuilder:
+    """Convierte (chunk, metadata) del LLM en eventos y mide el TTFT."""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.ttft_s: Optional[float] = None
+        self._classification_text = ""
+        self._classification_sent = False
+
+    def _classification_event(self) -> Optional[Dict[str, Any]]:
+        if self._classification_sent or not self._classification_text:
+            return None
+        self._classification_sent = True
+        try:
+            info = _parse_sentiment_str(self._classification_text)
+        except ValueError:
+            return None
+        return {
+            "event": "classification",
+            **info,
+            "elapsed_s": time.perf_counter() - self.start,
+        }
+
+    def on_chunk(self, chunk: Any, metadata: Optional[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        metadata = metadata or {}
+        if metadata.get("langgraph_node") not in STREAMED_NODES:
+            return
+        field = metadata.get(STREAM_FIELD_KEY)
+        text = getattr(chunk, "content", None)
+        if text is None:
+            text = getattr(chunk, "text", chunk)
+        if field is None or not isinstance(text, str) or not text:
+            return
+
+        if field == CLASSIFICATION_FIELD:
+            self._classification_text += text
+            return
+
+        event = self._classification_event()
+        if event is not None:
+            yield event
+
+        if self.ttft_s is None:
+            self.ttft_s = time.perf_counter() - self.start
+        yield {"event": "token", "field": field, "text": text}
+
+    def end(self, state: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        event = self._classification_event()
+        if event is not None:
+            yield event
+        yield {
+            "event": "end",
+            "state": state,
+            "timings": {
+                "ttft_s": self.ttft_s,
+                "total_s": time.perf_counter() - self.start,
+            },
+        }
+
+
+def stream_agent(
+    app: Any,
+    inputs: Dict[str, Any],
+    config: Optional[Dict[str, Any]] = None,
+) -> Iterator[Dict[str, Any]]:
+    """Ejecuta el grafo compilado `app` y va generando eventos (ver arriba)."""
+    builder = _EventBuilder()
+    state: Dict[str, Any] = {}
+
+    for mode, payload in app.stream(inputs, config=config, stream_mode=["messages", "values"]):
+        if mode == "messages":
+            chunk, metadata = payload
+            yield from builder.on_chunk(chunk, metadata)
+        else:
+            state = payload
+
+    yield from builder.end(state)
+
+
+async def astream_agent(
+    app: Any,
+    inputs: Dict[str, Any],
+    config: Optional[Dict[str, Any]] = None,
+) -> AsyncIterator[Dict[str, Any]]:
+    """Versión async de stream_agent, sobre app.astream_events (v2)."""
+    builder = _EventBuilder()
+    state: Dict[str, Any] = {}
+
+    async for event in app.astream_events(inputs, config=config, version="v2"):
+        kind = event["event"]
+        if kind in ("on_chat_model_stream", "on_llm_stream"):
+            for out in builder.on_chunk(event["data"]["chunk"], event.get("metadata")):
+                yield out
+        elif kind == "on_chain_end" and not event.get("parent_ids"):
+            # fin del grafo completo (el evento raíz no tiene padres)
+            state = event["data"].get("output") or {}
+
+    for out in builder.end(state):
+        yield out
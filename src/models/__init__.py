@@ -1,5 +1,15 @@
 """
 Models module - LLM configuration and loading
+
+`from models import get_llm` importa models.llm_config bajo demanda.
 """
 
-from .llm_config import *
+import importlib
+
+
+def __getattr__(name):
+    if not name.startswith("_"):
+        module = importlib.import_module(f"{__name__}.llm_config")
+        if hasattr(module, name):
+            return getattr(module, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
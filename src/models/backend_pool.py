@@ -0,0 +1,417 @@
+# src/models/backend_pool.py
+
+"""
+Pool de servidores Ollama: reparte las llamadas al LLM entre varios hosts.
+
+Un solo Ollama limita el throughput (atiende pocas peticiones en
+paralelo, OLLAMA_NUM_PARALLEL). Con varios hosts (p. ej. una GPU por
+máquina) get_llm devuelve un PooledChatOllama que, en cada llamada:
+
+- elige el host sano con menos peticiones en vuelo (least outstanding
+  requests) que no haya llegado a su tope (`max_in_flight` por host);
+  si todos están llenos espera a que alguno quede libre;
+- usa una requests.Session por host, así que las conexiones HTTP se
+  reutilizan (keep-alive) en vez de abrir una por llamada;
+- si el host falla antes de empezar a responder (conexión rechazada,
+  timeout, 5xx) se reintenta en otro; tras `max_failures` fallos
+  seguidos el host sale de la rotación.
+
+Un hilo de fondo comprueba cada `health_interval_s` los hosts
+(GET /api/version): los que responden vuelven a la rotación.
+
+Para la cadena y el grafo es transparente: PooledChatOllama es un
+ChatOllama más. Se activa con get_llm(..., base_urls=[...]) o con la
+variable de entorno OLLAMA_HOSTS="http://h1:11434,http://h2:11434".
+Se puede probar con varios models/fake_ollama_server.py (ver
+src/bench_backend_pool.py).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import aiohttp
+import requests
+from requests.adapters import HTTPAdapter
+from langchain_community.chat_models import ChatOllama
+from langchain_community.llms.ollama import OllamaEndpointNotFoundError
+from pydantic import PrivateAttr
+
+from tools.metrics import get_metrics
+
+
+DEFAULT_MAX_IN_FLIGHT = 4
+DEFAULT_MAX_FAILURES = 2
+DEFAULT_HEALTH_INTERVAL_S = 10.0
+DEFAULT_ACQUIRE_TIMEOUT_S = 120.0
+HEALTH_TIMEOUT_S = 2.0
+
+
+class NoBackendAvailableError(RuntimeError):
+    """Ningún host sano con hueco libre dentro del tiempo de espera."""
+
+
+class _BackendFailure(Exception):
+    """Fallo del host antes de empezar a responder: se puede reintentar en otro."""
+
+
+def _status_error(base_url: str, status: int, detail: str) -> Exception:
+    """
+    Error para una respuesta != 200. Solo los 5xx son culpa del host
+    (_BackendFailure, con el error original en __cause__); un 404 (modelo
+    no descargado) u otro 4xx es culpa de la petición.
+    """
+    if status == 404:
+        return OllamaEndpointNotFoundError(
+            f"Ollama call failed with status code 404 on {base_url}. "
+            f"Maybe the model is not pulled there. Details: {detail}"
+        )
+    error = ValueError(f"Ollama call failed with status code {status} on {base_url}. Details: {detail}")
+    if status >= 500:
+        failure = _BackendFailure(str(error))
+        failure.__cause__ = error
+        return failure
+    return error
+
+
+class OllamaBackend:
+    """Un host del pool: su sesión HTTP, su tope y sus contadores."""
+
+    def __init__(self, base_url: str, max_in_flight: int = DEFAULT_MAX_IN_FLIGHT):
+        self.base_url = base_url.rstrip("/")
+        self.max_in_flight = max(1, int(max_in_flight))
+        self.in_flight = 0
+        self.served = 0
+        self.failures = 0  # seguidos
+        self.total_failures = 0
+        self.healthy = True
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_in_flight)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    @property
+    def has_capacity(self) -> bool:
+        return self.healthy and self.in_flight < self.max_in_flight
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "base_url": self.base_url,
+            "healthy": self.healthy,
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "served": self.served,
+            "failures": self.total_failures,
+        }
+
+
+class BackendPool:
+    """
+    Reparte peticiones entre varios OllamaBackend (ver docstring del módulo).
+    Thread-safe; acquire/release se pueden usar también desde asyncio a
+    través de asyncio.to_thread.
+    """
+
+    def __init__(
+        self,
+        base_urls: Sequence[str],
+        max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+        max_failures: int = DEFAULT_MAX_FAILURES,
+        health_interval_s: Optional[float] = DEFAULT_HEALTH_INTERVAL_S,
+        acquire_timeout_s: float = DEFAULT_ACQUIRE_TIMEOUT_S,
+    ):
+        if not base_urls:
+            raise ValueError("BackendPool necesita al menos una base_url")
+        self.backends = [OllamaBackend(url, max_in_flight) for url in base_urls]
+        self.max_failures = max(1, int(max_failures))
+        self.acquire_timeout_s = acquire_timeout_s
+
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._health_thread: Optional[threading.Thread] = None
+        if health_interval_s:
+            self._health_thread = threading.Thread(
+                target=self._health_loop, args=(health_interval_s,), name="ollama-health", daemon=True
+            )
+            self._health_thread.start()
+
+    # ---------- reparto ----------
+
+    def acquire(self, exclude: Sequence[OllamaBackend] = ()) -> OllamaBackend:
+        """
+        Reserva el host sano con menos peticiones en vuelo. Espera si todos
+        están en su tope; falla enseguida si no queda ninguno sano.
+        """
+        deadline = time.monotonic() + self.acquire_timeout_s
+        with self._cond:
+            while True:
+                candidates = [b for b in self.backends if b.healthy and b not in exclude]
+                if not candidates:
+                    raise NoBackendAvailableError(
+                        f"No healthy Ollama backend ({len(self.backends)} configured)"
+                    )
+                free = [b for b in candidates if b.in_flight < b.max_in_flight]
+                if free:
+                    # a igual carga, el que menos ha servido (reparto más uniforme)
+                    backend = min(free, key=lambda b: (b.in_flight, b.served))
+                    backend.in_flight += 1
+                    return backend
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise NoBackendAvailableError("Timed out waiting for a free Ollama backend")
+                self._cond.wait(remaining)
+
+    def release(self, backend: OllamaBackend, ok: bool = True) -> None:
+        with self._cond:
+            backend.in_flight -= 1
+            if ok:
+                backend.served += 1
+                backend.failures = 0
+            else:
+                backend.failures += 1
+                backend.total_failures += 1
+                if backend.failures >= self.max_failures:
+                    backend.healthy = False
+            self._cond.notify_all()
+        get_metrics().inc("backend_requests_total", host=backend.base_url, ok=str(ok).lower())
+
+    def stream(
+        self,
+        path: str,
+        payload: Dict[str, Any],
+        headers: Dict[str, str],
+        auth: Any = None,
+        timeout: Optional[int] = None,
+    ) -> Iterator[str]:
+        """
+        POST a `path` en el mejor host y devuelve las líneas de la respuesta
+        (NDJSON de Ollama). Si un host falla antes de responder se prueba
+        con el siguiente; el host queda reservado hasta agotar las líneas.
+        """
+        tried: List[OllamaBackend] = []
+        last_error: Optional[BaseException] = None
+
+        while len(tried) < len(self.backends):
+            try:
+                backend = self.acquire(exclude=tried)
+            except NoBackendAvailableError:
+                if last_error is not None:
+                    raise last_error
+                raise
+            tried.append(backend)
+
+            try:
+                response = self._post(backend, path, payload, headers, auth, timeout)
+            except _BackendFailure as exc:
+                self.release(backend, ok=False)
+                last_error = exc.__cause__ or exc
+                continue
+            except BaseException:
+                self.release(backend, ok=True)  # error de la petición, no del host
+                raise
+
+            # Solo los errores de transporte cuentan como fallo del host; si
+            # quien consume el stream lo abandona (GeneratorExit) el host
+            # respondió bien.
+            ok = True
+            try:
+                yield from response.iter_lines(decode_unicode=True)
+            except requests.RequestException:
+                ok = False
+                raise
+            finally:
+                response.close()
+                self.release(backend, ok=ok)
+            return
+
+        assert last_error is not None
+        raise last_error
+
+    def _post(
+        self,
+        backend: OllamaBackend,
+        path: str,
+        payload: Dict[str, Any],
+        headers: Dict[str, str],
+        auth: Any,
+        timeout: Optional[int],
+    ) -> requests.Response:
+        try:
+            response = backend.session.post(
+                f"{backend.base_url}{path}",
+                headers=headers,
+                auth=auth,
+                json=payload,
+                stream=True,
+                timeout=timeout,
+            )
+        except (requests.ConnectionError, requests.Timeout) as exc:
+            raise _BackendFailure(str(exc)) from exc
+
+        response.encoding = "utf-8"
+        if response.status_code == 200:
+            return response
+        detail = response.text
+        response.close()
+        raise _status_error(backend.base_url, response.status_code, detail)
+
+    # ---------- salud ----------
+
+    def check_health(self) -> None:
+        """Comprueba todos los hosts una vez (lo hace también el hilo de fondo)."""
+        for backend in self.backends:
+            try:
+                resp = backend.session.get(f"{backend.base_url}/api/version", timeout=HEALTH_TIMEOUT_S)
+                alive = resp.status_code == 200
+                resp.close()
+            except requests.RequestException:
+                alive = False
+            with self._cond:
+                if alive and not backend.healthy:
+                    backend.failures = 0
+                backend.healthy = alive
+                self._cond.notify_all()
+
+    def _health_loop(self, interval_s: float) -> None:
+        while not self._stop.wait(interval_s):
+            self.check_health()
+
+    def stats(self) -> List[Dict[str, Any]]:
+        with self._cond:
+            return [b.snapshot() for b in self.backends]
+
+    def close(self) -> None:
+        self._stop.set()
+        for backend in self.backends:
+            backend.session.close()
+
+
+class PooledChatOllama(ChatOllama):
+    """ChatOllama cuyas peticiones van al host que elige un BackendPool."""
+
+    _pool: BackendPool = PrivateAttr()
+
+    def __init__(self, pool: BackendPool, **kwargs: Any):
+        kwargs.setdefault("base_url", pool.backends[0].base_url)
+        super().__init__(**kwargs)
+        self._pool = pool
+
+    @property
+    def pool(self) -> BackendPool:
+        return self._pool
+
+    # ChatOllama no tiene un hook público para cambiar el transporte: se
+    # sobrescriben sus métodos privados _create_stream/_acreate_stream y
+    # _request copia cómo arman la petición. Acoplado a
+    # langchain_community 0.3.x (_OllamaCommon en llms/ollama.py), por eso
+    # requirements.txt fija langchain-community<0.4; al subir de versión,
+    # comparar con _OllamaCommon._create_stream.
+    def _request(self, api_url: str, payload: Any, stop: Optional[List[str]], **kwargs: Any) -> Tuple[str, Dict[str, Any]]:
+        """(ruta de la API, cuerpo de la petición), igual que _OllamaCommon._create_stream."""
+        if self.stop is not None and stop is not None:
+            raise ValueError("`stop` found in both the input and default params.")
+        elif self.stop is not None:
+            stop = self.stop
+
+        params = self._default_params
+        for key in self._default_params:
+            if key in kwargs:
+                params[key] = kwargs[key]
+
+        if "options" in kwargs:
+            params["options"] = kwargs["options"]
+        else:
+            params["options"] = {
+                **params["options"],
+                "stop": stop,
+                **{k: v for k, v in kwargs.items() if k not in self._default_params},
+            }
+
+        if payload.get("messages"):
+            request_payload = {"messages": payload.get("messages", []), **params}
+        else:
+            request_payload = {
+                "prompt": payload.get("prompt"),
+                "images": payload.get("images", []),
+                **params,
+            }
+        return api_url[len(self.base_url):], request_payload
+
+    def _create_stream(
+        self,
+        api_url: str,
+        payload: Any,
+        stop: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> Iterator[str]:
+        path, request_payload = self._request(api_url, payload, stop, **kwargs)
+        headers = {
+            "Content-Type": "application/json",
+            **(self.headers if isinstance(self.headers, dict) else {}),
+        }
+        return self._pool.stream(path, request_payload, headers, auth=self.auth, timeout=self.timeout)
+
+    async def _acreate_stream(
+        self,
+        api_url: str,
+        payload: Any,
+        stop: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[str]:
+        # Solo se elige el host (sin reintento en otro ni keep-alive, una
+        # sesión aiohttp por llamada como ChatOllama). Los errores se
+        # clasifican igual que en BackendPool.stream: solo los de transporte
+        # y los 5xx cuentan como fallo del host; un 4xx, un error al armar
+        # la petición, cerrar el stream o cancelar la tarea no.
+        path, request_payload = self._request(api_url, payload, stop, **kwargs)
+        headers = {
+            "Content-Type": "application/json",
+            **(self.headers if isinstance(self.headers, dict) else {}),
+        }
+        timeout = aiohttp.ClientTimeout(total=self.timeout) if self.timeout else None
+
+        backend = await asyncio.to_thread(self._pool.acquire)
+        ok = True
+        try:
+            async with aiohttp.ClientSession(timeout=timeout) as session:
+                try:
+                    response = await session.post(
+                        f"{backend.base_url}{path}", headers=headers, auth=self.auth, json=request_payload
+                    )
+                except (aiohttp.ClientError, asyncio.TimeoutError):
+                    ok = False
+                    raise
+                async with response:
+                    if response.status != 200:
+                        error = _status_error(backend.base_url, response.status, await response.text())
+                        if isinstance(error, _BackendFailure):
+                            ok = False
+                            raise error.__cause__ from None
+                        raise error
+                    try:
+                        async for line in response.content:
+                            yield line.decode("utf-8")
+                    except (aiohttp.ClientError, asyncio.TimeoutError):
+                        ok = False
+                        raise
+        finally:
+            self._pool.release(backend, ok=ok)
+
+
+_pools: Dict[Tuple[str, ...], BackendPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_backend_pool(base_urls: Sequence[str], **kwargs: Any) -> BackendPool:
+    """Pool compartido por todos los LLMs que usan la misma lista de hosts."""
+    key = tuple(url.rstrip("/") for url in base_urls)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = BackendPool(key, **kwargs)
+            _pools[key] = pool
+        return pool
@@ -0,0 +1,128 @@
+# src/models/fake_llm.py
+
+"""
+LLM simulado para benchmarks (no necesita Ollama).
+
+Responde con una latencia fija (+ jitter opcional) y con salidas "enlatadas":
+un array JSON si el prompt es empaquetado (varios comentarios), JSON de
+sentimiento si el prompt pide el formato JSON, y un texto corto en
+cualquier otro caso (explicación / respuesta).
+"""
+
+from __future__ import annotations
+
+import json
+import random
+import re
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional
+
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.runnables import Runnable, RunnableGenerator, RunnableLambda
+
+
+CANNED_SENTIMENT_JSON = (
+    '{"sentiment": "neutral", "score": 0.75, '
+    '"short_reason": "Simulated response for benchmarking."}'
+)
+CANNED_TEXT = "Simulated text generated for benchmarking purposes."
+
+# Tipos de prompt a los que se puede dar una respuesta propia (canned_response)
+PROMPT_KINDS = ("packed", "sentiment", "text")
+
+_PACKED_ID_RE = re.compile(r'^\[(\d+)\] """', re.MULTILINE)
+_TOKEN_RE = re.compile(r"\S+\s*")
+
+
+def _canned_packed_json(text: str, base: Optional[Dict[str, Any]] = None) -> str:
+    # Solo cuentan los comentarios tras el último "COMMENTS:" (no el ejemplo few-shot)
+    block = text[text.rfind("COMMENTS:") :]
+    ids = [int(m) for m in _PACKED_ID_RE.findall(block)]
+    base = base if base is not None else json.loads(CANNED_SENTIMENT_JSON)
+    return json.dumps([{"id": i, **base} for i in ids])
+
+
+def prompt_kind(text: str) -> str:
+    """Tipo de prompt (ver PROMPT_KINDS): empaquetado, JSON de sentimiento o texto."""
+    if "COMMENTS:" in text:
+        return "packed"
+    if '"short_reason"' in text:
+        return "sentiment"
+    return "text"
+
+
+def canned_response(text: str, responses: Optional[Dict[str, Any]] = None) -> str:
+    """
+    Salida enlatada según el tipo de prompt (empaquetado, JSON o texto).
+
+    `responses` sustituye la de algún tipo (claves de PROMPT_KINDS): un str
+    se devuelve tal cual y cualquier otro valor como JSON. En "packed" un
+    dict es la respuesta de cada comentario (se le añade su "id").
+    """
+    kind = prompt_kind(text)
+    if responses and kind in responses:
+        custom = responses[kind]
+        if kind == "packed" and isinstance(custom, dict):
+            return _canned_packed_json(text, base=custom)
+        return custom if isinstance(custom, str) else json.dumps(custom)
+    if kind == "packed":
+        return _canned_packed_json(text)
+    if kind == "sentiment":
+        return CANNED_SENTIMENT_JSON
+    return CANNED_TEXT
+
+
+def split_tokens(text: str) -> List[str]:
+    """Trocea una respuesta en "tokens" (palabra + espacios) para simular streaming."""
+    return _TOKEN_RE.findall(text) or [""]
+
+
+class SimulatedLLM:
+    """
+    Sustituto del ChatOllama con latencia configurable.
+
+    Se usa como `llm` en build_sentiment_agent_chain(..., llm=...).
+    Cuenta cuántas llamadas recibe (atributo `calls`, thread-safe).
+
+    Con token_latency_s > 0 la respuesta se emite palabra a palabra
+    (`.stream()` da varios trozos): latency_s es entonces el tiempo hasta
+    el primer token y token_latency_s el tiempo entre tokens.
+    """
+
+    def __init__(
+        self,
+        latency_s: float = 0.2,
+        jitter_s: float = 0.0,
+        seed: int = 0,
+        token_latency_s: float = 0.0,
+    ):
+        self.latency_s = latency_s
+        self.jitter_s = jitter_s
+        self.token_latency_s = token_latency_s
+        self.calls = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _respond(self, prompt: Any) -> AIMessage:
+        with self._lock:
+            self.calls += 1
+            delay = self.latency_s + self._rng.uniform(0.0, self.jitter_s)
+
+        time.sleep(max(0.0, delay))
+
+        text = prompt.to_string() if hasattr(prompt, "to_string") else str(prompt)
+        return AIMessage(content=canned_response(text))
+
+    def _stream_respond(self, prompts: Iterator[Any]) -> Iterator[AIMessageChunk]:
+        for prompt in prompts:
+            message = self._respond(prompt)
+            for i, token in enumerate(split_tokens(str(message.content))):
+                if i:
+                    time.sleep(self.token_latency_s)
+                yield AIMessageChunk(content=token)
+
+    def as_runnable(self) -> Runnable:
+        if self.token_latency_s > 0:
+            return RunnableGenerator(self._stream_respond)
+        return RunnableLambda(self._respond)
@@ -0,0 +1,299 @@
+# src/models/fake_ollama_server.py
+
+"""
+Servidor HTTP que imita la API de Ollama, para medir sin un modelo real.
+
+A diferencia de SimulatedLLM (models/fake_llm.py), que sustituye al
+runnable, aquí el ChatOllama de verdad hace sus peticiones HTTP: se mide
+todo el camino (cliente, serialización, streaming NDJSON, parseo).
+
+- POST /api/chat y /api/generate: respuestas enlatadas (canned_response),
+  en streaming (una línea JSON por token) o no, con la misma forma que
+  Ollama, incluidos prompt_eval_count / eval_count / *_duration.
+  `responses` (o --responses con un fichero JSON) cambia la respuesta
+  de cada tipo de prompt ("packed", "sentiment", "text"), p. ej. para
+  simular otra etiqueta o un JSON mal formado.
+- GET /api/tags, /api/version y /: para comprobar que está vivo.
+
+Latencia: `prompt_latency_s` antes del primer token (+ jitter aleatorio
+hasta `jitter_s`) y `token_latency_s` entre tokens. Con `error_rate` una
+fracción de las peticiones responde 500. `max_parallel` limita cuántas
+generaciones atiende a la vez (como OLLAMA_NUM_PARALLEL); el resto espera.
+
+Uso en código:
+    with FakeOllamaServer(token_latency_s=0.005) as server:
+        llm = get_llm("A", use_cache=False, base_url=server.base_url)
+
+Desde la línea de comandos (desde src/):
+    python -m models.fake_ollama_server --port 11435 --token-latency 0.01
+    python -m models.fake_ollama_server --responses responses.json
+
+    responses.json: {"sentiment": {"sentiment": "negative", "score": 0.9,
+                     "short_reason": "..."}, "text": "Otra respuesta."}
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import json
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from models.fake_llm import PROMPT_KINDS, canned_response, split_tokens
+
+
+DEFAULT_MODEL = "gemma3:1b"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: "_Server"
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format: str, *args: Any) -> None:  # silencioso
+        pass
+
+    # ---------- utilidades ----------
+
+    def _send_json(self, status: int, payload: Dict[str, Any]) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self) -> Dict[str, Any]:
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b"{}"
+        return json.loads(raw or b"{}")
+
+    # ---------- rutas ----------
+
+    def do_GET(self) -> None:
+        path = self.path.rstrip("/")
+        if path == "":
+            body = b"Ollama is running"
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        elif path == "/api/tags":
+            self._send_json(200, {"models": [{"name": self.server.fake.model}]})
+        elif path == "/api/version":
+            self._send_json(200, {"version": "fake"})
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self) -> None:
+        path = self.path.rstrip("/")
+        if path not in ("/api/chat", "/api/generate"):
+            self._send_json(404, {"error": "not found"})
+            return
+
+        payload = self._read_json()
+        fake = self.server.fake
+
+        if path == "/api/chat":
+            prompt = "\n".join(str(m.get("content", "")) for m in payload.get("messages", []))
+        else:
+            prompt = str(payload.get("prompt", ""))
+
+        with fake._slots:
+            self._generate(path, payload, prompt)
+
+    def _generate(self, path: str, payload: Dict[str, Any], prompt: str) -> None:
+        fake = self.server.fake
+        delay, fail = fake._start_request()
+        time.sleep(delay)
+        if fail:
+            self._send_json(500, {"error": "injected failure (fake Ollama server)"})
+            return
+
+        tokens = split_tokens(canned_response(prompt, fake.responses))
+        chat = path == "/api/chat"
+        model = payload.get("model") or fake.model
+
+        def _chunk(text: str, done: bool) -> Dict[str, Any]:
+            chunk: Dict[str, Any] = {"model": model, "created_at": "", "done": done}
+            if chat:
+                chunk["message"] = {"role": "assistant", "content": text}
+            else:
+                chunk["response"] = text
+            if done:
+                chunk.update(
+                    {
+                        "done_reason": "stop",
+                        "total_duration": int((delay + fake.token_latency_s * len(tokens)) * 1e9),
+                        "load_duration": 0,
+                        "prompt_eval_count": max(1, len(prompt) // 4),
+                        "prompt_eval_duration": int(delay * 1e9),
+                        "eval_count": len(tokens),
+                        "eval_duration": int(fake.token_latency_s * len(tokens) * 1e9),
+                    }
+                )
+            return chunk
+
+        if payload.get("stream") is False:
+            time.sleep(fake.token_latency_s * max(0, len(tokens) - 1))
+            self._send_json(200, _chunk("".join(tokens), done=True))
+            return
+
+        # Streaming NDJSON (lo que hace Ollama por defecto)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def _write_line(obj: Dict[str, Any]) -> None:
+            data = (json.dumps(obj) + "\n").encode("utf-8")
+            self.wfile.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+            self.wfile.flush()
+
+        for i, token in enumerate(tokens):
+            if i:
+                time.sleep(fake.token_latency_s)
+            _write_line(_chunk(token, done=False))
+        _write_line(_chunk("", done=True))
+        self.wfile.write(b"0\r\n\r\n")
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    fake: "FakeOllamaServer"
+
+    def handle_error(self, request: Any, client_address: Any) -> None:
+        # un cliente que corta el stream (o cancela) no es un error del servidor
+        if isinstance(sys.exc_info()[1], ConnectionError):
+            return
+        super().handle_error(request, client_address)
+
+
+class FakeOllamaServer:
+    """
+    Servidor Ollama falso en un hilo. `calls` y `errors` cuentan las
+    peticiones de generación recibidas (thread-safe). `responses` mapea
+    tipo de prompt (PROMPT_KINDS) a la respuesta, texto o JSON (ver
+    canned_response); los tipos que no aparecen usan la enlatada.
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        prompt_latency_s: float = 0.02,
+        token_latency_s: float = 0.002,
+        jitter_s: float = 0.0,
+        error_rate: float = 0.0,
+        seed: int = 0,
+        model: str = DEFAULT_MODEL,
+        max_parallel: Optional[int] = None,
+        responses: Optional[Dict[str, Any]] = None,
+    ):
+        unknown = set(responses or {}) - set(PROMPT_KINDS)
+        if unknown:
+            raise ValueError(f"Unknown prompt kinds in responses: {sorted(unknown)} (use {list(PROMPT_KINDS)})")
+        self.responses = dict(responses or {})
+        self.prompt_latency_s = prompt_latency_s
+        self.token_latency_s = token_latency_s
+        self.jitter_s = jitter_s
+        self.error_rate = error_rate
+        self.model = model
+
+        self.calls = 0
+        self.errors = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._slots: Any = (
+            threading.BoundedSemaphore(max_parallel) if max_parallel else contextlib.nullcontext()
+        )
+
+        self._httpd = _Server((host, port), _Handler)
+        self._httpd.fake = self
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _start_request(self) -> tuple:
+        """(retardo hasta el primer token, si hay que fallar) de una petición."""
+        with self._lock:
+            self.calls += 1
+            delay = self.prompt_latency_s + self._rng.uniform(0.0, self.jitter_s)
+            fail = self._rng.random() < self.error_rate
+            if fail:
+                self.errors += 1
+        return max(0.0, delay), fail
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"calls": self.calls, "errors": self.errors}
+
+    def start(self) -> "FakeOllamaServer":
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._httpd.serve_forever, name="fake-ollama", daemon=True
+            )
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        self._thread = None
+
+    def __enter__(self) -> "FakeOllamaServer":
+        return self.start()
+
+    def __exit__(self, *exc: Any) -> None:
+        self.stop()
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Servidor Ollama falso (respuestas enlatadas).")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--prompt-latency", type=float, default=0.02, help="segundos hasta el primer token")
+    parser.add_argument("--token-latency", type=float, default=0.002, help="segundos entre tokens")
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--max-parallel", type=int, default=None, help="generaciones a la vez")
+    parser.add_argument(
+        "--responses",
+        type=Path,
+        default=None,
+        help=f"JSON {{tipo de prompt: respuesta}}, tipos: {', '.join(PROMPT_KINDS)}",
+    )
+    args = parser.parse_args(argv)
+
+    responses = json.loads(args.responses.read_text(encoding="utf-8")) if args.responses else None
+
+    server = FakeOllamaServer(
+        host=args.host,
+        port=args.port,
+        prompt_latency_s=args.prompt_latency,
+        token_latency_s=args.token_latency,
+        jitter_s=args.jitter,
+        error_rate=args.error_rate,
+        max_parallel=args.max_parallel,
+        responses=responses,
+    )
+    print(f"Fake Ollama listening on {server.base_url} (Ctrl-C to stop)")
+    try:
+        server._httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server._httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+# src/models/llm_cache.py
+
+"""
+Caché persistente (SQLite) de respuestas del LLM.
+
+Se conecta al ChatOllama a través del mecanismo estándar de LangChain
+(`cache=` en el modelo), así que la clave ya incluye:
+  - el prompt renderizado (template + USER_TEXT, etc.)
+  - el "llm_string" de LangChain: nombre del modelo + parámetros de sampling
+
+Guardamos un hash SHA-256 de ambos como clave.
+Soporta expiración por TTL, un máximo de entradas (se expulsan las menos
+usadas recientemente) y contadores de hits/misses.
+
+Para que cada escritura y cada hit sean O(1):
+- la expulsión (TTL + exceso sobre max_entries) se hace cada
+  `evict_every` escrituras, no en todas: la tabla puede pasarse de
+  max_entries como mucho en ese número de filas;
+- los hits no escriben: last_access se guarda en memoria y se vuelca en
+  bloque con la siguiente escritura, antes de expulsar, o cada
+  ACCESS_FLUSH_EVERY hits.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from langchain_core.caches import RETURN_VAL_TYPE, BaseCache
+from langchain_core.load import dumps, loads
+
+from tools.metrics import mark_cache_hit, note_cache_lookup
+
+
+BASE_DIR = Path(__file__).resolve().parents[2]  # carpeta raíz del proyecto
+DEFAULT_CACHE_PATH = BASE_DIR / ".cache" / "llm_cache.sqlite"
+
+DEFAULT_TTL_S = 7 * 24 * 3600  # una semana
+DEFAULT_MAX_ENTRIES = 50_000
+DEFAULT_EVICT_EVERY = 256
+ACCESS_FLUSH_EVERY = 256
+
+
+def make_cache_key(prompt: str, llm_string: str) -> str:
+    h = hashlib.sha256()
+    h.update(llm_string.encode("utf-8"))
+    h.update(b"\x00")
+    h.update(prompt.encode("utf-8"))
+    return h.hexdigest()
+
+
+class SQLiteResponseCache(BaseCache):
+    """
+    Caché de LangChain respaldada por un fichero SQLite.
+
+    ttl_s=None desactiva la expiración; max_entries=None desactiva el límite.
+    Es thread-safe (el batch concurrente comparte una sola instancia).
+    """
+
+    def __init__(
+        self,
+        path: Path | str = DEFAULT_CACHE_PATH,
+        ttl_s: Optional[float] = DEFAULT_TTL_S,
+        max_entries: Optional[int] = DEFAULT_MAX_ENTRIES,
+        evict_every: int = DEFAULT_EVICT_EVERY,
+    ):
+        self.path = Path(path)
+        self.ttl_s = ttl_s
+        self.max_entries = max_entries
+        self.evict_every = max(1, int(evict_every))
+
+        self.hits = 0
+        self.misses = 0
+
+        self._writes_since_evict = 0
+        self._pending_access: Dict[str, float] = {}  # key -> last_access sin volcar
+
+        self._lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS llm_cache (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_llm_cache_access ON llm_cache(last_access)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_llm_cache_created ON llm_cache(created_at)"
+        )
+        self._conn.commit()
+
+    # ---------- Interfaz BaseCache ----------
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        key = make_cache_key(prompt, llm_string)
+        now = time.time()
+
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created_at FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+
+            if row is not None and self.ttl_s is not None and now - row[1] > self.ttl_s:
+                self._pending_access.pop(key, None)
+                self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                self._conn.commit()
+                row = None
+
+            if row is None:
+                self.misses += 1
+                note_cache_lookup(hit=False)
+                return None
+
+            self._pending_access[key] = now
+            if len(self._pending_access) >= ACCESS_FLUSH_EVERY:
+                self._flush_access()
+                self._conn.commit()
+            self.hits += 1
+
+        note_cache_lookup(hit=True)
+        return mark_cache_hit(loads(row[0]))
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        key = make_cache_key(prompt, llm_string)
+        value = dumps(list(return_val))
+        now = time.time()
+
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, created_at, last_access) "
+                "VALUES (?, ?, ?, ?)",
+                (key, value, now, now),
+            )
+            self._pending_access.pop(key, None)
+            self._flush_access()
+            self._writes_since_evict += 1
+            if self._writes_since_evict >= self.evict_every:
+                self._evict(now)
+            self._conn.commit()
+
+    def clear(self, **kwargs: Any) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_cache")
+            self._conn.commit()
+            self._pending_access.clear()
+            self.hits = 0
+            self.misses = 0
+
+    # ---------- Expulsión y métricas ----------
+
+    def _flush_access(self) -> None:
+        """Escribe los last_access pendientes (sin commit: lo hace quien llama)."""
+        if self._pending_access:
+            self._conn.executemany(
+                "UPDATE llm_cache SET last_access = ? WHERE key = ?",
+                [(t, k) for k, t in self._pending_access.items()],
+            )
+            self._pending_access.clear()
+
+    def _evict(self, now: float) -> None:
+        """Borra entradas caducadas y, si sobran, las menos usadas recientemente."""
+        self._writes_since_evict = 0
+        self._flush_access()
+        if self.ttl_s is not None:
+            self._conn.execute(
+                "DELETE FROM llm_cache WHERE created_at < ?", (now - self.ttl_s,)
+            )
+
+        if self.max_entries is not None:
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()
+            excess = count - self.max_entries
+            if excess > 0:
+                self._conn.execute(
+                    "DELETE FROM llm_cache WHERE key IN ("
+                    "SELECT key FROM llm_cache ORDER BY last_access ASC LIMIT ?)",
+                    (excess,),
+                )
+
+    def flush(self) -> None:
+        """Vuelca los last_access pendientes y expulsa lo que sobre."""
+        with self._lock:
+            self._evict(time.time())
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            (entries,) = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "entries": entries,
+            }
+
+
+_response_cache: Optional[SQLiteResponseCache] = None
+_response_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> SQLiteResponseCache:
+    """Devuelve la caché compartida del proceso (se crea la primera vez)."""
+    global _response_cache
+    with _response_cache_lock:
+        if _response_cache is None:
+            _response_cache = SQLiteResponseCache()
+        return _response_cache
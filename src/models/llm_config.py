@@ -1,19 +1,94 @@
-from langchain_community.chat_models import ChatOllama
+import os
+from typing import List, Optional, Sequence, Union
+
+from tools.metrics import get_llm_callback
+
+# langchain_community (ChatOllama), el pool y la caché se importan dentro de
+# get_llm: su coste se paga en la primera llamada, no al importar el módulo.
+
+# Configs cuyas respuestas se cachean por defecto.
+# Config B es "creativa": ahí la variedad del sampling es lo que buscamos,
+# así que no reutilizamos respuestas.
+CACHED_CONFIGS = {"A"}
+
+# Cuánto tiempo mantiene Ollama el modelo cargado tras la última petición.
+# Si el modelo se descarga se pierde también la caché KV del prefijo de los
+# prompts (mensaje de sistema + few-shot), así que se deja cargado un rato
+# largo. -1 = indefinidamente, 0 = descargar al terminar.
+DEFAULT_KEEP_ALIVE = "30m"
+
+# Varios servidores Ollama separados por comas (ver models/backend_pool.py)
+OLLAMA_HOSTS_ENV = "OLLAMA_HOSTS"
+
+
+def ollama_hosts_from_env() -> List[str]:
+    raw = os.environ.get(OLLAMA_HOSTS_ENV, "")
+    return [url.strip() for url in raw.split(",") if url.strip()]
+
+
+def get_llm(
+    config: str = "A",
+    use_cache: Optional[bool] = None,
+    keep_alive: Optional[Union[int, str]] = DEFAULT_KEEP_ALIVE,
+    base_url: Optional[str] = None,
+    base_urls: Optional[Sequence[str]] = None,
+):
+    """
+    Devuelve el ChatOllama para la config indicada.
+
+    use_cache=None usa el valor por defecto de la config (ver CACHED_CONFIGS);
+    True/False lo fuerza. La caché es persistente (models/llm_cache.py).
+    keep_alive se pasa tal cual a Ollama ("30m", 3600, -1...); None usa el
+    valor del servidor (5 minutos por defecto).
+    base_url apunta a otro servidor Ollama (p. ej. el falso de
+    models/fake_ollama_server.py); None usa el de ChatOllama (localhost:11434).
+    base_urls (o la variable OLLAMA_HOSTS) reparte las llamadas entre
+    varios servidores: devuelve un PooledChatOllama sobre el BackendPool
+    compartido de esos hosts (models/backend_pool.py).
+    """
+    from langchain_community.chat_models import ChatOllama
+
+    if use_cache is None:
+        use_cache = config in CACHED_CONFIGS
+    cache = False
+    if use_cache:
+        from models.llm_cache import get_response_cache
+
+        cache = get_response_cache()
+    extra = {"base_url": base_url} if base_url else {}
+
+    llm_cls = ChatOllama
+    if base_urls is None and not base_url:
+        base_urls = ollama_hosts_from_env()
+    if base_urls:
+        from models.backend_pool import PooledChatOllama, get_backend_pool
+
+        llm_cls = PooledChatOllama
+        extra = {"pool": get_backend_pool(base_urls)}
+    # tiempos y tokens de cada llamada (tools/metrics.py)
+    callbacks = [get_llm_callback()]
 
-def get_llm(config: str = "A"):
     if config == "A":
-        return ChatOllama(
+        return llm_cls(
             model="gemma3:1b",
             temperature=0.1,
             top_p=0.8,
             top_k=30,
+            keep_alive=keep_alive,
+            cache=cache,
+            callbacks=callbacks,
+            **extra,
         )
     elif config == "B":
-        return ChatOllama(
+        return llm_cls(
             model="gemma3:1b",
             temperature=0.7,
             top_p=0.95,
             top_k=50,
+            keep_alive=keep_alive,
+            cache=cache,
+            callbacks=callbacks,
+            **extra,
         )
     else:
         raise ValueError(f"Unknown config: {config}")
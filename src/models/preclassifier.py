@@ -0,0 +1,266 @@
+# src/models/preclassifier.py
+
+"""
+Pre-clasificador local (TF-IDF + regresión logística) para la cascada.
+
+Va delante del LLM: si su probabilidad máxima supera `threshold`,
+responde él directamente (sin llamada al LLM); si no, el texto se
+"escala" al prompt de sentimiento normal.
+
+Se entrena con data/examples_raw.json + las etiquetas reales de los
+logs de evaluación (logs/eval_*.json) y se exporta con joblib.
+Ver src/run_train_preclassifier.py.
+"""
+
+from __future__ import annotations
+
+import json
+import threading
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+# sklearn, joblib y numpy se importan al entrenar o cargar el modelo: sin
+# modelo exportado (o sin cascade) no se importan nunca.
+if TYPE_CHECKING:
+    from sklearn.pipeline import Pipeline
+
+
+BASE_DIR = Path(__file__).resolve().parents[2]  # carpeta raíz del proyecto
+DATA_PATH = BASE_DIR / "data" / "examples_raw.json"
+LOGS_DIR = BASE_DIR / "logs"
+DEFAULT_MODEL_PATH = BASE_DIR / "artifacts" / "preclassifier.joblib"
+
+DEFAULT_THRESHOLD = 0.85
+
+
+class PreClassifier:
+    """
+    Envoltorio del pipeline de sklearn con umbral de confianza y contadores.
+
+    predict(texts) trabaja sobre el batch completo (una sola llamada a
+    predict_proba) y devuelve, por texto, un dict {sentiment, score,
+    short_reason} o None si hay que escalar al LLM.
+    """
+
+    def __init__(self, pipeline: Pipeline, threshold: float = DEFAULT_THRESHOLD):
+        self.pipeline = pipeline
+        self.threshold = threshold
+
+        self.n_seen = 0
+        self.n_short_circuited = 0
+        self._lock = threading.Lock()
+
+    @property
+    def labels(self) -> List[str]:
+        return [str(c) for c in self.pipeline.classes_]
+
+    def predict(self, texts: Sequence[str]) -> List[Optional[Dict[str, Any]]]:
+        out = self.classify(texts)
+        with self._lock:
+            self.n_seen += len(out)
+            self.n_short_circuited += sum(1 for r in out if r is not None)
+        return out
+
+    def classify(self, texts: Sequence[str]) -> List[Optional[Dict[str, Any]]]:
+        """Como predict, pero sin tocar los contadores (para evaluar)."""
+        if not texts:
+            return []
+
+        import numpy as np
+
+        proba = self.pipeline.predict_proba(list(texts))
+        best = proba.argmax(axis=1)
+        conf = proba[np.arange(len(texts)), best]
+        confident = conf >= self.threshold
+
+        labels = self.labels
+        out: List[Optional[Dict[str, Any]]] = []
+        for label_idx, c, ok in zip(best, conf, confident):
+            if not ok:
+                out.append(None)
+                continue
+            out.append(
+                {
+                    "sentiment": labels[label_idx],
+                    "score": float(c),
+                    "short_reason": (
+                        f"Classified by the local TF-IDF model (confidence {c:.2f})."
+                    ),
+                }
+            )
+        return out
+
+    def batch_classifier(
+        self,
+        fallback: Optional[Callable[[Sequence[str]], List[Any]]] = None,
+    ) -> Callable[[Sequence[str]], List[Any]]:
+        """
+        Devuelve un `classifier` para run_batch: clasifica en local los
+        textos seguros y deja los demás a `fallback` (p. ej. el clasificador
+        empaquetado) o, si no hay fallback, a la cadena (None).
+        """
+
+        def classify(texts: Sequence[str]) -> List[Any]:
+            results: List[Any] = self.predict(texts)
+            escalated = [i for i, r in enumerate(results) if r is None]
+            if fallback is not None and escalated:
+                for i, r in zip(escalated, fallback([texts[i] for i in escalated])):
+                    results[i] = r
+            return results
+
+        return classify
+
+    def stats(self) -> Dict[str, Any]:
+        """Contadores de predict en este proceso (tasa de escalado real)."""
+        with self._lock:
+            escalated = self.n_seen - self.n_short_circuited
+            return {
+                "seen": self.n_seen,
+                "short_circuited": self.n_short_circuited,
+                "escalated": escalated,
+                "escalation_rate": escalated / self.n_seen if self.n_seen else 0.0,
+            }
+
+    # ---------- Persistencia ----------
+
+    def save(self, path: Path | str = DEFAULT_MODEL_PATH) -> Path:
+        import joblib
+
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        joblib.dump({"pipeline": self.pipeline, "threshold": self.threshold}, path)
+        return path
+
+    @classmethod
+    def load(cls, path: Path | str = DEFAULT_MODEL_PATH) -> "PreClassifier":
+        import joblib
+
+        payload = joblib.load(Path(path))
+        return cls(payload["pipeline"], threshold=payload["threshold"])
+
+
+# ---------- Entrenamiento ----------
+
+def load_training_data(
+    data_path: Path = DATA_PATH,
+    logs_dir: Path = LOGS_DIR,
+) -> Tuple[List[str], List[str]]:
+    """
+    Junta textos etiquetados del dataset y de los logs de evaluación.
+    Solo se usan etiquetas reales (label / true_label), sin duplicados.
+    """
+    pairs: Dict[str, str] = {}
+
+    for ex in json.loads(data_path.read_text(encoding="utf-8")):
+        pairs[ex["text"]] = ex["label"]
+
+    for log_path in sorted(logs_dir.glob("eval_*.json")):
+        try:
+            payload = json.loads(log_path.read_text(encoding="utf-8"))
+        except (OSError, json.JSONDecodeError):
+            continue
+        for r in payload.get("results", []):
+            text = r.get("user_text") or r.get("text")
+            label = str(r.get("true_label", "")).lower().strip()
+            if text and label:
+                pairs[text] = label
+
+    texts = list(pairs)
+    return texts, [pairs[t] for t in texts]
+
+
+def train_preclassifier(
+    texts: Sequence[str],
+    labels: Sequence[str],
+    threshold: float = DEFAULT_THRESHOLD,
+) -> PreClassifier:
+    """
+    Entrena TF-IDF (n-gramas de caracteres, funciona igual en español e
+    inglés) + regresión logística.
+    """
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.pipeline import Pipeline
+
+    pipeline = Pipeline(
+        [
+            (
+                "tfidf",
+                TfidfVectorizer(
+                    analyzer="char_wb",
+                    ngram_range=(2, 5),
+                    lowercase=True,
+                    sublinear_tf=True,
+                ),
+            ),
+            ("clf", LogisticRegression(max_iter=1000, class_weight="balanced")),
+        ]
+    )
+    pipeline.fit(list(texts), list(labels))
+    return PreClassifier(pipeline, threshold=threshold)
+
+
+def cross_validate_against_llm(
+    train_texts: Sequence[str],
+    train_labels: Sequence[str],
+    llm_texts: Sequence[str],
+    llm_labels: Sequence[str],
+    threshold: float = DEFAULT_THRESHOLD,
+    folds: int = 5,
+) -> Dict[str, Any]:
+    """
+    Compara el pre-clasificador con las predicciones del LLM: tasa de
+    escalado y acuerdo con el LLM de los textos que NO se escalarían.
+
+    Validación cruzada: los textos con predicción del LLM se reparten en
+    `folds` grupos y cada grupo se evalúa con un modelo entrenado sin esos
+    textos (aunque estén en train_texts), para no medir lo memorizado.
+    """
+    llm_by_text = dict(zip(llm_texts, llm_labels))
+    ordered = sorted(llm_by_text)
+    folds = max(2, min(folds, len(ordered)))
+
+    total = short = agree = 0
+    for fold in range(folds):
+        held_out = set(ordered[fold::folds])
+        train = [(t, l) for t, l in zip(train_texts, train_labels) if t not in held_out]
+        if len({l for _, l in train}) < 2:
+            continue  # no se puede entrenar con una sola clase
+        pre = train_preclassifier([t for t, _ in train], [l for _, l in train], threshold=threshold)
+        texts = sorted(held_out)
+        for text, pred in zip(texts, pre.classify(texts)):
+            total += 1
+            if pred is not None:
+                short += 1
+                agree += pred["sentiment"] == str(llm_by_text[text]).lower().strip()
+
+    return {
+        "total": total,
+        "folds": folds,
+        "short_circuited": short,
+        "escalation_rate": (total - short) / total if total else 0.0,
+        "short_circuit_agreement_with_llm": agree / short if short else 0.0,
+    }
+
+
+_preclassifier: Optional[PreClassifier] = None
+_preclassifier_lock = threading.Lock()
+
+
+def get_preclassifier(path: Path | str = DEFAULT_MODEL_PATH) -> Optional[PreClassifier]:
+    """
+    Carga (una sola vez) el pre-clasificador exportado.
+    Devuelve None si todavía no se ha entrenado.
+    """
+    global _preclassifier
+    with _preclassifier_lock:
+        if _preclassifier is None and Path(path).exists():
+            _preclassifier = PreClassifier.load(path)
+        return _preclassifier
+
+
+def preclassifier_stats() -> Optional[Dict[str, Any]]:
+    """stats() del pre-clasificador si ya está cargado (no lo carga)."""
+    with _preclassifier_lock:
+        pre = _preclassifier
+    return pre.stats() if pre is not None else None
@@ -0,0 +1,179 @@
+# src/models/semantic_cache.py
+
+"""
+Caché semántica de resultados con Chroma.
+
+Muchos comentarios son casi iguales ("package arrived late" / "my package
+came late"). Aquí guardamos cada análisis completo (sentiment, score,
+short_reason, explanation, suggested_reply) en una colección persistente
+de Chroma, indexado por el embedding del texto. Si un texto nuevo está
+por encima de `threshold` de similitud coseno con uno ya analizado, se
+reutiliza ese resultado sin llamar al LLM.
+
+Los embeddings se calculan en local y en CPU con la función por defecto
+de Chroma (all-MiniLM-L6-v2 vía ONNX).
+"""
+
+from __future__ import annotations
+
+import hashlib
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+
+BASE_DIR = Path(__file__).resolve().parents[2]  # carpeta raíz del proyecto
+DEFAULT_CHROMA_PATH = BASE_DIR / ".cache" / "chroma"
+
+DEFAULT_SIMILARITY_THRESHOLD = 0.92
+UPSERT_CHUNK_SIZE = 256
+
+CACHED_FIELDS = ("sentiment", "score", "short_reason", "explanation", "suggested_reply")
+
+
+def _doc_id(text: str) -> str:
+    normalized = " ".join(text.lower().split())
+    return hashlib.sha1(normalized.encode("utf-8")).hexdigest()
+
+
+class SemanticCache:
+    """
+    Caché semántica sobre una colección de Chroma (una por config).
+
+    lookup_many / add_many trabajan por lotes: una sola consulta de Chroma
+    para todo el batch y upserts en bloques de UPSERT_CHUNK_SIZE.
+    """
+
+    def __init__(
+        self,
+        config: str = "A",
+        path: Path | str = DEFAULT_CHROMA_PATH,
+        threshold: float = DEFAULT_SIMILARITY_THRESHOLD,
+        embedding_function: Optional[Any] = None,
+    ):
+        self.config = config
+        self.threshold = threshold
+
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        # chromadb (y el modelo de embeddings) solo al crear la caché
+        import chromadb
+        from chromadb.utils import embedding_functions
+
+        if embedding_function is None:
+            embedding_function = embedding_functions.DefaultEmbeddingFunction()
+
+        self._client = chromadb.PersistentClient(path=str(path))
+        self._collection = self._client.get_or_create_collection(
+            name=f"sentiment_results_{config}",
+            embedding_function=embedding_function,
+            metadata={"hnsw:space": "cosine"},
+        )
+
+    # ---------- Consulta ----------
+
+    def lookup_many(self, texts: Sequence[str]) -> List[Optional[Dict[str, Any]]]:
+        """
+        Devuelve, por texto, el resultado guardado más parecido si su
+        similitud >= threshold, o None.
+        """
+        if not texts:
+            return []
+
+        found: List[Optional[Dict[str, Any]]] = [None] * len(texts)
+
+        if self._collection.count() > 0:
+            res = self._collection.query(
+                query_texts=list(texts),
+                n_results=1,
+                include=["metadatas", "distances"],
+            )
+            for i, (metas, dists) in enumerate(zip(res["metadatas"], res["distances"])):
+                if not metas:
+                    continue
+                similarity = 1.0 - float(dists[0])
+                if similarity >= self.threshold:
+                    meta = metas[0]
+                    found[i] = {k: meta[k] for k in CACHED_FIELDS if k in meta}
+
+        n_hits = sum(1 for f in found if f is not None)
+        with self._lock:
+            self.hits += n_hits
+            self.misses += len(texts) - n_hits
+
+        return found
+
+    def lookup(self, text: str) -> Optional[Dict[str, Any]]:
+        return self.lookup_many([text])[0]
+
+    # ---------- Inserción ----------
+
+    def add_many(self, texts: Sequence[str], results: Sequence[Dict[str, Any]]) -> int:
+        """
+        Guarda los resultados completos (sin error ni campos pendientes).
+        Devuelve cuántos se insertaron.
+        """
+        ids: List[str] = []
+        docs: List[str] = []
+        metas: List[Dict[str, Any]] = []
+        seen = set()
+
+        for text, result in zip(texts, results):
+            if result.get("error") or result.get("deferred"):
+                continue
+            if any(result.get(k) is None for k in CACHED_FIELDS):
+                continue
+            doc_id = _doc_id(text)
+            if doc_id in seen:
+                continue
+            seen.add(doc_id)
+            ids.append(doc_id)
+            docs.append(text)
+            metas.append({k: result[k] for k in CACHED_FIELDS})
+
+        for start in range(0, len(ids), UPSERT_CHUNK_SIZE):
+            end = start + UPSERT_CHUNK_SIZE
+            self._collection.upsert(
+                ids=ids[start:end],
+                documents=docs[start:end],
+                metadatas=metas[start:end],
+            )
+
+        return len(ids)
+
+    def add(self, text: str, result: Dict[str, Any]) -> int:
+        return self.add_many([text], [result])
+
+    # ---------- Métricas ----------
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "entries": self._collection.count(),
+                "threshold": self.threshold,
+            }
+
+
+_semantic_caches: Dict[str, SemanticCache] = {}
+_semantic_caches_lock = threading.Lock()
+
+
+def get_semantic_cache(config: str = "A", threshold: Optional[float] = None) -> SemanticCache:
+    """
+    Devuelve la caché semántica compartida de `config` (se crea la primera vez).
+    Si se pasa `threshold`, actualiza el umbral de similitud.
+    """
+    with _semantic_caches_lock:
+        cache = _semantic_caches.get(config)
+        if cache is None:
+            cache = SemanticCache(config=config)
+            _semantic_caches[config] = cache
+        if threshold is not None:
+            cache.threshold = threshold
+        return cache
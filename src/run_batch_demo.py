@@ -3,41 +3,47 @@
 import json
 from pathlib import Path
 
-from chains.sentiment_chain import build_sentiment_agent_chain
+from chains.registry import get_sentiment_chain
+from chains.batch_runner import DEFAULT_MAX_CONCURRENCY, run_batch
 from tools.stats_tools import compute_sentiment_stats, compute_accuracy_with_labels
 
 
 def main():
     # Usamos la config A (más determinista) para este demo
-    chain = build_sentiment_agent_chain(config="A")
+    chain = get_sentiment_chain(config="A")
 
     base_dir = Path(__file__).resolve().parents[1]
     data_path = base_dir / "data" / "examples_raw.json"
 
     examples = json.loads(data_path.read_text(encoding="utf-8"))
 
+    # Analizamos todo el dataset de una vez, con varias llamadas en paralelo
+    outputs = run_batch(
+        chain,
+        [ex["text"] for ex in examples],
+        max_concurrency=DEFAULT_MAX_CONCURRENCY,
+    )
+
     results = []
 
-    for ex in examples:
+    for ex, out in zip(examples, outputs):
         print("=" * 80)
         print(f"ID: {ex['id']} | true label: {ex['label']}")
         print(f"TEXT: {ex['text']}\n")
 
-        out = chain.invoke({"user_text": ex["text"]})
-
         # copiar la salida y añadir la etiqueta real
         result = {
             "id": ex["id"],
-            "text": ex["text"],
             "true_label": ex["label"],
-            "sentiment": out["sentiment"],
-            "score": out["score"],
-            "short_reason": out["short_reason"],
-            "explanation": out["explanation"],
-            "suggested_reply": out["suggested_reply"],
+            **out,
         }
         results.append(result)
 
+        if result.get("error"):
+            print("ERROR:", result["error"])
+            print()
+            continue
+
         print("Predicted sentiment:", result["sentiment"])
         print("Score:", result["score"])
         print("Short reason:", result["short_reason"])
@@ -2,11 +2,108 @@
 
 from __future__ import annotations
 
+import argparse
+from typing import Any, Dict, Set
+
 from graph.graph_builder import build_agent_graph
+from graph.streaming import stream_agent
+from tools.metrics import configure_metrics
+
+
+SECTION_TITLES = {
+    "explanation": "🧠 Explanation",
+    "suggested_reply": "✉️ Suggested reply",
+}
+
+
+def render_stream(events) -> Dict[str, Any]:
+    """
+    Pinta los eventos de stream_agent a medida que llegan y devuelve el
+    evento "end". La explicación y la respuesta se generan a la vez (en
+    paralelo) y las dos se escriben token a token, cada una bajo su
+    cabecera: si los tokens se alternan, se repite la cabecera de la
+    sección que sigue ("cont."). Si no llega ningún token (modo batch,
+    caché), se pinta final_output.
+    """
+    header_printed = False
+    current_field = None
+    streamed: Set[str] = set()
+    end: Dict[str, Any] = {}
+
+    def _header(sentiment=None, score=None) -> None:
+        nonlocal header_printed
+        if header_printed:
+            return
+        header_printed = True
+        print("\nAgent>")
+        if sentiment is not None:
+            print(f"🔍 Sentiment: {sentiment} (score={score:.2f})")
+
+    def _section(field: str) -> None:
+        nonlocal current_field
+        if field == current_field:
+            return
+        title = SECTION_TITLES.get(field, field)
+        suffix = " (cont.)" if field in streamed else ""
+        separator = "\n\n" if current_field is not None else "\n"
+        print(f"{separator}{title}{suffix}:", flush=True)
+        current_field = field
+        streamed.add(field)
+
+    for event in events:
+        if event["event"] == "classification":
+            _header(event["sentiment"], event["score"])
+        elif event["event"] == "token":
+            _header()
+            _section(event["field"])
+            print(event["text"], end="", flush=True)
+        elif event["event"] == "end":
+            end = event
+
+    state = end.get("state", {})
+    if not header_printed:
+        print("\nAgent>\n" + state.get("final_output", ""))
+        return end
+
+    # secciones que no llegaron en streaming (p. ej. respuesta de caché)
+    for field in SECTION_TITLES:
+        if field not in streamed and state.get(field):
+            _section(field)
+            print(state[field], end="")
+    print()
+
+    timings = end.get("timings", {})
+    if timings.get("ttft_s") is not None:
+        print(f"\n(first token after {timings['ttft_s']:.2f}s, total {timings['total_s']:.2f}s)")
+    return end
 
 
 def main():
-    app = build_agent_graph()
+    parser = argparse.ArgumentParser(description="Sentiment & Feedback Agent (CLI)")
+    parser.add_argument(
+        "--persist",
+        action="store_true",
+        help="guarda la sesión en disco (SQLite) para recuperarla tras reiniciar",
+    )
+    parser.add_argument(
+        "--no-stream",
+        action="store_true",
+        help="espera a la respuesta completa en vez de mostrarla token a token",
+    )
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        default=None,
+        help="sirve métricas de Prometheus en http://localhost:<puerto>/metrics",
+    )
+    parser.add_argument("--metrics-jsonl", default=None, help="escribe cada medida en este JSONL")
+    args = parser.parse_args()
+
+    for sink in configure_metrics(jsonl_path=args.metrics_jsonl, prometheus_port=args.metrics_port):
+        if hasattr(sink, "url"):
+            print(f"Prometheus metrics at {sink.url}")
+
+    app = build_agent_graph(checkpointer="sqlite" if args.persist else "memory")
 
     print("=" * 80)
     print(" Sentiment & Feedback Agent (CLI)")
@@ -34,11 +131,14 @@ def main():
             print("Bye!")
             break
 
+        run_config = {"configurable": {"thread_id": thread_id}}
+
+        if not args.no_stream:
+            render_stream(stream_agent(app, {"user_input": user_input}, config=run_config))
+            continue
+
         # Invocamos el grafo
-        state = app.invoke(
-            {"user_input": user_input},
-            config={"configurable": {"thread_id": thread_id}},
-        )
+        state = app.invoke({"user_input": user_input}, config=run_config)
 
         final_output = state.get("final_output", "")
         print("\nAgent>\n" + final_output)
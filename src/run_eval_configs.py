@@ -2,43 +2,94 @@
 
 from __future__ import annotations
 
+import argparse
 import json
 from datetime import datetime
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional
 
-from chains.sentiment_chain import build_sentiment_agent_chain
-from tools.stats_tools import compute_sentiment_stats, compute_accuracy_with_labels
+from chains.registry import get_sentiment_chain, get_shared_llm
+from chains.batch_runner import DEFAULT_MAX_CONCURRENCY, run_batch
+from tools.checkpoint import JobCheckpoint
+from tools.metrics import configure_metrics, summarize_result_timings
+from tools.stats_tools import (
+    compute_accuracy_with_labels,
+    compute_classification_metrics,
+    compute_sentiment_stats,
+    results_to_columns,
+)
 
 
 BASE_DIR = Path(__file__).resolve().parents[1]
 DATA_PATH = BASE_DIR / "data" / "examples_raw.json"
 LOGS_DIR = BASE_DIR / "logs"
 LOGS_DIR.mkdir(exist_ok=True)
+CHECKPOINTS_DIR = LOGS_DIR / "checkpoints"
 
 
-def run_eval_for_config(config_name: str) -> Dict[str, Any]:
-    """Ejecuta el agente sobre el dataset para una config dada (A o B)."""
+def _response_cache(config_name: str) -> Optional[Any]:
+    """Caché de respuestas del LLM de la config, o None si no cachea (p. ej. B)."""
+    cache = getattr(get_shared_llm(config_name), "cache", None)
+    return cache if hasattr(cache, "stats") else None
+
+
+def _cache_delta(before: Dict[str, Any], after: Dict[str, Any]) -> Dict[str, Any]:
+    """Hits/misses de esta ejecución (la caché es compartida por el proceso)."""
+    hits = after["hits"] - before["hits"]
+    misses = after["misses"] - before["misses"]
+    total = hits + misses
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": hits / total if total else 0.0,
+        "entries": after["entries"],
+    }
+
+
+def run_eval_for_config(
+    config_name: str,
+    resume: bool = False,
+    timings: bool = False,
+) -> Dict[str, Any]:
+    """
+    Ejecuta el agente sobre el dataset para una config dada (A o B).
+
+    Cada ejemplo terminado se guarda al momento en
+    logs/checkpoints/eval_<config>.jsonl. Con resume=True se saltan los
+    ids que ya están ahí y sus resultados se mezclan en el resumen final
+    (si la config ya se completó entera, no se repite ninguna llamada).
+    Los ejemplos que fallaron no se guardan, así que se reintentan.
+    Sin resume, el checkpoint de la config se borra al empezar.
+    Con timings=True cada resultado guarda sus "timings" (segundos por
+    etapa y tokens de Ollama) y el resumen lleva la media por etapa.
+    "llm_cache" son los hits/misses de esta ejecución, o None si la config
+    no usa la caché de respuestas.
+    """
 
     print("\n" + "=" * 80)
     print(f"EVALUATING CONFIG {config_name}")
     print("=" * 80)
 
-    chain = build_sentiment_agent_chain(config=config_name)
+    chain = get_sentiment_chain(config=config_name)
     examples = json.loads(DATA_PATH.read_text(encoding="utf-8"))
 
-    results: List[Dict[str, Any]] = []
+    checkpoint = JobCheckpoint(CHECKPOINTS_DIR / f"eval_{config_name}.jsonl")
+    if not resume:
+        checkpoint.reset()
+    done = checkpoint.load()
+    if done:
+        print(f"Resuming: {len(done)} examples already completed, skipping them.")
 
-    for ex in examples:
-        user_text = ex["text"]
-        true_label = ex["label"]
+    pending = [ex for ex in examples if str(ex["id"]) not in done]
 
-        out = chain.invoke({"user_text": user_text})
+    cache = _response_cache(config_name)
+    cache_before = cache.stats() if cache is not None else None
 
+    def _to_result(ex: Dict[str, Any], out: Dict[str, Any]) -> Dict[str, Any]:
         result = {
             "id": ex["id"],
-            "user_text": user_text,
-            "true_label": true_label,
+            "user_text": ex["text"],
+            "true_label": ex["label"],
             "sentiment": out["sentiment"],
             "score": out["score"],
             "short_reason": out["short_reason"],
@@ -46,18 +97,55 @@ def run_eval_for_config(config_name: str) -> Dict[str, Any]:
             "suggested_reply": out["suggested_reply"],
             "config": config_name,
         }
-        results.append(result)
+        if out.get("error"):
+            result["error"] = out["error"]
+        if out.get("timings"):
+            result["timings"] = out["timings"]
+        return result
+
+    new_results: Dict[str, Dict[str, Any]] = {}
+
+    def _on_result(idx: int, out: Dict[str, Any]) -> None:
+        result = _to_result(pending[idx], out)
+        new_results[str(result["id"])] = result
+        if not result.get("error"):
+            checkpoint.append(result)
+
+    run_batch(
+        chain,
+        [ex["text"] for ex in pending],
+        max_concurrency=DEFAULT_MAX_CONCURRENCY,
+        on_result=_on_result,
+        timings=timings,
+    )
+
+    # Resultados en el orden del dataset: los del checkpoint + los nuevos
+    results: List[Dict[str, Any]] = []
+    for ex in examples:
+        key = str(ex["id"])
+        result = new_results.get(key) or done.get(key)
+        if result is not None:
+            results.append(result)
 
     # Estadísticas y accuracy
     stats = compute_sentiment_stats(results)
     acc = compute_accuracy_with_labels(results, true_label_key="true_label")
+    metrics = compute_classification_metrics(
+        *results_to_columns(results, true_label_key="true_label")
+    )
 
     summary = {
         "config": config_name,
         "stats": stats,
         "accuracy": acc,
+        "metrics": metrics,
         "n_examples": len(results),
+        "n_errors": sum(1 for r in results if r.get("error")),
+        "n_resumed": len(done),
+        "llm_cache": _cache_delta(cache_before, cache.stats()) if cache is not None else None,
     }
+    if timings:
+        summary["timings"] = summarize_result_timings(results)
 
     # Guardar log a disco
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -74,16 +162,50 @@ def run_eval_for_config(config_name: str) -> Dict[str, Any]:
     print(f"\nSaved log for config {config_name} in: {log_path}")
     print("\nSummary:")
     print(f"- Total examples: {summary['n_examples']}")
+    print(f"- Errors: {summary['n_errors']}")
     print(f"- Accuracy: {summary['accuracy']['accuracy']:.2f}")
+    if metrics["total"]:
+        print(f"- Macro F1: {metrics['macro']['f1']:.2f}")
+        print(f"- Calibration ECE: {metrics['calibration']['ece']:.3f}")
     print("- Distribution:", summary["stats"]["distribution"])
+    cache_stats = summary["llm_cache"]
+    if cache_stats is None:
+        print("- LLM cache: not used by this config")
+    else:
+        print(
+            f"- LLM cache: {cache_stats['hits']} hits / {cache_stats['misses']} misses "
+            f"(hit rate {cache_stats['hit_rate']:.2f})"
+        )
+    if timings:
+        print("- Mean seconds per stage:")
+        for stage, t in summary["timings"]["stages"].items():
+            print(f"    {stage:<22} {t['mean_s']:.3f}s (max {t['max_s']:.3f}s)")
 
     return summary
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Compara las configs A y B sobre el dataset.")
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="continúa un eval interrumpido, saltando los ejemplos ya completados",
+    )
+    parser.add_argument("--configs", nargs="+", default=["A", "B"], choices=["A", "B"])
+    parser.add_argument(
+        "--timings",
+        action="store_true",
+        help="guarda en el log los tiempos por etapa y tokens de cada ejemplo",
+    )
+    parser.add_argument("--metrics-jsonl", default=None, help="escribe cada medida en este JSONL")
+    args = parser.parse_args()
+
+    if args.metrics_jsonl:
+        configure_metrics(jsonl_path=args.metrics_jsonl)
+
     summaries = {}
-    for cfg in ["A", "B"]:
-        summaries[cfg] = run_eval_for_config(cfg)
+    for cfg in args.configs:
+        summaries[cfg] = run_eval_for_config(cfg, resume=args.resume, timings=args.timings)
 
     print("\n" + "#" * 80)
     print("COMPARISON A vs B")
@@ -94,6 +216,8 @@ def main():
         dist = s["stats"]["distribution"]
         print(f"\nConfig {cfg}:")
         print(f"  - Accuracy: {acc:.2f}")
+        if s["metrics"]["total"]:
+            print(f"  - Macro F1: {s['metrics']['macro']['f1']:.2f}")
         print(f"  - Distribution: {dist}")
 
 
@@ -0,0 +1,102 @@
+# src/run_rescore_eval_logs.py
+
+"""
+Re-puntúa los logs de evaluación guardados (logs/eval_*.json) sin llamar
+al LLM: matriz de confusión, precision/recall/F1 por clase, medias macro
+y ponderada y calibración del score (ECE).
+
+Todos los logs de una misma config se juntan en un solo cálculo
+vectorizado (compute_classification_metrics).
+
+Uso:
+    python src/run_rescore_eval_logs.py
+    python src/run_rescore_eval_logs.py --logs-dir logs --bins 10
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Dict, List
+
+from tools.stats_tools import (
+    DEFAULT_CALIBRATION_BINS,
+    compute_classification_metrics,
+    results_to_columns,
+)
+
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+LOGS_DIR = BASE_DIR / "logs"
+
+
+def load_results_by_config(logs_dir: Path) -> Dict[str, List[Dict[str, Any]]]:
+    by_config: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+    for log_path in sorted(logs_dir.glob("eval_*.json")):
+        try:
+            payload = json.loads(log_path.read_text(encoding="utf-8"))
+        except (OSError, json.JSONDecodeError):
+            continue
+        config = payload.get("config", "?")
+        by_config[config].extend(payload.get("results", []))
+    return by_config
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--logs-dir", default=str(LOGS_DIR))
+    parser.add_argument("--bins", type=int, default=DEFAULT_CALIBRATION_BINS)
+    args = parser.parse_args()
+
+    by_config = load_results_by_config(Path(args.logs_dir))
+    if not by_config:
+        print(f"No eval logs found in {args.logs_dir}.")
+        return
+
+    for config, results in sorted(by_config.items()):
+        t0 = time.perf_counter()
+        metrics = compute_classification_metrics(
+            *results_to_columns(results, true_label_key="true_label"),
+            n_bins=args.bins,
+        )
+        elapsed = time.perf_counter() - t0
+
+        print("\n" + "=" * 80)
+        print(f"CONFIG {config}: {metrics['total']} labelled results ({elapsed:.2f}s)")
+        print("=" * 80)
+        if not metrics["total"]:
+            continue
+
+        print(f"Accuracy: {metrics['accuracy']:.3f}")
+        print("\nConfusion matrix (rows = true, cols = predicted):")
+        classes = metrics["classes"]
+        width = max(len(c) for c in classes) + 2
+        print(" " * width + "".join(c.rjust(width) for c in classes))
+        for label, row in zip(classes, metrics["confusion_matrix"]):
+            print(label.ljust(width) + "".join(str(v).rjust(width) for v in row))
+
+        print("\nPer class:")
+        for label, m in metrics["per_class"].items():
+            print(
+                f"  {label:<10} P={m['precision']:.3f} R={m['recall']:.3f} "
+                f"F1={m['f1']:.3f} (n={m['support']})"
+            )
+        for avg in ("macro", "weighted"):
+            m = metrics[avg]
+            print(f"  {avg:<10} P={m['precision']:.3f} R={m['recall']:.3f} F1={m['f1']:.3f}")
+
+        calibration = metrics["calibration"]
+        print(f"\nCalibration ECE: {calibration['ece']:.3f}")
+        for b in calibration["bins"]:
+            if b["count"]:
+                print(
+                    f"  [{b['lower']:.1f}, {b['upper']:.1f}) n={b['count']:<6} "
+                    f"acc={b['accuracy']:.2f} conf={b['confidence']:.2f}"
+                )
+
+
+if __name__ == "__main__":
+    main()
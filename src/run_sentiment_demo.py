@@ -3,12 +3,12 @@
 import json
 from pathlib import Path
 
-from chains.sentiment_chain import build_sentiment_agent_chain
+from chains.registry import get_sentiment_chain
 
 
 def main():
     # Construimos la cadena con la config A (más determinista)
-    chain = build_sentiment_agent_chain(config="A")
+    chain = get_sentiment_chain(config="A")
 
     base_dir = Path(__file__).resolve().parents[1]
     data_path = base_dir / "data" / "examples_raw.json"
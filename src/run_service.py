@@ -0,0 +1,357 @@
+# src/run_service.py
+
+"""
+Servicio HTTP (asyncio + aiohttp) del agente de sentimiento.
+
+Endpoints (JSON):
+  POST /v1/analyze            {"text": "..."}            -> resultado
+  POST /v1/analyze/batch      {"texts": ["...", ...]}    -> {"results": [...]}
+  POST /v1/sessions/{id}      {"text": "..."}            -> turno del grafo (memoria por sesión)
+  GET  /v1/sessions/{id}                                 -> estadísticas de la sesión
+  GET  /v1/stats                                         -> coalescer, límites y cascada
+  GET  /metrics                                          -> Prometheus (tools/metrics.py)
+  GET  /health
+
+- Las peticiones de un comentario pasan por el coalescer
+  (chains/coalescer.py): las que llegan en la misma ventana de
+  --batch-window-ms se analizan juntas con run_batch (y con el
+  clasificador empaquetado si --pack-size > 1).
+- Backpressure: la cola del coalescer y los batches/turnos en curso están
+  acotados; al llenarse se responde 429 con Retry-After en vez de encolar.
+- Al arrancar se construyen cadenas y grafo y se hace una llamada al LLM
+  sin caché (carga el modelo en Ollama) antes de aceptar peticiones.
+
+Uso:
+    python src/run_service.py --port 8080
+    curl -X POST localhost:8080/v1/analyze -d '{"text": "Muy buen servicio"}'
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional, Sequence
+
+from aiohttp import web
+
+from chains.batch_runner import DEFAULT_MAX_CONCURRENCY, run_batch
+from chains.coalescer import (
+    DEFAULT_MAX_BATCH_SIZE,
+    DEFAULT_MAX_QUEUE,
+    DEFAULT_MAX_WAIT_MS,
+    CoalescerClosed,
+    MicroBatcher,
+    QueueFull,
+)
+from chains.registry import get_packed_classifier, get_sentiment_chain, get_shared_llm
+from chains.single_flight import get_single_flight
+from graph.graph_builder import build_agent_graph
+from models.preclassifier import preclassifier_stats
+from tools.metrics import get_metrics
+
+
+logger = logging.getLogger("sentiment_service")
+
+DEFAULT_MAX_BATCH_TEXTS = 500
+DEFAULT_MAX_INFLIGHT_REQUESTS = 8
+RETRY_AFTER_S = 1
+WARMUP_TEXT = "Warmup request: the product works fine."
+
+
+class _Limiter:
+    """Contador de peticiones en curso; try_acquire no espera (429 si está lleno)."""
+
+    def __init__(self, limit: int):
+        self.limit = max(1, int(limit))
+        self.in_flight = 0
+        self.rejected = 0
+
+    def try_acquire(self) -> bool:
+        if self.in_flight >= self.limit:
+            self.rejected += 1
+            return False
+        self.in_flight += 1
+        return True
+
+    def release(self) -> None:
+        self.in_flight -= 1
+
+    def stats(self) -> Dict[str, int]:
+        return {"in_flight": self.in_flight, "limit": self.limit, "rejected": self.rejected}
+
+
+class _SessionLock:
+    """Lock de una sesión y cuántas peticiones lo usan o esperan por él."""
+
+    __slots__ = ("lock", "users")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.users = 0
+
+
+class SentimentService:
+    """Estado del servicio: cadena, grafo, coalescer y límites."""
+
+    def __init__(
+        self,
+        config: str = "A",
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+        pack_size: int = 0,
+        batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+        batch_window_ms: float = DEFAULT_MAX_WAIT_MS,
+        max_queue: int = DEFAULT_MAX_QUEUE,
+        max_inflight_requests: int = DEFAULT_MAX_INFLIGHT_REQUESTS,
+        max_batch_texts: int = DEFAULT_MAX_BATCH_TEXTS,
+        checkpointer: str = "memory",
+        warmup: bool = True,
+    ):
+        self.config = config
+        self.max_concurrency = max_concurrency
+        self.pack_size = pack_size
+        self.max_batch_texts = max_batch_texts
+        self.checkpointer = checkpointer
+        self.warmup_enabled = warmup
+        self.warm = False
+
+        self.batcher = MicroBatcher(
+            self.process_batch,
+            max_batch_size=batch_size,
+            max_wait_ms=batch_window_ms,
+            max_queue=max_queue,
+        )
+        self.limiter = _Limiter(max_inflight_requests)
+        self.graph: Any = None
+        # solo sesiones con turnos en curso: se borran al quedar libres
+        self._session_locks: Dict[str, _SessionLock] = {}
+
+    # ---------- análisis (síncrono, en hilos) ----------
+
+    def process_batch(self, texts: Sequence[str]) -> List[Dict[str, Any]]:
+        classifier = None
+        if self.pack_size > 1:
+            classifier = get_packed_classifier(config=self.config, pack_size=self.pack_size)
+        return run_batch(
+            get_sentiment_chain(config=self.config),
+            texts,
+            max_concurrency=self.max_concurrency,
+            classifier=classifier,
+        )
+
+    def _warmup(self) -> None:
+        self.graph = build_agent_graph(checkpointer=self.checkpointer)
+        if self.pack_size > 1:
+            get_packed_classifier(config=self.config, pack_size=self.pack_size)
+        get_sentiment_chain(config=self.config)
+        if self.warmup_enabled:
+            # Llamada directa al LLM sin caché de respuestas: con la config A
+            # la cadena respondería desde la caché SQLite a partir del segundo
+            # arranque y Ollama no llegaría a cargar el modelo.
+            llm = get_shared_llm(self.config).model_copy(update={"cache": False})
+            llm.invoke(WARMUP_TEXT)
+        self.warm = True
+
+    # ---------- ciclo de vida ----------
+
+    async def on_startup(self, app: web.Application) -> None:
+        try:
+            await asyncio.to_thread(self._warmup)
+            logger.info("Warmup done")
+        except Exception as exc:
+            # Sin Ollama el servicio arranca igual; /health lo indica
+            logger.warning("Warmup failed: %s", exc)
+            if self.graph is None:
+                self.graph = build_agent_graph(checkpointer=self.checkpointer)
+        self.batcher.start()
+
+    async def on_cleanup(self, app: web.Application) -> None:
+        await self.batcher.stop()
+
+    # ---------- handlers ----------
+
+    async def health(self, request: web.Request) -> web.Response:
+        return web.json_response({"status": "ok", "warm": self.warm})
+
+    async def stats(self, request: web.Request) -> web.Response:
+        return web.json_response(
+            {
+                "coalescer": self.batcher.stats(),
+                "requests": self.limiter.stats(),
+                "single_flight": get_single_flight().stats(),
+                # tasa de escalado real de la cascada (None si no se ha usado)
+                "preclassifier": preclassifier_stats(),
+            }
+        )
+
+    async def metrics(self, request: web.Request) -> web.Response:
+        return web.Response(
+            text=get_metrics().render_prometheus(), content_type="text/plain", charset="utf-8"
+        )
+
+    async def analyze(self, request: web.Request) -> web.Response:
+        body = await _read_json(request)
+        text = body.get("text")
+        if not isinstance(text, str) or not text.strip():
+            return _error(400, "'text' must be a non-empty string")
+        try:
+            result = await self.batcher.submit(text)
+        except QueueFull as exc:
+            return _overloaded(str(exc))
+        except CoalescerClosed as exc:
+            return _error(503, str(exc))
+        return web.json_response(result)
+
+    async def analyze_batch(self, request: web.Request) -> web.Response:
+        body = await _read_json(request)
+        texts = body.get("texts")
+        if not isinstance(texts, list) or not texts or not all(isinstance(t, str) for t in texts):
+            return _error(400, "'texts' must be a non-empty list of strings")
+        if len(texts) > self.max_batch_texts:
+            return _error(413, f"at most {self.max_batch_texts} texts per request")
+        if not self.limiter.try_acquire():
+            return _overloaded("too many requests in flight")
+        try:
+            results = await asyncio.to_thread(self.process_batch, texts)
+        finally:
+            self.limiter.release()
+        return web.json_response({"results": results})
+
+    async def session_turn(self, request: web.Request) -> web.Response:
+        session_id = request.match_info["session_id"]
+        body = await _read_json(request)
+        text = body.get("text")
+        if not isinstance(text, str) or not text.strip():
+            return _error(400, "'text' must be a non-empty string")
+        if not self.limiter.try_acquire():
+            return _overloaded("too many requests in flight")
+        try:
+            # turnos de una misma sesión en orden (mismo thread_id del grafo)
+            entry = self._session_locks.get(session_id)
+            if entry is None:
+                entry = self._session_locks[session_id] = _SessionLock()
+            entry.users += 1
+            try:
+                async with entry.lock:
+                    state = await asyncio.to_thread(
+                        self.graph.invoke,
+                        {"user_input": text},
+                        {"configurable": {"thread_id": session_id}},
+                    )
+            finally:
+                entry.users -= 1
+                if entry.users == 0:
+                    del self._session_locks[session_id]
+        finally:
+            self.limiter.release()
+
+        # resultados de este turno (los últimos de la lista acumulada)
+        n_new = len(state.get("texts") or []) if state.get("route") == "batch" else 1
+        return web.json_response(
+            {
+                "session_id": session_id,
+                "route": state.get("route"),
+                "final_output": state.get("final_output", ""),
+                "results": state.get("results", [])[-n_new:],
+                "stats": state.get("stats", {}),
+            }
+        )
+
+    async def session_info(self, request: web.Request) -> web.Response:
+        session_id = request.match_info["session_id"]
+        snapshot = await asyncio.to_thread(
+            self.graph.get_state, {"configurable": {"thread_id": session_id}}
+        )
+        values = snapshot.values or {}
+        if not values:
+            return _error(404, f"unknown session '{session_id}'")
+        return web.json_response(
+            {
+                "session_id": session_id,
+                "n_results": values.get("results_total", len(values.get("results", []))),
+                "stats": values.get("stats", {}),
+            }
+        )
+
+    def build_app(self) -> web.Application:
+        app = web.Application()
+        app.on_startup.append(self.on_startup)
+        app.on_cleanup.append(self.on_cleanup)
+        app.add_routes(
+            [
+                web.get("/health", self.health),
+                web.get("/metrics", self.metrics),
+                web.get("/v1/stats", self.stats),
+                web.post("/v1/analyze", self.analyze),
+                web.post("/v1/analyze/batch", self.analyze_batch),
+                web.post("/v1/sessions/{session_id}", self.session_turn),
+                web.get("/v1/sessions/{session_id}", self.session_info),
+            ]
+        )
+        return app
+
+
+async def _read_json(request: web.Request) -> Dict[str, Any]:
+    try:
+        body = await request.json()
+    except Exception:
+        raise web.HTTPBadRequest(
+            text='{"error": "invalid JSON body"}', content_type="application/json"
+        )
+    if not isinstance(body, dict):
+        raise web.HTTPBadRequest(
+            text='{"error": "JSON body must be an object"}', content_type="application/json"
+        )
+    return body
+
+
+def _error(status: int, message: str) -> web.Response:
+    return web.json_response({"error": message}, status=status)
+
+
+def _overloaded(message: str) -> web.Response:
+    return web.json_response(
+        {"error": f"overloaded: {message}"},
+        status=429,
+        headers={"Retry-After": str(RETRY_AFTER_S)},
+    )
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Servicio HTTP del agente de sentimiento.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--config", default="A", choices=["A", "B"])
+    parser.add_argument("--max-concurrency", type=int, default=DEFAULT_MAX_CONCURRENCY)
+    parser.add_argument("--pack-size", type=int, default=0, help="> 1: clasificación empaquetada")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_MAX_BATCH_SIZE, help="máximo por micro-batch")
+    parser.add_argument("--batch-window-ms", type=float, default=DEFAULT_MAX_WAIT_MS)
+    parser.add_argument("--max-queue", type=int, default=DEFAULT_MAX_QUEUE, help="comentarios en cola antes de 429")
+    parser.add_argument(
+        "--max-inflight",
+        type=int,
+        default=DEFAULT_MAX_INFLIGHT_REQUESTS,
+        help="batches / turnos de sesión a la vez antes de 429",
+    )
+    parser.add_argument("--persist", action="store_true", help="sesiones en SQLite en vez de en memoria")
+    parser.add_argument("--no-warmup", action="store_true")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    service = SentimentService(
+        config=args.config,
+        max_concurrency=args.max_concurrency,
+        pack_size=args.pack_size,
+        batch_size=args.batch_size,
+        batch_window_ms=args.batch_window_ms,
+        max_queue=args.max_queue,
+        max_inflight_requests=args.max_inflight,
+        checkpointer="sqlite" if args.persist else "memory",
+        warmup=not args.no_warmup,
+    )
+    web.run_app(service.build_app(), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+# src/run_stream_batch.py
+
+"""
+Batch en streaming: lee JSONL/CSV (fichero o stdin), analiza cada
+comentario con concurrencia acotada y escribe cada resultado como una
+línea JSONL en cuanto termina.
+
+La memoria no crece con el tamaño de la entrada: no se guarda la lista
+de resultados, solo agregados (counts, errores, accuracy si hay etiqueta).
+
+El fichero de salida hace de checkpoint (cada línea se fuerza a disco):
+con --resume se saltan los ids que ya tienen un resultado sin error y
+se suman al resumen final; los que fallaron se reintentan. Antes de
+añadir, la salida se limpia (JobCheckpoint.compact): fuera la última
+línea a medio escribir, los registros con error y los ids repetidos. Los
+ids completados se guardan en disco (DoneIds), no en memoria.
+
+Ejemplos:
+    python src/run_stream_batch.py data/comments.jsonl -o logs/results.jsonl
+    python src/run_stream_batch.py data/comments.jsonl -o logs/results.jsonl --resume
+    cat comments.csv | python src/run_stream_batch.py - --format csv > results.jsonl
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+from collections import Counter
+
+from chains.batch_runner import DEFAULT_MAX_CONCURRENCY, stream_batch
+from chains.registry import get_sentiment_chain
+from tools.checkpoint import DoneIds, JobCheckpoint
+from tools.stream_io import detect_format, iter_records, open_input, open_output, write_jsonl
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("input", help="fichero .jsonl/.csv, o '-' para stdin")
+    parser.add_argument("-o", "--output", default="-", help="fichero JSONL de salida ('-' = stdout)")
+    parser.add_argument("--format", choices=["jsonl", "csv"], default=None)
+    parser.add_argument("--config", default="A", choices=["A", "B"])
+    parser.add_argument("--max-concurrency", type=int, default=DEFAULT_MAX_CONCURRENCY)
+    parser.add_argument("--text-key", default="text")
+    parser.add_argument("--label-key", default="label")
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="reanuda sobre --output, saltando los ids ya completados",
+    )
+    args = parser.parse_args()
+
+    if args.resume and args.output == "-":
+        parser.error("--resume necesita un fichero de salida (-o)")
+
+    chain = get_sentiment_chain(config=args.config)
+    fmt = detect_format(args.input, args.format)
+
+    # Agregados en curso (tamaño constante)
+    total = 0
+    errors = 0
+    counts: Counter = Counter()
+    labeled = 0
+    matched = 0
+
+    def _aggregate(result, true_label):
+        nonlocal errors, labeled, matched
+        if result.get("error"):
+            errors += 1
+            return
+        if result["sentiment"]:
+            counts[result["sentiment"]] += 1
+        if true_label:
+            labeled += 1
+            matched += int(result["sentiment"] == true_label)
+
+    def _replay(prev):
+        nonlocal total
+        total += 1
+        _aggregate(prev, prev.get("true_label", ""))
+
+    with DoneIds() as done_ids, open_input(args.input) as fin:
+        # Reanudar: los ids ya completados salen del propio fichero de salida
+        if args.resume:
+            dropped = JobCheckpoint(args.output).compact(done_ids, on_record=_replay)
+            print(
+                f"Resuming: {len(done_ids)} records already completed"
+                f" ({dropped} failed or duplicated records removed).",
+                file=sys.stderr,
+            )
+
+        records = iter_records(fin, fmt)
+        if args.resume:
+            records = (r for r in records if r["id"] not in done_ids)
+
+        with open_output(args.output, append=args.resume) as fout:
+            for record, result in stream_batch(
+                chain,
+                records,
+                max_concurrency=args.max_concurrency,
+                text_key=args.text_key,
+            ):
+                out = {"id": record["id"], **result, "config": args.config}
+
+                true_label = str(record.get(args.label_key) or "").lower().strip()
+                if true_label:
+                    out["true_label"] = true_label
+
+                write_jsonl(fout, out, durable=args.output != "-")
+
+                total += 1
+                _aggregate(result, true_label)
+
+                if total % 100 == 0:
+                    print(f"... {total} processed", file=sys.stderr)
+
+    n_ok = sum(counts.values())
+    print("\nSummary:", file=sys.stderr)
+    print(f"- Total processed: {total}", file=sys.stderr)
+    print(f"- Errors: {errors}", file=sys.stderr)
+    print(f"- Counts: {dict(counts)}", file=sys.stderr)
+    if n_ok:
+        dist = {label: round(c / n_ok, 3) for label, c in counts.items()}
+        print(f"- Distribution: {dist}", file=sys.stderr)
+    if labeled:
+        print(f"- Accuracy: {matched / labeled:.2f} ({matched}/{labeled})", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
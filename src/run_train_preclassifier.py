@@ -0,0 +1,79 @@
+# src/run_train_preclassifier.py
+
+"""
+Entrena y exporta el pre-clasificador local (TF-IDF + regresión logística).
+
+Datos: data/examples_raw.json + etiquetas reales de logs/eval_*.json.
+Si hay logs de evaluación, compara el pre-clasificador con las
+predicciones del LLM guardadas en ellos (sin llamar al LLM). Esos textos
+también se usan para entrenar, así que la comparación se hace con
+validación cruzada (--folds): cada texto se evalúa con un modelo que no
+lo ha visto.
+
+Uso:
+    python src/run_train_preclassifier.py --threshold 0.85
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+from collections import Counter
+
+from models.preclassifier import (
+    DEFAULT_MODEL_PATH,
+    DEFAULT_THRESHOLD,
+    LOGS_DIR,
+    cross_validate_against_llm,
+    load_training_data,
+    train_preclassifier,
+)
+
+
+def load_llm_predictions():
+    """(texto, sentimiento predicho por el LLM) de los logs de evaluación."""
+    pairs = {}
+    for log_path in sorted(LOGS_DIR.glob("eval_*.json")):
+        try:
+            payload = json.loads(log_path.read_text(encoding="utf-8"))
+        except (OSError, json.JSONDecodeError):
+            continue
+        for r in payload.get("results", []):
+            text = r.get("user_text") or r.get("text")
+            if text and r.get("sentiment"):
+                pairs[text] = r["sentiment"]
+    return list(pairs), list(pairs.values())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    parser.add_argument("--output", default=str(DEFAULT_MODEL_PATH))
+    parser.add_argument("--folds", type=int, default=5, help="validación cruzada de la comparación con el LLM")
+    args = parser.parse_args()
+
+    texts, labels = load_training_data()
+    print(f"Training examples: {len(texts)}")
+    print("Label counts:", dict(Counter(labels)))
+
+    pre = train_preclassifier(texts, labels, threshold=args.threshold)
+    path = pre.save(args.output)
+    print(f"Saved pre-classifier (threshold={args.threshold:.2f}) in: {path}")
+
+    llm_texts, llm_labels = load_llm_predictions()
+    if not llm_texts:
+        print("\nNo eval logs found: skipping comparison with the LLM.")
+        return
+
+    metrics = cross_validate_against_llm(
+        texts, labels, llm_texts, llm_labels, threshold=args.threshold, folds=args.folds
+    )
+    print(f"\nCascade metrics vs LLM predictions (eval logs, {metrics['folds']}-fold cross-validation):")
+    print(f"  total:                 {metrics['total']}")
+    print(f"  short-circuited:       {metrics['short_circuited']}")
+    print(f"  escalation rate:       {metrics['escalation_rate']:.2f}")
+    print(f"  agreement with LLM:    {metrics['short_circuit_agreement_with_llm']:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,15 @@
 """
 Tools module - External functions and utilities
+
+`from tools import X` importa tools.stats_tools bajo demanda.
 """
 
-from .stats_tools import *
+import importlib
+
+
+def __getattr__(name):
+    if not name.startswith("_"):
+        module = importlib.import_module(f"{__name__}.stats_tools")
+        if hasattr(module, name):
+            return getattr(module, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,139 @@
+# src/tools/checkpoint.py
+
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, Optional
+
+
+class JobCheckpoint:
+    """
+    Checkpoint de un job batch/eval en un fichero JSONL (append-only).
+
+    Cada resultado terminado se añade como una línea y se fuerza a disco
+    (flush + fsync), así que si el proceso muere solo se pierde lo que
+    estaba en vuelo. Con load() se recuperan los resultados ya hechos,
+    indexados por su "id" (como string).
+    """
+
+    def __init__(self, path: Path | str, id_key: str = "id"):
+        self.path = Path(path)
+        self.id_key = id_key
+        self._lock = threading.Lock()
+
+    def iter_records(self) -> Iterator[Dict[str, Any]]:
+        """
+        Recorre los registros guardados sin cargarlos todos en memoria.
+        Ignora líneas corruptas (p. ej. una última línea a medio escribir).
+        """
+        if not self.path.exists():
+            return
+
+        with self.path.open("r", encoding="utf-8") as fh:
+            for line in fh:
+                if not line.strip():
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+
+    def load(self) -> Dict[str, Dict[str, Any]]:
+        """Resultados ya completados (sin error), indexados por id."""
+        done: Dict[str, Dict[str, Any]] = {}
+        for record in self.iter_records():
+            if not record.get("error"):
+                done[str(record.get(self.id_key))] = record
+        return done
+
+    def compact(
+        self,
+        done: "DoneIds",
+        on_record: Optional[Callable[[Dict[str, Any]], None]] = None,
+    ) -> int:
+        """
+        Prepara el checkpoint para reanudar añadiendo al final. Lo reescribe
+        en streaming (fichero temporal + os.replace) quitando:
+        - una última línea a medio escribir (y cualquier línea corrupta):
+          así lo que se añada después empieza en una línea nueva;
+        - los registros con error: esos ids se reintentan, y si se quedaran
+          el id aparecería dos veces;
+        - los ids repetidos (se queda el primero).
+        Añade a `done` los ids que quedan y llama a on_record con cada
+        registro. Devuelve cuántos registros ha quitado.
+        """
+        if not self.path.exists():
+            return 0
+
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        dropped = 0
+        with self._lock:
+            with tmp.open("w", encoding="utf-8") as out:
+                for record in self.iter_records():
+                    if record.get("error") or not done.add(record.get(self.id_key)):
+                        dropped += 1
+                        continue
+                    out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                    if on_record is not None:
+                        on_record(record)
+                out.flush()
+                os.fsync(out.fileno())
+            os.replace(tmp, self.path)
+        return dropped
+
+    def append(self, record: Dict[str, Any]) -> None:
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with self.path.open("a", encoding="utf-8") as fh:
+                fh.write(line)
+                fh.flush()
+                os.fsync(fh.fileno())
+
+    def reset(self) -> None:
+        """Empieza de cero (borra el checkpoint si existe)."""
+        with self._lock:
+            if self.path.exists():
+                self.path.unlink()
+
+
+class DoneIds:
+    """
+    Conjunto de ids ya completados (como string) en una base SQLite
+    temporal: SQLite la vuelca a disco en cuanto pasa de su caché, así que
+    reanudar un job enorme no obliga a tener todos sus ids en memoria.
+    Se usa con `with`; al cerrarlo se borra.
+    """
+
+    def __init__(self):
+        # "" => base temporal privada, se borra sola al cerrar la conexión
+        self._conn = sqlite3.connect("")
+        self._conn.execute("CREATE TABLE ids (id TEXT PRIMARY KEY) WITHOUT ROWID")
+        self._count = 0
+
+    def add(self, id_: Any) -> bool:
+        """Añade un id; False si ya estaba."""
+        cur = self._conn.execute("INSERT OR IGNORE INTO ids (id) VALUES (?)", (str(id_),))
+        added = cur.rowcount == 1
+        self._count += added
+        return added
+
+    def __contains__(self, id_: Any) -> bool:
+        row = self._conn.execute("SELECT 1 FROM ids WHERE id = ?", (str(id_),)).fetchone()
+        return row is not None
+
+    def __len__(self) -> int:
+        return self._count
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def __enter__(self) -> "DoneIds":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
@@ -0,0 +1,535 @@
+# src/tools/metrics.py
+
+"""
+Instrumentación por etapa: dónde se va el tiempo de cada análisis.
+
+Qué se mide (todo en un MetricsRegistry del proceso, ver get_metrics):
+- stage_timer(stage): tiempo de pared de un bloque. La cadena lo usa en
+  chain:sentiment / chain:explanation / chain:reply / parse:sentiment y
+  el grafo en cada nodo (node:<nombre>, ver instrument_node).
+- LLMMetricsCallback: callback de LangChain que get_llm añade a cada
+  ChatOllama. Por cada llamada registra el tiempo de pared (llm:<campo>)
+  y lo que devuelve Ollama en la metadata de la respuesta:
+  prompt_eval_count, eval_count y las duraciones (load/prompt_eval/eval,
+  en segundos). También cuenta los reintentos (on_retry) y los aciertos
+  de la caché de respuestas.
+- Contadores: aciertos/fallos de caché, reintentos y errores por etapa.
+
+Todo va a histogramas en memoria (buckets fijos, estilo Prometheus) y,
+además, cada medida se pasa a los sinks registrados:
+- JsonlSink(path): una línea JSON por medida.
+- PrometheusEndpoint(port): sirve /metrics en formato texto de Prometheus.
+configure_metrics(jsonl_path=..., prometheus_port=...) activa uno o ambos.
+
+Tiempos por resultado: dentro de collect_timings() las medidas del hilo
+(y de las ramas paralelas de LangChain, que copian el contexto) se
+acumulan también en un StageTimings; la cadena lo usa para devolver
+"timings" cuando la entrada lo pide (ver build_sentiment_agent_chain).
+"""
+
+from __future__ import annotations
+
+import bisect
+import contextvars
+import functools
+import json
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+
+METRIC_PREFIX = "sentiment"
+
+LATENCY_BUCKETS_S = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+TOKEN_BUCKETS = (16, 32, 64, 128, 256, 512, 1024, 2048, 4096, 8192)
+
+# Campos de la metadata de Ollama (duraciones en nanosegundos)
+OLLAMA_COUNT_FIELDS = ("prompt_eval_count", "eval_count")
+OLLAMA_DURATION_FIELDS = ("load_duration", "prompt_eval_duration", "eval_duration", "total_duration")
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    """Histograma acumulativo con buckets fijos (como los de Prometheus)."""
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)  # el último es +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> float:
+        """Cuantil aproximado: límite superior del bucket donde cae."""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for bound, n in zip(self.buckets, self.counts):
+            seen += n
+            if seen >= target:
+                return bound
+        return self.buckets[-1] if self.buckets else 0.0
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "mean": self.sum / self.count if self.count else 0.0,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "buckets": dict(zip([*map(str, self.buckets), "+Inf"], self.counts)),
+        }
+
+
+class StageTimings:
+    """Medidas de un solo análisis (ver collect_timings)."""
+
+    def __init__(self):
+        self.stages: Dict[str, float] = {}
+        self.llm: Dict[str, float] = {"calls": 0, "cache_hits": 0, "retries": 0}
+        self._lock = threading.Lock()
+
+    def add_stage(self, stage: str, wall_s: float) -> None:
+        with self._lock:
+            self.stages[stage] = self.stages.get(stage, 0.0) + wall_s
+
+    def add_llm(self, fields: Dict[str, Any]) -> None:
+        with self._lock:
+            self.llm["calls"] += 1
+            for key, value in fields.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    self.llm[key] = self.llm.get(key, 0) + value
+
+    def incr(self, key: str) -> None:
+        with self._lock:
+            self.llm[key] = self.llm.get(key, 0) + 1
+
+    def as_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "stages": {k: round(v, 6) for k, v in self.stages.items()},
+                "llm": {k: round(v, 6) if isinstance(v, float) else v for k, v in self.llm.items()},
+            }
+
+
+_current_timings: contextvars.ContextVar[Optional[StageTimings]] = contextvars.ContextVar(
+    "sentiment_stage_timings", default=None
+)
+
+
+class JsonlSink:
+    """Sink que escribe cada medida como una línea JSON (append)."""
+
+    def __init__(self, path: Path | str):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._fh = self.path.open("a", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def emit(self, event: Dict[str, Any]) -> None:
+        line = json.dumps(event, ensure_ascii=False)
+        with self._lock:
+            self._fh.write(line + "\n")
+            self._fh.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            self._fh.close()
+
+
+class MetricsRegistry:
+    """
+    Histogramas y contadores con etiquetas, más la lista de sinks.
+    Thread-safe: lo comparten el batch concurrente y las ramas paralelas.
+    """
+
+    def __init__(self):
+        self._histograms: Dict[Tuple[str, LabelKey], Histogram] = {}
+        self._counters: Dict[Tuple[str, LabelKey], float] = {}
+        self._sinks: List[Any] = []
+        self._lock = threading.Lock()
+
+    # ---------- registro ----------
+
+    def observe(self, name: str, value: float, buckets: Sequence[float] = LATENCY_BUCKETS_S, **labels: str) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = Histogram(buckets)
+            hist.observe(value)
+
+    def inc(self, name: str, amount: float = 1, **labels: str) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def emit(self, event: Dict[str, Any]) -> None:
+        """Pasa una medida a todos los sinks (un sink que falla no rompe el análisis)."""
+        with self._lock:
+            sinks = list(self._sinks)
+        if not sinks:
+            return
+        event = {"ts": time.time(), **event}
+        for sink in sinks:
+            try:
+                sink.emit(event)
+            except Exception:
+                pass
+
+    def add_sink(self, sink: Any) -> None:
+        with self._lock:
+            self._sinks.append(sink)
+
+    def remove_sink(self, sink: Any) -> None:
+        with self._lock:
+            if sink in self._sinks:
+                self._sinks.remove(sink)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+    # ---------- lectura ----------
+
+    def snapshot(self) -> Dict[str, Any]:
+        """{"histograms": {name: {labels: snapshot}}, "counters": {name: {labels: valor}}}."""
+        out: Dict[str, Any] = {"histograms": {}, "counters": {}}
+        with self._lock:
+            for (name, labels), hist in self._histograms.items():
+                out["histograms"].setdefault(name, {})[_labels_str(labels)] = hist.snapshot()
+            for (name, labels), value in self._counters.items():
+                out["counters"].setdefault(name, {})[_labels_str(labels)] = value
+        return out
+
+    def render_prometheus(self) -> str:
+        """Formato de texto de Prometheus (version 0.0.4)."""
+        lines: List[str] = []
+        with self._lock:
+            hist_names = sorted({name for name, _ in self._histograms})
+            for name in hist_names:
+                full = f"{METRIC_PREFIX}_{name}"
+                lines.append(f"# TYPE {full} histogram")
+                for (n, labels), hist in sorted(self._histograms.items()):
+                    if n != name:
+                        continue
+                    cumulative = 0
+                    for bound, count in zip([*map(_fmt_bound, hist.buckets), "+Inf"], hist.counts):
+                        cumulative += count
+                        lines.append(f"{full}_bucket{_prom_labels(labels, le=bound)} {cumulative}")
+                    lines.append(f"{full}_sum{_prom_labels(labels)} {hist.sum}")
+                    lines.append(f"{full}_count{_prom_labels(labels)} {hist.count}")
+
+            counter_names = sorted({name for name, _ in self._counters})
+            for name in counter_names:
+                full = f"{METRIC_PREFIX}_{name}"
+                lines.append(f"# TYPE {full} counter")
+                for (n, labels), value in sorted(self._counters.items()):
+                    if n == name:
+                        lines.append(f"{full}{_prom_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels_str(labels: LabelKey) -> str:
+    return ",".join(f"{k}={v}" for k, v in labels) or "_"
+
+
+def _fmt_bound(bound: float) -> str:
+    return repr(float(bound))
+
+
+def _prom_labels(labels: LabelKey, **extra: str) -> str:
+    pairs = [*labels, *extra.items()]
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape_label(v)}"' for k, v in pairs) + "}"
+
+
+def _escape_label(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+_metrics = MetricsRegistry()
+
+
+def get_metrics() -> MetricsRegistry:
+    """Registro de métricas compartido por todo el proceso."""
+    return _metrics
+
+
+# ---------- API de instrumentación ----------
+
+def record_stage(stage: str, wall_s: float, error: bool = False) -> None:
+    _metrics.observe("stage_seconds", wall_s, stage=stage)
+    if error:
+        _metrics.inc("stage_errors_total", stage=stage)
+    timings = _current_timings.get()
+    if timings is not None:
+        timings.add_stage(stage, wall_s)
+    _metrics.emit({"kind": "stage", "stage": stage, "wall_s": wall_s, "error": error})
+
+
+@contextmanager
+def stage_timer(stage: str) -> Iterator[None]:
+    """Mide el tiempo de pared del bloque como la etapa `stage`."""
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        record_stage(stage, time.perf_counter() - start, error=True)
+        raise
+    record_stage(stage, time.perf_counter() - start)
+
+
+def instrument_node(name: str, fn: Callable) -> Callable:
+    """Envuelve un nodo del grafo para medirlo como node:<name>."""
+
+    @functools.wraps(fn)
+    def _node(state):
+        with stage_timer(f"node:{name}"):
+            return fn(state)
+
+    return _node
+
+
+@contextmanager
+def collect_timings() -> Iterator[StageTimings]:
+    """Acumula en un StageTimings las medidas hechas dentro del bloque."""
+    timings = StageTimings()
+    token = _current_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _current_timings.reset(token)
+
+
+# Marca en generation_info de las respuestas que salen de la caché. La
+# caché no conoce el run_id de la llamada, así que el acierto viaja con la
+# propia respuesta y on_llm_end lo lee para ese run_id (un flag por hilo
+# se pisaría con varias llamadas a la vez en el mismo hilo, p. ej. async).
+CACHE_HIT_KEY = "llm_cache_hit"
+
+
+def note_cache_lookup(hit: bool) -> None:
+    """Lo llama la caché de respuestas (models/llm_cache.py) en cada lookup."""
+    _metrics.inc("llm_cache_lookups_total", result="hit" if hit else "miss")
+
+
+def mark_cache_hit(generations: Sequence[Any]) -> Sequence[Any]:
+    """Marca las generaciones devueltas por la caché (ver CACHE_HIT_KEY)."""
+    for generation in generations:
+        generation.generation_info = {**(generation.generation_info or {}), CACHE_HIT_KEY: True}
+    return generations
+
+
+def _is_cache_hit(response: Any) -> bool:
+    try:
+        generation = response.generations[0][0]
+    except (AttributeError, IndexError):
+        return False
+    return bool((generation.generation_info or {}).get(CACHE_HIT_KEY))
+
+
+# Misma clave de metadata que chains.sentiment_chain.STREAM_FIELD_KEY
+STAGE_METADATA_KEY = "stream_field"
+
+
+class LLMMetricsCallback(BaseCallbackHandler):
+    """
+    Callback de LangChain para las llamadas al chat model.
+
+    Va en el propio modelo (callbacks= del ChatOllama, ver get_llm): un
+    callback puesto con with_config en la cadena sustituye a los de
+    LangGraph y rompe el streaming de tokens del grafo.
+    La etapa sale de la metadata de la ejecución (clave `stage_key`, la
+    misma que usa el streaming para saber a qué campo va cada token).
+    """
+
+    run_inline = True
+
+    def __init__(self, stage_key: str = STAGE_METADATA_KEY):
+        self.stage_key = stage_key
+        self._runs: Dict[UUID, Tuple[str, float, Optional[StageTimings]]] = {}
+        self._lock = threading.Lock()
+
+    def on_chat_model_start(self, serialized, messages, *, run_id: UUID, metadata=None, **kwargs: Any) -> None:
+        stage = f"llm:{(metadata or {}).get(self.stage_key, 'unknown')}"
+        with self._lock:
+            self._runs[run_id] = (stage, time.perf_counter(), _current_timings.get())
+
+    def on_llm_end(self, response, *, run_id: UUID, **kwargs: Any) -> None:
+        with self._lock:
+            run = self._runs.pop(run_id, None)
+        if run is None:
+            return
+        stage, start, timings = run
+        wall_s = time.perf_counter() - start
+        cache_hit = _is_cache_hit(response)
+
+        fields: Dict[str, Any] = {"wall_s": wall_s}
+        if not cache_hit:
+            fields.update(_ollama_fields(response))
+        else:
+            fields["cache_hits"] = 1
+
+        _metrics.observe("stage_seconds", wall_s, stage=stage)
+        _metrics.inc("llm_calls_total", stage=stage)
+        for key in OLLAMA_COUNT_FIELDS:
+            if key in fields:
+                _metrics.observe(f"llm_{key}", fields[key], buckets=TOKEN_BUCKETS, stage=stage)
+        for key in OLLAMA_DURATION_FIELDS:
+            if f"{key}_s" in fields:
+                _metrics.observe(f"llm_{key}_seconds", fields[f"{key}_s"], stage=stage)
+
+        if timings is not None:
+            timings.add_llm({k: v for k, v in fields.items() if k != "wall_s"})
+        _metrics.emit({"kind": "llm", "stage": stage, "cache_hit": cache_hit, **fields})
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        with self._lock:
+            run = self._runs.pop(run_id, None)
+        if run is None:
+            return
+        stage, start, _ = run
+        record_stage(stage, time.perf_counter() - start, error=True)
+
+    def on_retry(self, retry_state: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        _metrics.inc("llm_retries_total")
+        timings = _current_timings.get()
+        if timings is not None:
+            timings.incr("retries")
+
+
+_llm_callback = LLMMetricsCallback()
+
+
+def get_llm_callback() -> LLMMetricsCallback:
+    """Callback compartido que get_llm pone en cada ChatOllama."""
+    return _llm_callback
+
+
+def _ollama_fields(response: Any) -> Dict[str, Any]:
+    """prompt_eval_count, eval_count y duraciones (en s) de la respuesta de Ollama."""
+    try:
+        generation = response.generations[0][0]
+    except (AttributeError, IndexError):
+        return {}
+    info: Dict[str, Any] = dict(generation.generation_info or {})
+    message = getattr(generation, "message", None)
+    if message is not None:
+        info.update(getattr(message, "response_metadata", None) or {})
+
+    fields: Dict[str, Any] = {}
+    for key in OLLAMA_COUNT_FIELDS:
+        if isinstance(info.get(key), (int, float)):
+            fields[key] = int(info[key])
+    for key in OLLAMA_DURATION_FIELDS:
+        if isinstance(info.get(key), (int, float)):
+            fields[f"{key}_s"] = info[key] / 1e9
+    return fields
+
+
+# ---------- Sinks ----------
+
+class PrometheusEndpoint:
+    """Servidor HTTP (en un hilo) que sirve /metrics para que Prometheus lo recoja."""
+
+    def __init__(self, registry: Optional[MetricsRegistry] = None, host: str = "0.0.0.0", port: int = 9464):
+        registry = registry or get_metrics()
+
+        class _Handler(BaseHTTPRequestHandler):
+            def log_message(self, format: str, *args: Any) -> None:
+                pass
+
+            def do_GET(self) -> None:
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+                body = registry.render_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self._httpd = ThreadingHTTPServer((host, port), _Handler)
+        self._httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/metrics"
+
+    def emit(self, event: Dict[str, Any]) -> None:
+        """Prometheus tira de los histogramas; las medidas sueltas no hacen falta."""
+
+    def start(self) -> "PrometheusEndpoint":
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._httpd.serve_forever, name="metrics-endpoint", daemon=True
+            )
+            self._thread.start()
+        return self
+
+    def close(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        self._thread = None
+
+
+def configure_metrics(
+    jsonl_path: Optional[Path | str] = None,
+    prometheus_port: Optional[int] = None,
+    prometheus_host: str = "0.0.0.0",
+) -> List[Any]:
+    """Activa los sinks pedidos (JSONL, Prometheus o ambos) y los devuelve."""
+    sinks: List[Any] = []
+    if jsonl_path:
+        sinks.append(JsonlSink(jsonl_path))
+    if prometheus_port is not None:
+        sinks.append(PrometheusEndpoint(host=prometheus_host, port=prometheus_port).start())
+    for sink in sinks:
+        _metrics.add_sink(sink)
+    return sinks
+
+
+def summarize_result_timings(results: Sequence[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Media y máximo por etapa y totales de tokens de los "timings" de una
+    lista de resultados (los que no lo llevan se ignoran).
+    """
+    stages: Dict[str, List[float]] = {}
+    llm_totals: Dict[str, float] = {}
+    n = 0
+    for r in results:
+        timings = r.get("timings")
+        if not timings:
+            continue
+        n += 1
+        for stage, wall_s in timings.get("stages", {}).items():
+            stages.setdefault(stage, []).append(wall_s)
+        for key, value in timings.get("llm", {}).items():
+            llm_totals[key] = llm_totals.get(key, 0) + value
+
+    return {
+        "n_results": n,
+        "stages": {
+            stage: {"mean_s": sum(v) / len(v), "max_s": max(v)} for stage, v in sorted(stages.items())
+        },
+        "llm": llm_totals,
+    }
@@ -2,8 +2,15 @@
 
 from __future__ import annotations
 
+import copy
 from collections import Counter
-from typing import Any, Dict, List
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# numpy solo hace falta para las métricas de evaluación; las estadísticas
+# del grafo (update_running_stats...) no lo usan, así que se importa dentro
+# de esas funciones y no al arrancar el CLI o la app.
+if TYPE_CHECKING:
+    import numpy as np
 
 
 def compute_sentiment_stats(results: List[Dict[str, Any]]) -> Dict[str, Any]:
@@ -77,3 +84,355 @@ def compute_accuracy_with_labels(
         "matched": matched,
         "accuracy": acc,
     }
+
+
+# ---------- Estadísticas incrementales ----------
+#
+# compute_sentiment_stats recorre todos los resultados en cada llamada.
+# Estas funciones mantienen un agregado (dict serializable, se puede guardar
+# en el estado del grafo) que se actualiza solo con los resultados nuevos
+# y que se puede combinar entre shards. compute_sentiment_stats sigue siendo
+# la implementación de referencia: running_stats_summary devuelve las mismas
+# claves total / counts / distribution.
+
+SCORE_BINS = 10
+
+
+def _empty_moments() -> Dict[str, float]:
+    return {"count": 0, "mean": 0.0, "m2": 0.0}
+
+
+def _add_score(moments: Dict[str, float], score: float) -> None:
+    # Welford: media y suma de cuadrados de desviaciones en un solo paso
+    moments["count"] += 1
+    delta = score - moments["mean"]
+    moments["mean"] += delta / moments["count"]
+    moments["m2"] += delta * (score - moments["mean"])
+
+
+def _merge_moments(a: Dict[str, float], b: Dict[str, float]) -> Dict[str, float]:
+    # Chan et al.: combinación de dos agregados de Welford
+    n = a["count"] + b["count"]
+    if n == 0:
+        return _empty_moments()
+    delta = b["mean"] - a["mean"]
+    return {
+        "count": n,
+        "mean": a["mean"] + delta * b["count"] / n,
+        "m2": a["m2"] + b["m2"] + delta * delta * a["count"] * b["count"] / n,
+    }
+
+
+def _score_bin(score: float) -> int:
+    score = min(max(score, 0.0), 1.0)
+    return min(int(score * SCORE_BINS), SCORE_BINS - 1)
+
+
+def empty_running_stats() -> Dict[str, Any]:
+    return {
+        "total": 0,
+        "counts": {},
+        "score": _empty_moments(),
+        "per_label": {},
+    }
+
+
+def update_running_stats(
+    agg: Optional[Dict[str, Any]],
+    new_results: Iterable[Dict[str, Any]],
+) -> Dict[str, Any]:
+    """
+    Devuelve el agregado actualizado con `new_results` (O(len(new_results))).
+    No modifica `agg`. Ignora resultados sin sentiment (p. ej. errores),
+    igual que compute_sentiment_stats.
+    """
+    agg = copy.deepcopy(agg) if agg else empty_running_stats()
+
+    for r in new_results:
+        label = str(r.get("sentiment", "")).lower().strip()
+        if not label:
+            continue
+
+        try:
+            score = float(r.get("score", 0.0))
+        except (TypeError, ValueError):
+            score = 0.0
+
+        agg["total"] += 1
+        agg["counts"][label] = agg["counts"].get(label, 0) + 1
+        _add_score(agg["score"], score)
+
+        per_label = agg["per_label"].setdefault(
+            label,
+            {"score": _empty_moments(), "histogram": [0] * SCORE_BINS},
+        )
+        _add_score(per_label["score"], score)
+        per_label["histogram"][_score_bin(score)] += 1
+
+    return agg
+
+
+def merge_running_stats(a: Dict[str, Any], b: Dict[str, Any]) -> Dict[str, Any]:
+    """Combina dos agregados (p. ej. de shards distintos) en uno nuevo."""
+    merged = empty_running_stats()
+    merged["total"] = a["total"] + b["total"]
+
+    for label in list(a["counts"]) + [l for l in b["counts"] if l not in a["counts"]]:
+        merged["counts"][label] = a["counts"].get(label, 0) + b["counts"].get(label, 0)
+
+    merged["score"] = _merge_moments(a["score"], b["score"])
+
+    for label in merged["counts"]:
+        pa = a["per_label"].get(label)
+        pb = b["per_label"].get(label)
+        if pa is None or pb is None:
+            merged["per_label"][label] = copy.deepcopy(pa or pb)
+            continue
+        merged["per_label"][label] = {
+            "score": _merge_moments(pa["score"], pb["score"]),
+            "histogram": [x + y for x, y in zip(pa["histogram"], pb["histogram"])],
+        }
+
+    return merged
+
+
+def running_stats_summary(agg: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Vista legible del agregado. Incluye las claves de compute_sentiment_stats
+    (total, counts, distribution) más media/varianza del score e
+    histogramas por etiqueta.
+    """
+    agg = agg or empty_running_stats()
+    total = agg["total"]
+    if total == 0:
+        return {"total": 0, "counts": {}, "distribution": {}}
+
+    def _variance(m: Dict[str, float]) -> float:
+        return m["m2"] / m["count"] if m["count"] else 0.0
+
+    return {
+        "total": total,
+        "counts": dict(agg["counts"]),
+        "distribution": {label: c / total for label, c in agg["counts"].items()},
+        "score_mean": agg["score"]["mean"],
+        "score_variance": _variance(agg["score"]),
+        "per_label": {
+            label: {
+                "count": p["score"]["count"],
+                "score_mean": p["score"]["mean"],
+                "score_variance": _variance(p["score"]),
+                "histogram": list(p["histogram"]),
+            }
+            for label, p in agg["per_label"].items()
+        },
+    }
+
+
+# ---------- Métricas de evaluación vectorizadas ----------
+#
+# compute_accuracy_with_labels recorre dicts en Python y solo da accuracy.
+# compute_classification_metrics trabaja sobre arrays columnares (NumPy):
+# matriz de confusión, precision/recall/F1 por clase, medias macro y
+# ponderada y calibración del score (ECE), todo con bincount, sin bucles
+# por fila. Sirve para re-puntuar logs de evaluación grandes.
+
+DEFAULT_CALIBRATION_BINS = 10
+
+
+def results_to_columns(
+    results: Iterable[Dict[str, Any]],
+    true_label_key: str = "true_label",
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Pasa una lista de resultados a arrays (preds, labels, scores).
+    Igual que compute_accuracy_with_labels, ignora filas sin etiqueta real.
+    """
+    import numpy as np
+
+    preds: List[str] = []
+    labels: List[str] = []
+    scores: List[float] = []
+
+    for r in results:
+        true = str(r.get(true_label_key, "")).lower().strip()
+        if not true:
+            continue
+        labels.append(true)
+        preds.append(str(r.get("sentiment", "")).lower().strip())
+        try:
+            scores.append(float(r.get("score", 0.0)))
+        except (TypeError, ValueError):
+            scores.append(0.0)
+
+    return (
+        np.asarray(preds, dtype=object),
+        np.asarray(labels, dtype=object),
+        np.asarray(scores, dtype=np.float64),
+    )
+
+
+def _encode(values: np.ndarray, classes: np.ndarray) -> np.ndarray:
+    """Índice de cada valor en `classes` (en cualquier orden), -1 si no está."""
+    import numpy as np
+
+    if classes.size == 0:
+        return np.full(values.shape, -1, dtype=np.intp)
+    # searchsorted necesita las clases ordenadas: se busca en una copia
+    # ordenada y se traduce la posición al orden de `classes`
+    order = np.argsort(classes, kind="stable")
+    sorted_classes = classes[order]
+    idx = np.searchsorted(sorted_classes, values)
+    idx = np.minimum(idx, len(classes) - 1)
+    return np.where(sorted_classes[idx] == values, order[idx], -1)
+
+
+def _safe_div(num: np.ndarray, den: np.ndarray) -> np.ndarray:
+    import numpy as np
+
+    return np.divide(num, den, out=np.zeros_like(num, dtype=np.float64), where=den > 0)
+
+
+def compute_classification_metrics(
+    preds: Sequence[str] | np.ndarray,
+    labels: Sequence[str] | np.ndarray,
+    scores: Optional[Sequence[float] | np.ndarray] = None,
+    classes: Optional[Sequence[str]] = None,
+    n_bins: int = DEFAULT_CALIBRATION_BINS,
+) -> Dict[str, Any]:
+    """
+    Métricas de clasificación a partir de arrays columnares.
+
+    preds / labels: etiquetas ya normalizadas (ver results_to_columns).
+    scores: confianza de cada predicción en [0, 1]; si se pasa, se
+        calculan los bins de calibración y el ECE.
+    classes: orden de las clases en la salida (se respeta el del llamador,
+        sin duplicados); por defecto, las etiquetas reales y predichas que
+        aparecen, ordenadas alfabéticamente. Las predicciones que no son
+        ninguna clase (p. ej. "" de un análisis fallido) cuentan como fallo.
+
+    Devuelve:
+        {
+          "total", "accuracy",
+          "classes": [...],
+          "confusion_matrix": [[...]],   # filas = real, columnas = predicción
+          "per_class": {clase: {precision, recall, f1, support}},
+          "macro": {precision, recall, f1},
+          "weighted": {precision, recall, f1},
+          "calibration": {"ece", "bins": [{lower, upper, count, accuracy, confidence}]}
+        }
+    """
+    import numpy as np
+
+    preds = np.asarray(preds, dtype=object)
+    labels = np.asarray(labels, dtype=object)
+    if preds.shape != labels.shape:
+        raise ValueError("compute_classification_metrics: preds y labels deben tener la misma longitud.")
+
+    total = int(labels.size)
+    if total == 0:
+        return {"total": 0, "accuracy": 0.0, "classes": [], "confusion_matrix": []}
+
+    if classes is None:
+        # set() sobre objetos es mucho más rápido que np.unique (que ordena todo)
+        known = set(labels.tolist()) | set(preds.tolist())
+        known.discard("")
+        class_arr = np.asarray(sorted(known), dtype=str)
+    else:
+        class_arr = np.asarray(list(dict.fromkeys(classes)), dtype=str)
+    k = len(class_arr)
+
+    y_true = _encode(labels.astype(str), class_arr)
+    y_pred = _encode(preds.astype(str), class_arr)
+    correct = (y_true == y_pred) & (y_true >= 0)
+
+    # Matriz de confusión con un solo bincount (solo filas con ambas clases conocidas)
+    valid = (y_true >= 0) & (y_pred >= 0)
+    confusion = np.bincount(
+        y_true[valid] * k + y_pred[valid], minlength=k * k
+    ).reshape(k, k)
+
+    tp = np.diag(confusion).astype(np.float64)
+    # support incluye las filas con predicción desconocida (cuentan como fallo)
+    support = np.bincount(y_true[y_true >= 0], minlength=k).astype(np.float64)
+    predicted = confusion.sum(axis=0).astype(np.float64)
+
+    precision = _safe_div(tp, predicted)
+    recall = _safe_div(tp, support)
+    f1 = _safe_div(2 * precision * recall, precision + recall)
+
+    weights = support / support.sum() if support.sum() else np.zeros(k)
+
+    metrics: Dict[str, Any] = {
+        "total": total,
+        "accuracy": float(correct.mean()),
+        "classes": class_arr.tolist(),
+        "confusion_matrix": confusion.tolist(),
+        "per_class": {
+            label: {
+                "precision": float(precision[i]),
+                "recall": float(recall[i]),
+                "f1": float(f1[i]),
+                "support": int(support[i]),
+            }
+            for i, label in enumerate(class_arr.tolist())
+        },
+        # sin clases (p. ej. todo son análisis fallidos) las medias son 0, no NaN
+        "macro": {
+            "precision": float(precision.mean()) if k else 0.0,
+            "recall": float(recall.mean()) if k else 0.0,
+            "f1": float(f1.mean()) if k else 0.0,
+        },
+        "weighted": {
+            "precision": float(precision @ weights),
+            "recall": float(recall @ weights),
+            "f1": float(f1 @ weights),
+        },
+    }
+
+    if scores is not None:
+        metrics["calibration"] = compute_calibration(scores, correct, n_bins=n_bins)
+
+    return metrics
+
+
+def compute_calibration(
+    scores: Sequence[float] | np.ndarray,
+    correct: Sequence[bool] | np.ndarray,
+    n_bins: int = DEFAULT_CALIBRATION_BINS,
+) -> Dict[str, Any]:
+    """
+    Calibración del score: agrupa las predicciones en `n_bins` bins de
+    confianza iguales en [0, 1] y compara la confianza media con el
+    acierto real de cada bin. ECE = media ponderada de |acierto - confianza|.
+    """
+    import numpy as np
+
+    conf = np.clip(np.asarray(scores, dtype=np.float64), 0.0, 1.0)
+    hit = np.asarray(correct, dtype=np.float64)
+    if conf.shape != hit.shape:
+        raise ValueError("compute_calibration: scores y correct deben tener la misma longitud.")
+
+    total = conf.size
+    bin_idx = np.minimum((conf * n_bins).astype(np.int64), n_bins - 1)
+    counts = np.bincount(bin_idx, minlength=n_bins).astype(np.float64)
+    conf_sum = np.bincount(bin_idx, weights=conf, minlength=n_bins)
+    hit_sum = np.bincount(bin_idx, weights=hit, minlength=n_bins)
+
+    bin_conf = _safe_div(conf_sum, counts)
+    bin_acc = _safe_div(hit_sum, counts)
+    ece = float(np.sum(counts * np.abs(bin_acc - bin_conf)) / total) if total else 0.0
+
+    edges = np.round(np.linspace(0.0, 1.0, n_bins + 1), 6)
+    return {
+        "ece": ece,
+        "bins": [
+            {
+                "lower": float(edges[i]),
+                "upper": float(edges[i + 1]),
+                "count": int(counts[i]),
+                "accuracy": float(bin_acc[i]),
+                "confidence": float(bin_conf[i]),
+            }
+            for i in range(n_bins)
+        ],
+    }
@@ -0,0 +1,75 @@
+# src/tools/stream_io.py
+
+from __future__ import annotations
+
+import csv
+import io
+import json
+import os
+import sys
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, IO, Iterator, Optional
+
+
+def detect_format(path: str, fmt: Optional[str] = None) -> str:
+    """'jsonl' o 'csv': usa `fmt` si viene, si no la extensión (stdin => jsonl)."""
+    if fmt:
+        return fmt.lower()
+    if Path(path).suffix.lower() == ".csv":
+        return "csv"
+    return "jsonl"
+
+
+@contextmanager
+def open_input(path: str) -> Iterator[IO[str]]:
+    """Abre `path` para lectura de texto; '-' es stdin."""
+    if path == "-":
+        yield io.TextIOWrapper(sys.stdin.buffer, encoding="utf-8")
+        return
+    with open(path, "r", encoding="utf-8", newline="") as fh:
+        yield fh
+
+
+@contextmanager
+def open_output(path: str, append: bool = False) -> Iterator[IO[str]]:
+    """Abre `path` para escritura de texto ('-' es stdout); append=True para reanudar."""
+    if path == "-":
+        yield sys.stdout
+        return
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a" if append else "w", encoding="utf-8") as fh:
+        yield fh
+
+
+def iter_records(fh: IO[str], fmt: str = "jsonl") -> Iterator[Dict[str, Any]]:
+    """
+    Lee registros uno a uno (generador), sin cargar el fichero entero.
+
+    - jsonl: un objeto JSON por línea (las líneas vacías se ignoran).
+    - csv: una fila por registro, con cabecera.
+
+    Si un registro no trae "id", se le asigna su número de fila (1-based).
+    """
+    if fmt == "csv":
+        rows: Iterator[Dict[str, Any]] = csv.DictReader(fh)
+    elif fmt == "jsonl":
+        rows = (json.loads(line) for line in fh if line.strip())
+    else:
+        raise ValueError(f"Unknown input format: {fmt}")
+
+    for n, row in enumerate(rows, start=1):
+        if "id" not in row or row["id"] in (None, ""):
+            row["id"] = n
+        yield row
+
+
+def write_jsonl(fh: IO[str], record: Dict[str, Any], durable: bool = False) -> None:
+    """
+    Escribe un registro como una línea JSON y hace flush (salida incremental).
+    Con durable=True además hace fsync, para que sirva de checkpoint.
+    """
+    fh.write(json.dumps(record, ensure_ascii=False) + "\n")
+    fh.flush()
+    if durable:
+        os.fsync(fh.fileno())